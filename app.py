@@ -1,181 +1,360 @@
+import os
 import re
 import sqlite3
-from flask import Flask, render_template, jsonify, request
-import pandas as pd
+import time
+from flask import Flask, Response, g, render_template, jsonify, request
+from http_cache import cached_json, compress_response, get_data_version
+from live_updates import LiveUpdates
+from export import EXPORT_FORMATS, export_stream
+from query_router import QueryRouter
+from database import conectar
+from basket import MIN_CUPONS, associacoes_produto, top_associacoes
+from money import QUANTIDADE, para_reais
+from queries import (AVG_PRODUCT_VALUE_QUERY, CFOP_SALES_QUERY, CUBO_QUERY, DAILY_REVENUE_QUERY,
+                     DISCOUNT_ANALYSIS_QUERY, STATS_QUERY, TOP_PRODUCTS_QUANTITY_QUERY, TOP_PRODUCTS_QUERY)
+from sales_cube import DIAS_SEMANA, SalesCube, SalesCubeCache
+from sharding import ShardedDatabase
+from sketches import TOP_QUANTIDADE, TOP_VALOR, estatisticas_aproximadas, top_aproximado
+import metrics
 
 app = Flask(__name__)
+# Assets estáticos são versionados na URL (?v=mtime), então podem ficar em cache por 1 ano
+app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 31536000
+
+@app.before_request
+def iniciar_cronometro():
+    g.inicio_requisicao = time.perf_counter()
+
+@app.after_request
+def registrar_latencia(response):
+    """Latência por rota (para respostas em streaming, mede até o primeiro byte)"""
+    inicio = g.pop('inicio_requisicao', None)
+    if inicio is not None:
+        rota = request.url_rule.rule if request.url_rule else 'nao_encontrada'
+        metrics.HTTP_REQUEST_SECONDS.observe(time.perf_counter() - inicio, route=rota,
+                                             method=request.method, status=response.status_code)
+    return response
+
+app.after_request(compress_response)
+
+# Caminho do banco; CUPONS_DB_PATH permite apontar para outro (ex.: bancos sintéticos do benchmark)
+DB_PATH = os.environ.get('CUPONS_DB_PATH', 'cupons_fiscais.db')
+# Modo particionado: CUPONS_SHARDS_DIR aponta para a pasta dos shards por emitente (sharding.py)
+SHARDS_DIR = os.environ.get('CUPONS_SHARDS_DIR')
+shards = ShardedDatabase(SHARDS_DIR) if SHARDS_DIR else None
 
 def get_db_connection():
-    conn = sqlite3.connect('cupons_fiscais.db')
+    """Conexão só de leitura: cada consulta lê um snapshot WAL, sem disputar lock com a ingestão"""
+    conn = conectar(DB_PATH, somente_leitura=True)
     conn.row_factory = sqlite3.Row
     return conn
 
+def data_version():
+    """Versão atual dos dados (usada como ETag das rotas da API)"""
+    if shards:
+        versao = shards.get_data_version()
+        return versao['versao'], versao['atualizado_em']
+    conn = get_db_connection()
+    try:
+        return get_data_version(conn)
+    finally:
+        conn.close()
+
+def modo_aproximado():
+    """?approx=true: responde pelos sketches diários (±1%); aceita data_inicio/data_fim (AAAA-MM-DD)"""
+    return request.args.get('approx', '0').lower() in ('1', 'true', 'sim')
+
+def periodo_solicitado():
+    return request.args.get('data_inicio'), request.args.get('data_fim')
+
+def emitente_solicitado():
+    """?emitente=CNPJ: no modo particionado a consulta toca só o shard desse emitente"""
+    return request.args.get('emitente') or None
+
+def sem_particionamento(recurso):
+    return jsonify({'error': f'{recurso} não está disponível no modo particionado (CUPONS_SHARDS_DIR)'}), 400
+
+def dashboard_snapshot():
+    """Estado atual dos painéis que recebem atualização ao vivo"""
+    if shards:
+        return {
+            'daily_revenue': shards.consultar('daily_revenue'),
+            'top_products': shards.consultar('top_products'),
+            'top_products_quantity': shards.consultar('top_products_quantity'),
+            'stats': shards.get_stats()
+        }
+    conn = get_db_connection()
+    try:
+        # Uma transação de leitura: os quatro painéis vêm do mesmo snapshot
+        conn.execute('BEGIN')
+        return {
+            'daily_revenue': [dict(row) for row in conn.execute(DAILY_REVENUE_QUERY)],
+            'top_products': [dict(row) for row in conn.execute(TOP_PRODUCTS_QUERY)],
+            'top_products_quantity': [dict(row) for row in conn.execute(TOP_PRODUCTS_QUANTITY_QUERY)],
+            'stats': dict(conn.execute(STATS_QUERY).fetchone())
+        }
+    finally:
+        conn.close()
+
+query_router = QueryRouter(DB_PATH)
+cubo_vendas = SalesCubeCache()
+live_updates = LiveUpdates(lambda: (data_version() or (0, 0))[0], dashboard_snapshot)
+
+@app.context_processor
+def inject_static_version():
+    def static_version(filename):
+        return int(os.path.getmtime(os.path.join(app.static_folder, filename)))
+    return {'static_version': static_version}
+
 @app.route('/')
 def index():
     return render_template('index.html')
 
 @app.route('/api/top_products')
+@cached_json(data_version)
 def top_products():
     try:
+        if shards:
+            if modo_aproximado():
+                return sem_particionamento('Modo aproximado (approx=true)')
+            return jsonify(shards.consultar('top_products', emitente_solicitado()))
         conn = get_db_connection()
-        query = '''
-            SELECT descricao as produto, SUM(valor_total) as total_vendido
-            FROM itens 
-            WHERE descricao IS NOT NULL
-            GROUP BY descricao 
-            ORDER BY total_vendido DESC 
-            LIMIT 5
-        '''
-        df = pd.read_sql_query(query, conn)
+        if modo_aproximado():
+            rows = top_aproximado(conn, TOP_VALOR, 5, *periodo_solicitado())
+            conn.close()
+            return jsonify([{'produto': produto, 'total_vendido': para_reais(total),
+                             'erro_maximo': para_reais(erro)}
+                            for produto, total, erro in rows])
+        query = TOP_PRODUCTS_QUERY
+        rows = conn.execute(query).fetchall()
         conn.close()
-        return jsonify(df.to_dict('records'))
+        return jsonify([dict(row) for row in rows])
     except Exception as e:
         print(f"❌ ERRO em top_products: {e}")
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/daily_revenue')
+@cached_json(data_version)
 def daily_revenue():
     try:
+        if shards:
+            return jsonify(shards.consultar('daily_revenue', emitente_solicitado()))
         conn = get_db_connection()
-        query = '''
-            SELECT data_emissao as data, SUM(valor_total) as faturamento
-            FROM cupons 
-            WHERE data_emissao IS NOT NULL
-            GROUP BY data_emissao
-            ORDER BY data_emissao
-        '''
-        df = pd.read_sql_query(query, conn)
+        query = DAILY_REVENUE_QUERY
+        rows = conn.execute(query).fetchall()
         conn.close()
-        return jsonify(df.to_dict('records'))
+        return jsonify([dict(row) for row in rows])
     except Exception as e:
         print(f"❌ ERRO em daily_revenue: {e}")
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/discount_analysis')
+@cached_json(data_version)
 def discount_analysis():
     try:
+        if shards:
+            return jsonify(shards.consultar('discount_analysis', emitente_solicitado()))
         conn = get_db_connection()
-        query = '''
-            SELECT (quantidade * valor_unitario) as valor_bruto, 
-                   ((quantidade * valor_unitario) - valor_total) as desconto
-            FROM itens
-            WHERE quantidade > 0 AND valor_unitario > 0
-            LIMIT 100
-        '''
-        df = pd.read_sql_query(query, conn)
+        query = DISCOUNT_ANALYSIS_QUERY
+        rows = conn.execute(query).fetchall()
         conn.close()
-        return jsonify(df.to_dict('records'))
+        return jsonify([dict(row) for row in rows])
     except Exception as e:
         print(f"❌ ERRO em discount_analysis: {e}")
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/top_products_quantity')
+@cached_json(data_version)
 def top_products_quantity():
     try:
+        if shards:
+            if modo_aproximado():
+                return sem_particionamento('Modo aproximado (approx=true)')
+            return jsonify(shards.consultar('top_products_quantity', emitente_solicitado()))
         conn = get_db_connection()
-        query = '''
-            SELECT descricao as produto, SUM(quantidade) as total_quantidade
-            FROM itens 
-            WHERE descricao IS NOT NULL
-            GROUP BY descricao 
-            ORDER BY total_quantidade DESC 
-            LIMIT 5
-        '''
-        df = pd.read_sql_query(query, conn)
+        if modo_aproximado():
+            rows = top_aproximado(conn, TOP_QUANTIDADE, 5, *periodo_solicitado())
+            conn.close()
+            return jsonify([{'produto': produto, 'total_quantidade': para_reais(total, QUANTIDADE),
+                             'erro_maximo': para_reais(erro, QUANTIDADE)}
+                            for produto, total, erro in rows])
+        query = TOP_PRODUCTS_QUANTITY_QUERY
+        rows = conn.execute(query).fetchall()
         conn.close()
-        return jsonify(df.to_dict('records'))
+        return jsonify([dict(row) for row in rows])
     except Exception as e:
         print(f"❌ ERRO em top_products_quantity: {e}")
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/cfop_sales')
+@cached_json(data_version)
 def cfop_sales():
     try:
+        if shards:
+            return jsonify(shards.consultar('cfop_sales', emitente_solicitado()))
         conn = get_db_connection()
-        query = '''
-            SELECT cfop, SUM(valor_total) as total_vendido
-            FROM itens 
-            WHERE cfop IS NOT NULL
-            GROUP BY cfop 
-            ORDER BY total_vendido DESC 
-            LIMIT 5
-        '''
-        df = pd.read_sql_query(query, conn)
+        query = CFOP_SALES_QUERY
+        rows = conn.execute(query).fetchall()
         conn.close()
-        return jsonify(df.to_dict('records'))
+        return jsonify([dict(row) for row in rows])
     except Exception as e:
         print(f"❌ ERRO em cfop_sales: {e}")
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/avg_product_value')
+@cached_json(data_version)
 def avg_product_value():
     try:
+        if shards:
+            return jsonify(shards.consultar('avg_product_value', emitente_solicitado()))
         conn = get_db_connection()
-        query = '''
-            SELECT descricao as produto, AVG(valor_unitario) as valor_medio
-            FROM itens 
-            WHERE descricao IS NOT NULL AND valor_unitario > 0
-            GROUP BY descricao 
-            ORDER BY valor_medio DESC 
-            LIMIT 5
-        '''
-        df = pd.read_sql_query(query, conn)
+        query = AVG_PRODUCT_VALUE_QUERY
+        rows = conn.execute(query).fetchall()
         conn.close()
-        return jsonify(df.to_dict('records'))
+        return jsonify([dict(row) for row in rows])
     except Exception as e:
         print(f"❌ ERRO em avg_product_value: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/stats')
+@cached_json(data_version)
+def stats():
+    try:
+        if shards:
+            if modo_aproximado():
+                return sem_particionamento('Modo aproximado (approx=true)')
+            return jsonify(shards.get_stats(emitente_solicitado()))
+        conn = get_db_connection()
+        if modo_aproximado():
+            # Todos os sketches do mesmo snapshot
+            conn.execute('BEGIN')
+            result = estatisticas_aproximadas(conn, *periodo_solicitado())
+            conn.close()
+            return jsonify(result)
+        result = conn.execute(STATS_QUERY).fetchone()
+        conn.close()
+        return jsonify(dict(result))
+    except Exception as e:
+        print(f"❌ ERRO em stats: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/basket')
+@cached_json(data_version)
+def basket():
+    """Produtos comprados juntos: ?produto= (associações de um produto) ou top produtos; ?emitente=CNPJ por loja"""
+    try:
+        emitente = request.args.get('emitente') or None
+        limite = min(request.args.get('limite', 10, type=int), 100)
+        min_cupons = request.args.get('min_cupons', MIN_CUPONS, type=int)
+        if shards and not emitente:
+            return sem_particionamento('Cestas sem emitente')
+        conn = shards.conexao(emitente) if shards else get_db_connection()
+        conn.execute('BEGIN')
+        produto = request.args.get('produto')
+        if produto:
+            result = associacoes_produto(conn, produto, emitente, limite, min_cupons)
+            result['emitente'] = emitente
+        else:
+            produtos = min(request.args.get('produtos', 5, type=int), 50)
+            result = top_associacoes(conn, emitente, produtos, limite, min_cupons)
+        conn.close()
+        return jsonify(result)
+    except Exception as e:
+        print(f"❌ ERRO em basket: {e}")
+        return jsonify({'error': str(e)}), 500
+
+def carregar_cubo():
+    if shards:
+        return SalesCube([tuple(linha.values()) for parcial in shards.linhas(CUBO_QUERY) for linha in parcial])
+    conn = get_db_connection()
+    try:
+        return SalesCube.carregar(conn)
+    finally:
+        conn.close()
+
+@app.route('/api/heatmap')
+@cached_json(data_version)
+def heatmap():
+    """Mapa dia da semana x hora (cupons, faturamento ou itens) para escala de equipe; filtros de loja, caixa e período"""
+    try:
+        medida = request.args.get('medida', 'cupons')
+        data_inicio, data_fim = periodo_solicitado()
+        emitente = request.args.get('emitente') or None
+        caixa = request.args.get('caixa') or None
+        versao = data_version()
+        cubo = cubo_vendas.obter(versao[0] if versao else None, carregar_cubo)
+        valores = cubo.heatmap(medida, data_inicio, data_fim, emitente, caixa)
+        return jsonify({
+            'medida': medida,
+            'dias': DIAS_SEMANA,
+            'horas': list(range(24)),
+            'valores': [[round(float(v), 2) for v in linha] for linha in valores],
+            'total': round(float(valores.sum()), 2),
+            'emitentes': [e for e in cubo.emitentes.tolist() if e],
+            'caixas': [c for c in cubo.caixas.tolist() if c],
+        })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"❌ ERRO em heatmap: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/stream')
+def stream():
+    """Server-Sent Events: snapshot inicial e depois só os deltas a cada mudança nos dados"""
+    ultima_versao = request.headers.get('Last-Event-ID') or request.args.get('versao')
+    return Response(live_updates.stream(ultima_versao), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/api/query', methods=['POST'])
 def natural_language_query():
     try:
+        if shards:
+            return sem_particionamento('Consulta em linguagem natural')
         data = request.get_json()
-        pergunta = data.get('pergunta', '').lower()
+        pergunta = data.get('pergunta', '')
         
         print(f"🔍 PERGUNTA RECEBIDA: {pergunta}")
         
-        conn = get_db_connection()
-        
-        if 'valor total vendido pela empresa' in pergunta:
-            empresa = pergunta.split('empresa')[-1].strip()
-            print(f"🔍 BUSCANDO EMPRESA: '{empresa}'")
-            
-            query = '''
-                SELECT SUM(valor_total) as valor_total 
-                FROM cupons 
-                WHERE UPPER(emitente_razao_social) LIKE UPPER(?)
-            '''
-            result = conn.execute(query, (f'%{empresa}%',)).fetchone()
-            print(f"🔍 RESULTADO EMPRESA: {result[0] if result else 'Nenhum'}")
-            
-            response = {'resultado': f'Valor total: R$ {result[0]:.2f}' if result[0] else 'Nenhum resultado encontrado'}
-        
-        elif 'quais empresas compraram o produto' in pergunta:
-            produto = pergunta.split('produto')[-1].strip()
-            print(f"🔍 BUSCANDO PRODUTO: '{produto}'")
-            
-            # BUSCA CASE-INSENSITIVE
-            query = '''
-                SELECT DISTINCT c.emitente_razao_social as empresa
-                FROM cupons c
-                JOIN itens i ON c.chave_acesso = i.chave_acesso
-                WHERE UPPER(i.descricao) LIKE UPPER(?)
-            '''
-            result = conn.execute(query, (f'%{produto}%',)).fetchall()
-            empresas = [row[0] for row in result]
-            print(f"🔍 EMPRESAS ENCONTRADAS: {empresas}")
-            
-            response = {'empresas': empresas if empresas else ['Nenhuma empresa encontrada']}
-        
-        else:
-            response = {'erro': 'Pergunta não reconhecida'}
-        
-        conn.close()
+        response = query_router.responder(pergunta)
         return jsonify(response)
     except Exception as e:
         print(f"❌ ERRO em query: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/export/<tabela>')
+def export_data(tabela):
+    """Exportação completa de cupons/itens em CSV ou NDJSON, enviada em streaming"""
+    formato = request.args.get('formato', 'csv')
+    gzip = request.args.get('gzip', '0').lower() in ('1', 'true', 'sim')
+    emitente = request.args.get('emitente')
+    conectar_export = get_db_connection
+    if shards:
+        if not emitente:
+            return sem_particionamento('Exportação sem emitente')
+        conectar_export = lambda: shards.conexao(emitente)
+    try:
+        corpo = export_stream(conectar_export, tabela, formato,
+                              data_inicio=request.args.get('data_inicio'),
+                              data_fim=request.args.get('data_fim'),
+                              emitente=emitente,
+                              gzip=gzip)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    nome = f"{tabela}.{formato}" + ('.gz' if gzip else '')
+    mimetype = 'application/gzip' if gzip else EXPORT_FORMATS[formato]
+    return Response(corpo, mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename="{nome}"',
+                             'X-Accel-Buffering': 'no'})
+
+@app.route('/api/metrics')
+def metrics_endpoint():
+    """Métricas do processo: formato Prometheus (padrão) ou JSON (?format=json)"""
+    if request.args.get('format') == 'json':
+        return jsonify(metrics.REGISTRY.as_dict())
+    return Response(metrics.REGISTRY.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
 # Rota de debug para verificar a estrutura do banco
 @app.route('/api/debug')
 def debug():
@@ -0,0 +1,167 @@
+import time
+from collections import defaultdict
+
+from queries import CESTA_PARES, CESTA_PRINCIPAIS, CESTA_PRODUTO, CESTA_PRODUTOS, CESTA_TOTAL
+
+# Associações vistas em menos cupons que isso são ruído (padrão da API)
+MIN_CUPONS = 2
+# Itens lidos por vez ao atualizar/reconstruir (um cupom nunca é dividido entre blocos)
+BLOCO_ITENS = 100_000
+
+
+def _ja_processados(conn, chaves, bloco=500):
+    processados = set()
+    chaves = list(chaves)
+    for i in range(0, len(chaves), bloco):
+        parte = chaves[i:i + bloco]
+        marcadores = ','.join('?' * len(parte))
+        processados.update(row[0] for row in conn.execute(
+            f'SELECT chave_acesso FROM cesta_cupons WHERE chave_acesso IN ({marcadores})', parte))
+    return processados
+
+
+def _processar_bloco(conn, linhas):
+    """Soma as co-ocorrências de um bloco de itens [(chave, emitente, produto)] às tabelas de cestas.
+
+    Por emitente monta a matriz esparsa cupom x produto (1 = produto presente no
+    cupom); X.T @ X dá na diagonal o nº de cupons de cada produto e fora dela o
+    nº de cupons em que cada par aparece junto.
+    """
+    import numpy as np
+    from scipy import sparse
+
+    processados = _ja_processados(conn, {chave for chave, _, _ in linhas})
+    por_emitente = defaultdict(list)
+    for chave, emitente, produto in linhas:
+        if chave not in processados:
+            por_emitente[emitente].append((chave, produto))
+
+    agora = time.time()
+    for emitente, itens in por_emitente.items():
+        cestas, produtos = {}, {}
+        linhas_idx = [cestas.setdefault(chave, len(cestas)) for chave, _ in itens]
+        colunas_idx = [produtos.setdefault(produto, len(produtos)) for _, produto in itens]
+        X = sparse.csr_matrix((np.ones(len(itens), dtype=np.int32), (linhas_idx, colunas_idx)),
+                              shape=(len(cestas), len(produtos)))
+        X.sum_duplicates()
+        X.data[:] = 1  # presença no cupom, não quantidade de linhas
+        coocorrencia = sparse.triu(X.T @ X, k=1).tocoo()
+        por_produto = np.asarray(X.sum(axis=0)).ravel()
+        nomes = list(produtos)
+
+        conn.executemany('''
+            INSERT INTO cesta_produtos (produto, emitente_cnpj, cupons) VALUES (?, ?, ?)
+            ON CONFLICT(produto, emitente_cnpj) DO UPDATE SET cupons = cupons + excluded.cupons
+        ''', [(nomes[j], emitente, int(n)) for j, n in enumerate(por_produto)])
+
+        # Cada par é gravado nas duas direções: a busca por produto usa só o prefixo da chave
+        pares = []
+        for i, j, n in zip(coocorrencia.row, coocorrencia.col, coocorrencia.data):
+            pares.append((nomes[i], nomes[j], emitente, int(n)))
+            pares.append((nomes[j], nomes[i], emitente, int(n)))
+        conn.executemany('''
+            INSERT INTO cesta_pares (produto_a, produto_b, emitente_cnpj, cupons) VALUES (?, ?, ?, ?)
+            ON CONFLICT(produto_a, produto_b, emitente_cnpj) DO UPDATE SET cupons = cupons + excluded.cupons
+        ''', pares)
+
+        conn.execute('''
+            INSERT INTO cesta_totais (emitente_cnpj, cupons, atualizado_em) VALUES (?, ?, ?)
+            ON CONFLICT(emitente_cnpj) DO UPDATE SET cupons = cupons + excluded.cupons,
+                                                     atualizado_em = excluded.atualizado_em
+        ''', (emitente, len(cestas), agora))
+        conn.executemany('INSERT INTO cesta_cupons (chave_acesso, emitente_cnpj) VALUES (?, ?)',
+                         [(chave, emitente) for chave in cestas])
+
+
+def atualizar_cestas(conn, ultimo_id):
+    """Processa os cupons dos itens com id > ultimo_id (mesma transação da ingestão).
+
+    Cupons já contados (tabela cesta_cupons) são ignorados, então reprocessar
+    um lote ou reingerir os mesmos XMLs não duplica as co-ocorrências.
+    """
+    cursor = conn.execute('''
+        SELECT i.chave_acesso, c.emitente_cnpj, i.descricao
+        FROM itens i
+        JOIN cupons c ON c.chave_acesso = i.chave_acesso
+        WHERE i.id > ? AND i.descricao IS NOT NULL AND c.emitente_cnpj IS NOT NULL
+        ORDER BY i.id
+    ''', (ultimo_id,))
+    bloco = []
+    for linha in cursor:
+        if len(bloco) >= BLOCO_ITENS and linha[0] != bloco[-1][0]:
+            _processar_bloco(conn, bloco)
+            bloco = []
+        bloco.append(linha)
+    if bloco:
+        _processar_bloco(conn, bloco)
+
+
+def reconstruir_cestas(conn):
+    """Recalcula as co-ocorrências a partir de todos os itens (migração ou correção)"""
+    for tabela in ('cesta_pares', 'cesta_produtos', 'cesta_totais', 'cesta_cupons'):
+        conn.execute(f'DELETE FROM {tabela}')
+    atualizar_cestas(conn, 0)
+
+
+def _filtro_emitente(emitente):
+    return (' AND emitente_cnpj = ?', (emitente,)) if emitente else ('', ())
+
+
+def _metricas(juntos, cupons_a, cupons_b, total):
+    """Suporte, confiança (A -> B) e lift, vetorizados"""
+    import numpy as np
+    juntos = np.asarray(juntos, dtype=float)
+    cupons_b = np.asarray(cupons_b, dtype=float)
+    suporte = juntos / total
+    confianca = juntos / cupons_a
+    lift = confianca / (cupons_b / total)
+    return suporte, confianca, lift
+
+
+def associacoes_produto(conn, produto, emitente=None, limite=10, min_cupons=MIN_CUPONS, total=None):
+    """Produtos comprados junto com `produto`, ordenados por lift"""
+    import numpy as np
+    filtro, params = _filtro_emitente(emitente)
+    if total is None:
+        total = conn.execute(CESTA_TOTAL.format(filtro=filtro), params).fetchone()[0]
+    cupons_a = conn.execute(CESTA_PRODUTO.format(filtro=filtro), (produto,) + params).fetchone()[0]
+    resultado = {'produto': produto, 'cupons': cupons_a, 'associacoes': []}
+    if not total or not cupons_a:
+        return resultado
+
+    pares = conn.execute(CESTA_PARES.format(filtro=filtro), (produto,) + params + (min_cupons,)).fetchall()
+    if not pares:
+        return resultado
+
+    outros = [row[0] for row in pares]
+    cupons_b = {}
+    for i in range(0, len(outros), 500):
+        parte = outros[i:i + 500]
+        marcadores = ','.join('?' * len(parte))
+        cupons_b.update(conn.execute(CESTA_PRODUTOS.format(marcadores=marcadores, filtro=filtro),
+                                     tuple(parte) + params).fetchall())
+
+    juntos = [row[1] for row in pares]
+    suporte, confianca, lift = _metricas(juntos, cupons_a, [cupons_b[o] for o in outros], total)
+    ordem = np.lexsort((-np.asarray(juntos), -lift))[:limite]
+    resultado['associacoes'] = [{
+        'produto': outros[i],
+        'cupons': int(juntos[i]),
+        'suporte': round(float(suporte[i]), 6),
+        'confianca': round(float(confianca[i]), 4),
+        'lift': round(float(lift[i]), 4),
+    } for i in ordem]
+    return resultado
+
+
+def top_associacoes(conn, emitente=None, produtos=5, limite=5, min_cupons=MIN_CUPONS):
+    """Associações dos `produtos` produtos presentes em mais cupons"""
+    filtro, params = _filtro_emitente(emitente)
+    total = conn.execute(CESTA_TOTAL.format(filtro=filtro), params).fetchone()[0]
+    principais = conn.execute(CESTA_PRINCIPAIS.format(filtro=filtro), params + (produtos,)).fetchall()
+    return {
+        'emitente': emitente,
+        'total_cupons': total,
+        'produtos': [associacoes_produto(conn, produto, emitente, limite, min_cupons, total)
+                     for (produto,) in principais],
+    }
@@ -0,0 +1,208 @@
+import argparse
+import json
+import math
+import os
+import platform
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import synthetic_data
+
+# Rotas medidas: (nome, método, caminho, corpo JSON). O SSE (/api/stream) não termina, então
+# o método 'SSE' mede só até o snapshot inicial chegar e fecha a conexão.
+ENDPOINTS = [
+    ('top_products', 'GET', '/api/top_products', None),
+    ('daily_revenue', 'GET', '/api/daily_revenue', None),
+    ('discount_analysis', 'GET', '/api/discount_analysis', None),
+    ('top_products_quantity', 'GET', '/api/top_products_quantity', None),
+    ('cfop_sales', 'GET', '/api/cfop_sales', None),
+    ('avg_product_value', 'GET', '/api/avg_product_value', None),
+    ('stats', 'GET', '/api/stats', None),
+    ('basket', 'GET', '/api/basket', None),
+    ('basket_produto', 'GET', '/api/basket?produto=ARROZ%20BRAVO%201KG', None),
+    ('heatmap', 'GET', '/api/heatmap', None),
+    ('export_cupons_dia', 'GET', '/api/export/cupons?formato=ndjson&data_inicio=2024-03-01&data_fim=2024-03-01', None),
+    ('export_itens_dia', 'GET', '/api/export/itens?formato=csv&data_inicio=2024-03-01&data_fim=2024-03-01', None),
+    ('stream_snapshot', 'SSE', '/api/stream', None),
+    ('metrics', 'GET', '/api/metrics', None),
+    ('debug', 'GET', '/api/debug', None),
+]
+
+# Perguntas do /api/query, variadas para não medir só o cache do roteador
+PERGUNTAS = [
+    'valor total vendido pela empresa {rede}',
+    'quais empresas compraram o produto {categoria}',
+    'top 10 produtos mais vendidos da loja {rede}',
+    'quem comprou o produto {categoria} em 2024',
+    'ticket medio da loja {rede} no mes 03/2024',
+    'formas de pagamento da empresa {rede}',
+]
+
+# Limites padrão de regressão em relação ao baseline
+TOLERANCIA = 0.25   # p95 até 25% maior / req/s até 25% menor
+FOLGA_MS = 2.0      # diferenças absolutas menores que isso são ruído
+
+
+def percentil(valores_ordenados, p):
+    """Percentil por rank mais próximo (valores já ordenados)"""
+    if not valores_ordenados:
+        return 0.0
+    indice = max(0, math.ceil(p / 100 * len(valores_ordenados)) - 1)
+    return valores_ordenados[indice]
+
+
+def _perguntas(n):
+    consultas = []
+    for i in range(n):
+        modelo = PERGUNTAS[i % len(PERGUNTAS)]
+        consultas.append(modelo.format(
+            rede=synthetic_data.REDES[i % len(synthetic_data.REDES)],
+            categoria=synthetic_data.CATEGORIAS[i % len(synthetic_data.CATEGORIAS)][0]))
+    return consultas
+
+
+def carregar_app(db_path):
+    """Importa o app apontando para `db_path` (CUPONS_DB_PATH) e o devolve pronto para o test client"""
+    os.environ['CUPONS_DB_PATH'] = db_path
+    import app as app_module
+    from query_router import QueryRouter
+    from live_updates import LiveUpdates
+    from sales_cube import SalesCubeCache
+    # Troca de escala no mesmo processo: rotas leem o caminho, o roteador e os caches do módulo,
+    # e os caches guardam só a versão dos dados (que pode coincidir entre bancos diferentes)
+    app_module.DB_PATH = db_path
+    app_module.query_router = QueryRouter(db_path)
+    anterior = app_module.live_updates
+    app_module.live_updates = LiveUpdates(anterior.get_version, anterior.calcular_snapshot)
+    app_module.cubo_vendas = SalesCubeCache()
+    app_module.app.config['TESTING'] = True
+    return app_module.app
+
+
+def _ler_ate_snapshot(resposta):
+    """Consome o stream SSE até o evento de snapshot e fecha a conexão (desinscreve o cliente)"""
+    try:
+        for chunk in resposta.response:
+            texto = chunk.decode('utf-8') if isinstance(chunk, bytes) else chunk
+            if 'event: snapshot' in texto:
+                break
+    finally:
+        resposta.close()
+
+
+def medir(app, metodo, caminho, corpo, requisicoes, clientes, aquecimento=2):
+    """Dispara `requisicoes` chamadas com `clientes` threads; retorna o resumo de latência"""
+    corpos = corpo if isinstance(corpo, list) else [corpo] * requisicoes
+    sse = metodo == 'SSE'
+
+    def abrir(cliente, i):
+        if sse:
+            resposta = cliente.get(caminho, buffered=False)
+            _ler_ate_snapshot(resposta)
+        else:
+            resposta = cliente.open(caminho, method=metodo, json=corpos[i % len(corpos)])
+            resposta.get_data()
+        return resposta
+
+    with app.test_client() as cliente:
+        for i in range(aquecimento):
+            abrir(cliente, i)
+
+    def chamada(i):
+        with app.test_client() as cliente:
+            inicio = time.perf_counter()
+            resposta = abrir(cliente, i)
+            return time.perf_counter() - inicio, resposta.status_code
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clientes) as executor:
+        respostas = list(executor.map(chamada, range(requisicoes)))
+    duracao = time.perf_counter() - inicio
+
+    latencias = sorted(latencia * 1000 for latencia, _ in respostas)
+    return {
+        'requisicoes': requisicoes,
+        'clientes': clientes,
+        'erros': sum(1 for _, status in respostas if status >= 400),
+        'p50_ms': round(percentil(latencias, 50), 3),
+        'p95_ms': round(percentil(latencias, 95), 3),
+        'p99_ms': round(percentil(latencias, 99), 3),
+        'media_ms': round(sum(latencias) / len(latencias), 3),
+        'req_s': round(requisicoes / duracao, 1) if duracao > 0 else 0.0,
+    }
+
+
+def executar(escalas, requisicoes=200, clientes=8, seed=42, recriar=False):
+    resultados = {}
+    for escala in escalas:
+        db_path = synthetic_data.gerar_escala(escala, seed=seed, recriar=recriar)
+        app = carregar_app(db_path)
+        print(f"\n⏱️  ESCALA {escala} ({db_path}): {requisicoes} requisições, {clientes} clientes")
+
+        endpoints = ENDPOINTS + [('query', 'POST', '/api/query',
+                                  [{'pergunta': p} for p in _perguntas(requisicoes)])]
+        resultados[escala] = {}
+        for nome, metodo, caminho, corpo in endpoints:
+            resumo = medir(app, metodo, caminho, corpo, requisicoes, clientes)
+            resultados[escala][nome] = resumo
+            print(f"   {nome:<24} p50 {resumo['p50_ms']:>9.2f} ms  p95 {resumo['p95_ms']:>9.2f} ms  "
+                  f"p99 {resumo['p99_ms']:>9.2f} ms  {resumo['req_s']:>8.1f} req/s"
+                  + (f"  ⚠️ {resumo['erros']} erros" if resumo['erros'] else ''))
+    return {
+        'executado_em': datetime.now().isoformat(timespec='seconds'),
+        'python': sys.version.split()[0],
+        'plataforma': platform.platform(),
+        'config': {'requisicoes': requisicoes, 'clientes': clientes, 'seed': seed},
+        'resultados': resultados,
+    }
+
+
+def comparar(atual, baseline, tolerancia=TOLERANCIA, folga_ms=FOLGA_MS):
+    """Lista as regressões do resultado atual em relação ao baseline (mesma escala e endpoint)"""
+    regressoes = []
+    for escala, endpoints in atual['resultados'].items():
+        for nome, resumo in endpoints.items():
+            base = baseline.get('resultados', {}).get(escala, {}).get(nome)
+            if not base:
+                continue
+            limite_p95 = base['p95_ms'] * (1 + tolerancia)
+            if resumo['p95_ms'] > limite_p95 and resumo['p95_ms'] - base['p95_ms'] > folga_ms:
+                regressoes.append(f"{escala}/{nome}: p95 {resumo['p95_ms']:.2f} ms > {limite_p95:.2f} ms "
+                                  f"(baseline {base['p95_ms']:.2f} ms)")
+            if resumo['req_s'] < base['req_s'] * (1 - tolerancia):
+                regressoes.append(f"{escala}/{nome}: {resumo['req_s']:.1f} req/s < "
+                                  f"{base['req_s'] * (1 - tolerancia):.1f} req/s (baseline {base['req_s']:.1f})")
+            if resumo['erros'] > base['erros']:
+                regressoes.append(f"{escala}/{nome}: {resumo['erros']} erros (baseline {base['erros']})")
+    return regressoes
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark de carga das rotas /api/* sobre bancos sintéticos')
+    parser.add_argument('escalas', nargs='*', default=['pequena'], choices=sorted(synthetic_data.ESCALAS))
+    parser.add_argument('--requisicoes', type=int, default=200, help='requisições por endpoint')
+    parser.add_argument('--clientes', type=int, default=8, help='clientes concorrentes')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--recriar', action='store_true', help='regera os bancos sintéticos')
+    parser.add_argument('--saida', default='data/bench/resultado.json')
+    parser.add_argument('--baseline', help='resultado anterior para checar regressões')
+    parser.add_argument('--tolerancia', type=float, default=TOLERANCIA)
+    parser.add_argument('--folga-ms', type=float, default=FOLGA_MS)
+    args = parser.parse_args()
+
+    resultado = executar(args.escalas, args.requisicoes, args.clientes, args.seed, args.recriar)
+    os.makedirs(os.path.dirname(args.saida) or '.', exist_ok=True)
+    with open(args.saida, 'w', encoding='utf-8') as f:
+        json.dump(resultado, f, ensure_ascii=False, indent=2)
+    print(f"\n📝 Resultado salvo em {args.saida}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressoes = comparar(resultado, json.load(f), args.tolerancia, args.folga_ms)
+        if regressoes:
+            print("❌ REGRESSÕES EM RELAÇÃO AO BASELINE:")
+            for regressao in regressoes:
+                print(f"   • {regressao}")
+            sys.exit(1)
+        print("✅ Nenhuma regressão em relação ao baseline")
@@ -1,33 +1,72 @@
 import sqlite3
-import pandas as pd
 import os
+import time
+import metrics
+from gtin_profile import atualizar_perfil, reconstruir_perfil
+from basket import atualizar_cestas, reconstruir_cestas
+from sketches import atualizar_sketches_cupons, atualizar_sketches_itens, reconstruir_sketches, estatisticas_aproximadas
+from money import ESCALAS
+from queries import STATS_QUERY
+from sales_cube import atualizar_cubo_cupons, atualizar_cubo_itens, reconstruir_cubo, timestamp_emissao
+
+# Tempo máximo que uma escrita espera pelo lock de outra escrita antes de falhar
+BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 30000))
+
+def conectar(db_path, somente_leitura=False, **opcoes):
+    """Conexão instrumentada em modo WAL (tempo e linhas de cada query vão para /api/metrics).
+
+    Com WAL, cada leitura enxerga o último commit publicado e não bloqueia nem
+    é bloqueada pela ingestão; escritas concorrentes esperam até BUSY_TIMEOUT_MS.
+    `somente_leitura=True` (API) liga query_only, então a conexão nunca pega lock de escrita.
+    """
+    conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT_MS / 1000,
+                           factory=metrics.InstrumentedConnection, **opcoes)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    if somente_leitura:
+        conn.execute('PRAGMA query_only=ON')
+    return conn
 
 class Database:
     def __init__(self, db_path='cupons_fiscais.db'):
         self.db_path = db_path
         self.init_database()
     
+    def _connect(self):
+        """Abre uma conexão de escrita (WAL, instrumentada)"""
+        return conectar(self.db_path)
+    
+    def conexao(self):
+        """Conexão de escrita para os módulos que guardam estado neste banco (cache de GTIN,
+        fila de enriquecimento, perfil); quem abre é responsável por fechar"""
+        return self._connect()
+    
     def init_database(self):
         """Inicializa o banco de dados com as tabelas para Cupons Fiscais"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
-        # Tabela de CUPONS FISCAIS (conforme especificado no desafio)
+        migrar_centavos = self._preparar_migracao_centavos(conn)
+        
+        # Tabela de CUPONS FISCAIS (conforme especificado no desafio).
+        # Valores em inteiros de ponto fixo: centavos, vUnCom em milésimos e qCom x 10000 (money.py)
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS cupons (
                 chave_acesso TEXT PRIMARY KEY,
                 data_emissao TEXT,
                 hora_emissao TEXT,
-                valor_total REAL,
-                valor_desconto REAL,
-                valor_pis REAL,
-                valor_cofins REAL,
+                valor_total INTEGER,
+                valor_desconto INTEGER,
+                valor_pis INTEGER,
+                valor_cofins INTEGER,
                 emitente_cnpj TEXT,
                 emitente_razao_social TEXT,
                 forma_pagamento TEXT,
-                valor_pagamento REAL,
+                valor_pagamento INTEGER,
                 destinatario_cpf TEXT,
-                destinatario_nome TEXT
+                destinatario_nome TEXT,
+                numero_caixa TEXT,
+                timestamp_emissao INTEGER
             )
         ''')
         
@@ -44,10 +83,10 @@ class Database:
                 cest TEXT,
                 cfop TEXT,
                 unidade TEXT,
-                quantidade REAL,
-                valor_unitario REAL,
-                valor_total REAL,
-                valor_item_12741 REAL,
+                quantidade INTEGER,
+                valor_unitario INTEGER,
+                valor_total INTEGER,
+                valor_item_12741 INTEGER,
                 cst_icms TEXT,
                 origem_icms TEXT,
                 cst_pis TEXT,
@@ -60,17 +99,182 @@ class Database:
             )
         ''')
         
+        # Cache de consultas de GTIN (acertos e GTINs desconhecidos, com expiração)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS gtin_cache (
+                gtin TEXT PRIMARY KEY,
+                descricao TEXT,
+                ncm TEXT,
+                encontrado INTEGER NOT NULL,
+                fonte TEXT,
+                atualizado_em REAL NOT NULL,
+                expira_em REAL
+            )
+        ''')
+        
+        # Fila persistente de enriquecimento (estado, tentativas e lease por GTIN)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS fila_enriquecimento (
+                gtin TEXT PRIMARY KEY,
+                descricao TEXT,
+                frequencia INTEGER,
+                receita REAL,
+                prioridade REAL,
+                estado TEXT NOT NULL DEFAULT 'pendente',
+                encontrado INTEGER,
+                tentativas INTEGER NOT NULL DEFAULT 0,
+                retry_apos REAL,
+                lease_dono TEXT,
+                lease_expira REAL,
+                ultimo_erro TEXT,
+                atualizado_em REAL
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_fila_estado_prioridade ON fila_enriquecimento(estado, prioridade DESC)')
+        
+        # Perfil agregado por GTIN (frequência, receita, primeira/última venda, real x interno),
+        # mantido incrementalmente a cada ingestão de itens
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS gtin_perfil (
+                gtin TEXT PRIMARY KEY,
+                descricao TEXT,
+                ncm TEXT,
+                frequencia INTEGER NOT NULL,
+                receita INTEGER NOT NULL,
+                primeira_venda TEXT,
+                ultima_venda TEXT,
+                tipo TEXT NOT NULL,
+                digito_valido INTEGER NOT NULL,
+                atualizado_em REAL
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_gtin_perfil_frequencia ON gtin_perfil(tipo, frequencia DESC)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_gtin_perfil_receita ON gtin_perfil(tipo, receita DESC)')
+        
+        # Sketches por dia (HyperLogLog e top-K) para estatísticas aproximadas de qualquer intervalo;
+        # a linha data='*' acumula todo o histórico
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS sketches_diarios (
+                data TEXT NOT NULL,
+                tipo TEXT NOT NULL,
+                conteudo BLOB NOT NULL,
+                atualizado_em REAL,
+                PRIMARY KEY (data, tipo)
+            )
+        ''')
+        
+        # Análise de cestas por emitente: cupons por produto, pares comprados juntos
+        # (gravados nas duas direções) e cupons já contados (idempotência da ingestão)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS cesta_produtos (
+                produto TEXT NOT NULL,
+                emitente_cnpj TEXT NOT NULL,
+                cupons INTEGER NOT NULL,
+                PRIMARY KEY (produto, emitente_cnpj)
+            ) WITHOUT ROWID
+        ''')
+        # Principais produtos de um emitente: busca pelo emitente já na ordem do GROUP BY produto
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_cesta_produtos_emitente ON cesta_produtos(emitente_cnpj, produto, cupons)')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS cesta_pares (
+                produto_a TEXT NOT NULL,
+                produto_b TEXT NOT NULL,
+                emitente_cnpj TEXT NOT NULL,
+                cupons INTEGER NOT NULL,
+                PRIMARY KEY (produto_a, produto_b, emitente_cnpj)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS cesta_totais (
+                emitente_cnpj TEXT PRIMARY KEY,
+                cupons INTEGER NOT NULL,
+                atualizado_em REAL
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS cesta_cupons (
+                chave_acesso TEXT PRIMARY KEY,
+                emitente_cnpj TEXT
+            ) WITHOUT ROWID
+        ''')
+        
+        # Cubo de vendas por dia/loja/caixa/hora (emitente e caixa desconhecidos = '')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS cubo_vendas (
+                data TEXT NOT NULL,
+                emitente_cnpj TEXT NOT NULL,
+                numero_caixa TEXT NOT NULL,
+                hora INTEGER NOT NULL,
+                dia_semana INTEGER NOT NULL,
+                faturamento INTEGER NOT NULL DEFAULT 0,
+                cupons INTEGER NOT NULL DEFAULT 0,
+                itens INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (data, emitente_cnpj, numero_caixa, hora)
+            ) WITHOUT ROWID
+        ''')
+        
+        # Versão dos dados: incrementada a cada escrita, usada para cache HTTP (ETag/Last-Modified)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS versao_dados (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                versao INTEGER NOT NULL,
+                atualizado_em REAL NOT NULL
+            )
+        ''')
+        cursor.execute('INSERT OR IGNORE INTO versao_dados (id, versao, atualizado_em) VALUES (1, 0, ?)', (time.time(),))
+        
         conn.commit()
         
+        if migrar_centavos or cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = '_cupons_real'").fetchone():
+            self._copiar_para_centavos(conn)
+        
         # Verificar e adicionar colunas faltantes se necessário
         self._check_and_add_columns(conn, cursor)
         
-        # Criar índices para performance
+        # Bancos antigos: monta o perfil de GTINs uma única vez a partir dos itens existentes
+        if (cursor.execute('SELECT 1 FROM itens LIMIT 1').fetchone()
+                and not cursor.execute('SELECT 1 FROM gtin_perfil LIMIT 1').fetchone()):
+            print("➕ Montando perfil de GTINs a partir dos itens existentes...")
+            reconstruir_perfil(conn)
+            conn.commit()
+        if (cursor.execute('SELECT 1 FROM cupons LIMIT 1').fetchone()
+                and not cursor.execute('SELECT 1 FROM sketches_diarios LIMIT 1').fetchone()):
+            print("➕ Montando sketches diários a partir dos dados existentes...")
+            reconstruir_sketches(conn)
+            conn.commit()
+        if (cursor.execute('SELECT 1 FROM itens LIMIT 1').fetchone()
+                and not cursor.execute('SELECT 1 FROM cesta_cupons LIMIT 1').fetchone()):
+            print("➕ Montando co-ocorrências de cestas a partir dos itens existentes...")
+            reconstruir_cestas(conn)
+            conn.commit()
+        if (cursor.execute('SELECT 1 FROM cupons LIMIT 1').fetchone()
+                and not cursor.execute('SELECT 1 FROM cubo_vendas LIMIT 1').fetchone()):
+            print("➕ Montando cubo de vendas por hora a partir dos dados existentes...")
+            reconstruir_cubo(conn)
+            conn.commit()
+        
+        # Criar índices para performance. Os de cobertura atendem as consultas de queries.py
+        # sem ler a tabela nem ordenar em B-tree temporária (conferido por query_plans.py)
         try:
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_cupons_chave ON cupons(chave_acesso)')
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_itens_chave ON itens(chave_acesso)')
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_itens_gtin ON itens(codigo_gtin)')
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_itens_data ON itens(data_enriquecimento)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_cupons_timestamp ON cupons(timestamp_emissao)')
+            # Top produtos (valor e quantidade), valor médio e análise de desconto
+            cursor.execute('''CREATE INDEX IF NOT EXISTS idx_itens_descricao
+                              ON itens(descricao, valor_total, quantidade, valor_unitario)''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_itens_cfop ON itens(cfop, valor_total)')
+            # Faturamento diário e intenções da consulta em linguagem natural (período + empresa)
+            cursor.execute('''CREATE INDEX IF NOT EXISTS idx_cupons_data
+                              ON cupons(data_emissao, emitente_razao_social, valor_total,
+                                        forma_pagamento, valor_pagamento)''')
+            # Recorte por emitente (shards, exportação): faturamento diário e chaves dos itens
+            cursor.execute('''CREATE INDEX IF NOT EXISTS idx_cupons_emitente_data
+                              ON cupons(emitente_cnpj, data_emissao, valor_total, chave_acesso)''')
+            # Substituídos: chave_acesso já tem o índice da PRIMARY KEY e emitente_cnpj é prefixo do anterior
+            cursor.execute('DROP INDEX IF EXISTS idx_cupons_chave')
+            cursor.execute('DROP INDEX IF EXISTS idx_cupons_emitente')
             conn.commit()
         except sqlite3.OperationalError as e:
             print(f"⚠️ Aviso ao criar índices: {e}")
@@ -95,46 +299,143 @@ class Database:
                     elif column == 'data_enriquecimento':
                         cursor.execute(f"ALTER TABLE itens ADD COLUMN {column} TIMESTAMP")
             
+            
+            # Caixa e instante de emissão (cubo de vendas por hora)
+            cursor.execute("PRAGMA table_info(cupons)")
+            columns = [column[1] for column in cursor.fetchall()]
+            if 'numero_caixa' not in columns:
+                print("➕ Adicionando coluna faltante: numero_caixa")
+                cursor.execute("ALTER TABLE cupons ADD COLUMN numero_caixa TEXT")
+            if 'timestamp_emissao' not in columns:
+                print("➕ Adicionando coluna faltante: timestamp_emissao")
+                cursor.execute("ALTER TABLE cupons ADD COLUMN timestamp_emissao INTEGER")
+                conn.create_function('timestamp_emissao', 2, timestamp_emissao, deterministic=True)
+                cursor.execute('''
+                    UPDATE cupons SET timestamp_emissao = timestamp_emissao(data_emissao, hora_emissao)
+                    WHERE data_emissao IS NOT NULL
+                ''')
+            
             conn.commit()
         except Exception as e:
             print(f"⚠️ Erro ao verificar/adicionar colunas: {e}")
     
+    def _preparar_migracao_centavos(self, conn):
+        """Bancos antigos com valores em REAL: guarda cupons/itens para cópia e descarta as tabelas
+        derivadas com valores (recriadas em INTEGER e reconstruídas pelo init_database)"""
+        tipos = {coluna[1]: coluna[2].upper() for coluna in conn.execute('PRAGMA table_info(cupons)')}
+        if tipos.get('valor_total') != 'REAL':
+            return False
+        print("➕ Migrando valores de REAL para inteiros (centavos)...")
+        conn.execute('BEGIN')
+        conn.execute('ALTER TABLE cupons RENAME TO _cupons_real')
+        conn.execute('ALTER TABLE itens RENAME TO _itens_real')
+        for tabela in ('gtin_perfil', 'sketches_diarios', 'cubo_vendas'):
+            conn.execute(f'DROP TABLE IF EXISTS {tabela}')
+        conn.commit()
+        return True
+    
+    def _copiar_para_centavos(self, conn):
+        """Copia os dados guardados por _preparar_migracao_centavos para as tabelas novas, convertendo
+        cada coluna pela escala (12.345 -> 12345 milésimos); ids dos itens são preservados"""
+        conn.create_function('timestamp_emissao', 2, timestamp_emissao, deterministic=True)
+        conn.execute('BEGIN')
+        for tabela in ('cupons', 'itens'):
+            antigas = [coluna[1] for coluna in conn.execute(f'PRAGMA table_info(_{tabela}_real)')]
+            colunas = [coluna[1] for coluna in conn.execute(f'PRAGMA table_info({tabela})') if coluna[1] in antigas]
+            valores = [f'CAST(ROUND({coluna} * {ESCALAS[coluna]}) AS INTEGER)' if coluna in ESCALAS else coluna
+                       for coluna in colunas]
+            if tabela == 'cupons' and 'timestamp_emissao' not in antigas:
+                colunas.append('timestamp_emissao')
+                valores.append('timestamp_emissao(data_emissao, hora_emissao)')
+            conn.execute(f'''
+                INSERT INTO {tabela} ({', '.join(colunas)})
+                SELECT {', '.join(valores)} FROM _{tabela}_real
+            ''')
+        conn.execute('DROP TABLE _itens_real')
+        conn.execute('DROP TABLE _cupons_real')
+        conn.commit()
+        print("✅ Valores convertidos para inteiros")
+    
+    def _registrar_alteracao(self, cursor):
+        """Incrementa a versão dos dados (chamar dentro da mesma transação da escrita)"""
+        cursor.execute('''
+            UPDATE versao_dados SET versao = versao + 1, atualizado_em = ? WHERE id = 1
+        ''', (time.time(),))
+    
+    def get_data_version(self):
+        """Retorna a versão atual dos dados e o instante da última alteração"""
+        conn = self._connect()
+        row = conn.execute('SELECT versao, atualizado_em FROM versao_dados WHERE id = 1').fetchone()
+        conn.close()
+        return {'versao': row[0], 'atualizado_em': row[1]}
+    
+    def _chaves_existentes(self, cursor, chaves, bloco=500):
+        """Chaves de acesso do lote que já estão no banco (cupons substituídos não contam de novo)"""
+        existentes = set()
+        for i in range(0, len(chaves), bloco):
+            parte = chaves[i:i + bloco]
+            marcadores = ','.join('?' * len(parte))
+            cursor.execute(f'SELECT chave_acesso FROM cupons WHERE chave_acesso IN ({marcadores})', parte)
+            existentes.update(row[0] for row in cursor.fetchall())
+        return existentes
+    
     def insert_notas(self, notas_data):
         """Insere cupons fiscais no banco (Parte 1 do desafio - Ingestão)"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
+        inicio = time.perf_counter()
+        existentes = self._chaves_existentes(cursor, [nota['chave_acesso'] for nota in notas_data])
         
         inseridos = 0
+        gravados = []
+        novos = []
         for nota in notas_data:
             try:
                 cursor.execute('''
                     INSERT OR REPLACE INTO cupons 
                     (chave_acesso, data_emissao, hora_emissao, valor_total, valor_desconto, 
                      valor_pis, valor_cofins, emitente_cnpj, emitente_razao_social, 
-                     forma_pagamento, valor_pagamento, destinatario_cpf, destinatario_nome)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                     forma_pagamento, valor_pagamento, destinatario_cpf, destinatario_nome,
+                     numero_caixa, timestamp_emissao)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                 ''', (
                     nota['chave_acesso'], nota['data_emissao'], nota['hora_emissao'],
                     nota['valor_total'], nota['valor_desconto'], nota['valor_pis'],
                     nota['valor_cofins'], nota['emitente_cnpj'], nota['emitente_razao_social'],
                     nota['forma_pagamento'], nota['valor_pagamento'],
-                    nota.get('destinatario_cpf'), nota.get('destinatario_nome')
+                    nota.get('destinatario_cpf'), nota.get('destinatario_nome'),
+                    nota.get('numero_caixa'), timestamp_emissao(nota['data_emissao'], nota['hora_emissao'])
                 ))
                 if cursor.rowcount > 0:
                     inseridos += 1
+                    gravados.append((nota['data_emissao'], nota.get('destinatario_cpf'), nota['emitente_cnpj'],
+                                     nota['chave_acesso'] not in existentes))
+                    if nota['chave_acesso'] not in existentes:
+                        novos.append(nota['chave_acesso'])
+                    existentes.add(nota['chave_acesso'])
             except sqlite3.IntegrityError:
                 print(f"⚠️ Cupom {nota['chave_acesso']} já existe no banco.")
             except Exception as e:
                 print(f"❌ Erro ao inserir cupom {nota['chave_acesso']}: {e}")
         
+        if inseridos > 0:
+            atualizar_sketches_cupons(conn, gravados)
+            atualizar_cubo_cupons(conn, novos)
+            self._registrar_alteracao(cursor)
         conn.commit()
         conn.close()
+        metrics.registrar_ingestao('cupons', inseridos, time.perf_counter() - inicio)
         print(f"✅ {inseridos} cupons inseridos/atualizados no banco.")
     
     def insert_itens(self, itens_data):
         """Insere itens dos cupons no banco (Parte 1 do desafio - Ingestão)"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
+        inicio = time.perf_counter()
+        # Lock de escrita antes de ler MAX(id): nenhum outro writer commita entre a leitura e os
+        # INSERTs, então id > ultimo_id são exatamente os itens deste lote (sem contar os de outro)
+        cursor.execute('BEGIN IMMEDIATE')
+        ultimo_id = cursor.execute('SELECT COALESCE(MAX(id), 0) FROM itens').fetchone()[0]
         
         inseridos = 0
         for item in itens_data:
@@ -157,13 +458,21 @@ class Database:
             except Exception as e:
                 print(f"❌ Erro ao inserir item {item['codigo_produto']}: {e}")
         
+        if inseridos > 0:
+            # Perfil de GTINs atualizado na mesma transação, só com os itens deste lote
+            atualizar_perfil(conn, ultimo_id)
+            atualizar_sketches_itens(conn, ultimo_id)
+            atualizar_cestas(conn, ultimo_id)
+            atualizar_cubo_itens(conn, ultimo_id)
+            self._registrar_alteracao(cursor)
         conn.commit()
         conn.close()
+        metrics.registrar_ingestao('itens', inseridos, time.perf_counter() - inicio)
         print(f"✅ {inseridos} itens inseridos/atualizados no banco.")
     
     def update_item_info(self, gtin, descricao, ncm):
         """Atualiza informações do produto baseado no GTIN (Parte 1 do desafio - Enriquecimento)"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
         try:
@@ -174,6 +483,8 @@ class Database:
             ''', (descricao, ncm, gtin))
             
             atualizados = cursor.rowcount
+            if atualizados > 0:
+                self._registrar_alteracao(cursor)
             conn.commit()
             
             if atualizados > 0:
@@ -188,7 +499,7 @@ class Database:
     
     def get_gtins_para_enriquecer(self, limit=10):
         """Retorna GTINs que ainda não foram enriquecidos (Parte 1 do desafio)"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         cursor.execute('''
             SELECT DISTINCT codigo_gtin 
@@ -204,7 +515,7 @@ class Database:
     
     def get_all_cupons(self):
         """Retorna todos os cupons fiscais"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         cursor.execute('SELECT * FROM cupons ORDER BY data_emissao DESC')
         cupons = cursor.fetchall()
@@ -213,7 +524,7 @@ class Database:
     
     def get_all_itens(self):
         """Retorna todos os itens"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         cursor.execute('''
             SELECT * FROM itens 
@@ -223,41 +534,30 @@ class Database:
         conn.close()
         return itens
     
-    def get_stats(self):
-        """Estatísticas do banco para relatório"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT COUNT(*) FROM cupons')
-        total_cupons = cursor.fetchone()[0]
-        
-        cursor.execute('SELECT COUNT(*) FROM itens')
-        total_itens = cursor.fetchone()[0]
-        
-        cursor.execute('SELECT COUNT(DISTINCT codigo_gtin) FROM itens WHERE codigo_gtin IS NOT NULL')
-        total_gtins = cursor.fetchone()[0]
-        
-        cursor.execute('SELECT COUNT(*) FROM itens WHERE descricao_enriquecida IS NOT NULL')
-        itens_enriquecidos = cursor.fetchone()[0]
-        
+    def get_stats(self, aproximado=False):
+        """Estatísticas do banco para relatório (`aproximado=True` lê os sketches, ±1%)"""
+        conn = self._connect()
+        if aproximado:
+            stats = estatisticas_aproximadas(conn)
+            conn.close()
+            return stats
+        # Mesma consulta do /api/stats (queries.py): CLI e API contam igual
+        cursor = conn.execute(STATS_QUERY)
+        colunas = [coluna[0] for coluna in cursor.description]
+        stats = dict(zip(colunas, cursor.fetchone()))
         conn.close()
-        
-        return {
-            'total_notas': total_cupons, 
-            'total_itens': total_itens,
-            'total_gtins': total_gtins,
-            'itens_enriquecidos': itens_enriquecidos
-        }
+        return stats
     
     def get_dashboard_data(self):
         """Dados para os dashboards (Parte 2 do desafio)"""
-        conn = sqlite3.connect(self.db_path)
+        import pandas as pd  # só este método usa pandas; importar aqui mantém o startup leve
+        conn = self._connect()
         
         # Top 5 produtos mais vendidos (Dashboard 1)
         top_produtos = pd.read_sql('''
             SELECT 
                 COALESCE(descricao_enriquecida, descricao) as produto,
-                SUM(valor_total) as total_vendido
+                SUM(valor_total) / 100.0 as total_vendido
             FROM itens 
             WHERE descricao IS NOT NULL
             GROUP BY produto 
@@ -269,7 +569,7 @@ class Database:
         faturamento_dia = pd.read_sql('''
             SELECT 
                 data_emissao as data,
-                SUM(valor_total) as faturamento
+                SUM(valor_total) / 100.0 as faturamento
             FROM cupons 
             WHERE data_emissao IS NOT NULL
             GROUP BY data_emissao 
@@ -279,8 +579,8 @@ class Database:
         # Análise de descontos (Dashboard 3)
         descontos = pd.read_sql('''
             SELECT 
-                (quantidade * valor_unitario) as valor_bruto,
-                ((quantidade * valor_unitario) - valor_total) as desconto
+                quantidade * valor_unitario / 10000000.0 as valor_bruto,
+                (quantidade * valor_unitario / 100000.0 - valor_total) / 100.0 as desconto
             FROM itens
             WHERE quantidade > 0 AND valor_unitario > 0
             LIMIT 100
@@ -296,11 +596,17 @@ class Database:
     
     def clear_database(self):
         """Limpa todas as tabelas (útil para testes)"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         cursor.execute('DELETE FROM itens')
         cursor.execute('DELETE FROM cupons')
+        cursor.execute('DELETE FROM gtin_perfil')
+        cursor.execute('DELETE FROM sketches_diarios')
+        cursor.execute('DELETE FROM cubo_vendas')
+        for tabela in ('cesta_pares', 'cesta_produtos', 'cesta_totais', 'cesta_cupons'):
+            cursor.execute(f'DELETE FROM {tabela}')
         cursor.execute('UPDATE SQLITE_SEQUENCE SET seq = 0 WHERE name = "itens"')
+        self._registrar_alteracao(cursor)
         conn.commit()
         conn.close()
         print("🗑️ Banco de dados limpo!")
@@ -0,0 +1,141 @@
+import os
+import socket
+import time
+from gtin_cache import TTL_NEGATIVO
+
+PENDENTE = 'pendente'
+EM_ANDAMENTO = 'em_andamento'
+CONCLUIDO = 'concluido'
+FALHOU = 'falhou'
+
+# Critérios de prioridade da fila (maior primeiro)
+PRIORIDADES = {
+    'frequencia': 'frequencia',
+    'receita': 'receita',
+}
+
+
+def worker_id_padrao():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+class EnrichmentQueue:
+    """Fila persistente de enriquecimento de GTINs (tabela fila_enriquecimento).
+
+    Cada GTIN passa por pendente -> em_andamento -> concluido, ou falhou com
+    `retry_apos` (backoff exponencial). Concluídos sem descrição (GTIN desconhecido)
+    também ganham `retry_apos`, igual ao TTL negativo do cache, e são consultados de
+    novo quando ele vence. Workers reservam lotes com um lease;
+    se um worker morrer, o lease expira e o GTIN volta a ficar disponível.
+    Cada conclusão é gravada na hora, então uma nova execução continua de onde parou.
+    """
+
+    def __init__(self, db, lease=300, max_tentativas=5, backoff=3600, backoff_max=7 * 24 * 3600,
+                 ttl_negativo=TTL_NEGATIVO):
+        self.db = db
+        self.lease = lease
+        self.max_tentativas = max_tentativas
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.ttl_negativo = ttl_negativo
+
+    def sincronizar(self, criterio='frequencia'):
+        """Inclui GTINs reais novos do perfil (gtin_perfil) na fila e atualiza as prioridades.
+
+        GTINs já concluídos com descrição encontrada voltam para pendente
+        quando chegam itens novos ainda não enriquecidos.
+        """
+        prioridade = PRIORIDADES[criterio]
+        conn = self.db.conexao()
+        conn.execute(f'''
+            INSERT INTO fila_enriquecimento
+                (gtin, descricao, frequencia, receita, prioridade, estado, tentativas, atualizado_em)
+            SELECT gtin, descricao, frequencia, receita, {prioridade}, '{PENDENTE}', 0, ?
+            FROM gtin_perfil
+            WHERE tipo = 'real'
+            ON CONFLICT(gtin) DO UPDATE SET
+                frequencia = excluded.frequencia,
+                receita = excluded.receita,
+                prioridade = excluded.prioridade,
+                estado = CASE
+                    WHEN fila_enriquecimento.estado = '{CONCLUIDO}' AND fila_enriquecimento.encontrado = 1
+                         AND EXISTS (SELECT 1 FROM itens i WHERE i.codigo_gtin = excluded.gtin
+                                     AND i.descricao_enriquecida IS NULL)
+                    THEN '{PENDENTE}'
+                    ELSE fila_enriquecimento.estado
+                END
+        ''', (time.time(),))
+        conn.commit()
+        conn.close()
+        return self.resumo()
+
+    def reservar(self, worker, quantidade=10):
+        """Reserva atomicamente os próximos GTINs por prioridade; retorna [(gtin, descricao)]"""
+        agora = time.time()
+        conn = self.db.conexao()
+        conn.isolation_level = None
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            rows = conn.execute(f'''
+                SELECT gtin, descricao FROM fila_enriquecimento
+                WHERE estado = '{PENDENTE}'
+                   OR (estado = '{FALHOU}' AND retry_apos <= ? AND tentativas < ?)
+                   OR (estado = '{EM_ANDAMENTO}' AND lease_expira <= ?)
+                   OR (estado = '{CONCLUIDO}' AND encontrado = 0
+                       AND COALESCE(retry_apos, atualizado_em + ?) <= ?)
+                ORDER BY prioridade DESC
+                LIMIT ?
+            ''', (agora, self.max_tentativas, agora, self.ttl_negativo, agora, quantidade)).fetchall()
+            conn.executemany(f'''
+                UPDATE fila_enriquecimento
+                SET estado = '{EM_ANDAMENTO}', lease_dono = ?, lease_expira = ?,
+                    tentativas = tentativas + 1, atualizado_em = ?
+                WHERE gtin = ?
+            ''', [(worker, agora + self.lease, agora, gtin) for gtin, _ in rows])
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+        return rows
+
+    def concluir(self, worker, resultados):
+        """Marca como concluídos {gtin: encontrado} (só os que ainda pertencem a este worker).
+
+        Não encontrados voltam à fila depois do TTL negativo (o cache também já terá expirado);
+        a resposta definitiva zera as tentativas, que contam só falhas de rede seguidas.
+        """
+        agora = time.time()
+        conn = self.db.conexao()
+        conn.executemany(f'''
+            UPDATE fila_enriquecimento
+            SET estado = '{CONCLUIDO}', encontrado = ?, lease_dono = NULL, lease_expira = NULL,
+                ultimo_erro = NULL, tentativas = 0, retry_apos = ?, atualizado_em = ?
+            WHERE gtin = ? AND lease_dono = ?
+        ''', [(int(encontrado), None if encontrado else agora + self.ttl_negativo, agora, gtin, worker)
+              for gtin, encontrado in resultados.items()])
+        conn.commit()
+        conn.close()
+
+    def falhar(self, worker, gtins, erro):
+        """Devolve GTINs com falha temporária, com retry_apos crescente a cada tentativa"""
+        agora = time.time()
+        conn = self.db.conexao()
+        conn.executemany(f'''
+            UPDATE fila_enriquecimento
+            SET estado = '{FALHOU}', lease_dono = NULL, lease_expira = NULL, ultimo_erro = ?,
+                retry_apos = ? + MIN(?, ? * (1 << (tentativas - 1))), atualizado_em = ?
+            WHERE gtin = ? AND lease_dono = ?
+        ''', [(erro, agora, self.backoff_max, self.backoff, agora, gtin, worker) for gtin in gtins])
+        conn.commit()
+        conn.close()
+
+    def resumo(self):
+        """Quantidade de GTINs por estado"""
+        conn = self.db.conexao()
+        rows = conn.execute('SELECT estado, COUNT(*) FROM fila_enriquecimento GROUP BY estado').fetchall()
+        conn.close()
+        resumo = {PENDENTE: 0, EM_ANDAMENTO: 0, CONCLUIDO: 0, FALHOU: 0}
+        resumo.update(dict(rows))
+        return resumo
@@ -0,0 +1,114 @@
+import csv
+import io
+import json
+import re
+import zlib
+
+from money import converter_linha
+
+# Linhas lidas do cursor por vez: a memória fica constante independentemente do total exportado
+EXPORT_BATCH_SIZE = 2000
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+_DATA_RE = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+
+
+def build_export_query(tabela, data_inicio=None, data_fim=None, emitente=None):
+    """Monta o SELECT da exportação com os filtros opcionais (data_emissao e emitente_cnpj)"""
+    for data in (data_inicio, data_fim):
+        if data and not _DATA_RE.match(data):
+            raise ValueError(f"Data inválida: '{data}' (use AAAA-MM-DD)")
+
+    if tabela == 'cupons':
+        sql = 'SELECT c.* FROM cupons c'
+    elif tabela == 'itens':
+        # Itens levam data e emitente do cupom para permitir o filtro e a análise no BI
+        sql = '''
+            SELECT i.*, c.data_emissao, c.emitente_cnpj
+            FROM itens i
+            JOIN cupons c ON c.chave_acesso = i.chave_acesso
+        '''
+    else:
+        raise ValueError(f"Tabela inválida para exportação: '{tabela}'")
+
+    filtros, params = [], []
+    if data_inicio:
+        filtros.append('c.data_emissao >= ?')
+        params.append(data_inicio)
+    if data_fim:
+        filtros.append('c.data_emissao <= ?')
+        params.append(data_fim)
+    if emitente:
+        filtros.append('c.emitente_cnpj = ?')
+        params.append(emitente)
+
+    if filtros:
+        sql += ' WHERE ' + ' AND '.join(filtros)
+    return sql, params
+
+
+def iter_batches(connect, sql, params, batch_size=EXPORT_BATCH_SIZE):
+    """Percorre o resultado em lotes (cursor do lado do servidor); gera (colunas, linhas).
+
+    O primeiro lote sai mesmo vazio, para que o consumidor sempre receba as colunas.
+    Valores e quantidades saem em reais/unidades, não nos inteiros escalados do banco.
+    """
+    conn = connect()
+    try:
+        cursor = conn.execute(sql, params)
+        colunas = [col[0] for col in cursor.description]
+        linhas = cursor.fetchmany(batch_size)
+        while True:
+            yield colunas, [converter_linha(colunas, linha) for linha in linhas]
+            linhas = cursor.fetchmany(batch_size)
+            if not linhas:
+                break
+    finally:
+        conn.close()
+
+
+def stream_csv(connect, sql, params):
+    """CSV com cabeçalho (tirado de cursor.description, então presente mesmo sem linhas)"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    cabecalho = False
+    for colunas, linhas in iter_batches(connect, sql, params):
+        if not cabecalho:
+            writer.writerow(colunas)
+            cabecalho = True
+        writer.writerows(linhas)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def stream_ndjson(connect, sql, params):
+    for colunas, linhas in iter_batches(connect, sql, params):
+        if linhas:
+            yield ''.join(json.dumps(dict(zip(colunas, linha)), ensure_ascii=False) + '\n' for linha in linhas)
+
+
+def gzip_stream(chunks):
+    """Comprime um gerador de texto em gzip sem acumular o conteúdo"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31: container gzip
+    for chunk in chunks:
+        dados = compressor.compress(chunk.encode('utf-8'))
+        if dados:
+            yield dados
+    yield compressor.flush()
+
+
+def export_stream(connect, tabela, formato, data_inicio=None, data_fim=None, emitente=None, gzip=False):
+    """Gerador com o conteúdo da exportação no formato pedido (opcionalmente gzip)"""
+    if formato not in EXPORT_FORMATS:
+        raise ValueError(f"Formato inválido: '{formato}' (use csv ou ndjson)")
+
+    sql, params = build_export_query(tabela, data_inicio, data_fim, emitente)
+    chunks = stream_csv(connect, sql, params) if formato == 'csv' else stream_ndjson(connect, sql, params)
+    if gzip:
+        return gzip_stream(chunks)
+    return (chunk.encode('utf-8') for chunk in chunks)
@@ -0,0 +1,142 @@
+import threading
+import time
+from collections import OrderedDict
+
+# Produtos conhecidos (levantados dos XMLs): carregados no cache como dados semente, sem expiração
+GTINS_CONHECIDOS = {
+    "7622300861148": ("REFRIGERANTE TANG 25G", "21069010"),
+    "7622300861308": ("REFRIGERANTE TANG 25G", "21069010"),
+    "7622300861261": ("REFRIGERANTE TANG 25G", "21069010"),
+    "7622300861223": ("REFRIGERANTE TANG 25G", "21069010"),
+    "7896273100393": ("ENERGÉTICO RED TIGER 2L", "22029900"),
+    "7898080640017": ("LEITE LONGA VIDA ITALAC 1L", "04012010"),
+    "7896279600538": ("ÓLEO DE SOJA COAMO 900ML", "15079011"),
+    "7898954959078": ("COENTRO HIDROPÔNICO", "07108000"),
+    "7896045505357": ("CERVEJA HEINEKEN 250ML", "22030000"),
+    "7894900011517": ("REFRIGERANTE COCA-COLA 2L", "22021000"),
+    "7894900011012": ("REFRIGERANTE COCA-COLA LATA 350ML", "22021000"),
+    "7891000305508": ("LEITE CONDENSADO MOÇA 395G", "04029900"),
+    "7893000362549": ("SABÃO EM PÓ OMO 1KG", "34012090"),
+    "7891156003068": ("LEITE FERMENTADO YAKULT 80G", "04039000"),
+    "7891203010308": ("PÃO DE FORMA PANCO COCO 350G", "19059090"),
+    "7894000182018": ("BEBIDA DE SOJA ADES MAÇÃ 1L", "22029900"),
+    "7896353301184": ("REQUEIJÃO CATUPIRY 200G", "04061090")
+}
+
+TTL_POSITIVO = 30 * 24 * 3600   # produto encontrado: revalida em 30 dias
+TTL_NEGATIVO = 24 * 3600        # GTIN desconhecido: tenta de novo só no dia seguinte
+
+# Limite de variáveis por statement do SQLite (consultas em lote com IN)
+_LOTE_SQL = 500
+
+
+class GTINCache:
+    """Cache durável de consultas de GTIN (tabela gtin_cache) com um LRU em memória na frente.
+
+    Guarda acertos com TTL longo e erros (GTIN desconhecido) com TTL curto,
+    para que uma nova execução só vá à rede para GTINs realmente novos.
+    """
+
+    def __init__(self, db, memoria=4096, ttl=TTL_POSITIVO, ttl_negativo=TTL_NEGATIVO):
+        self.db = db
+        self.memoria = memoria
+        self.ttl = ttl
+        self.ttl_negativo = ttl_negativo
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self.carregar_sementes()
+
+    def carregar_sementes(self, sementes=GTINS_CONHECIDOS):
+        """Grava os GTINs conhecidos como entradas permanentes (fonte 'manual')"""
+        conn = self.db.conexao()
+        agora = time.time()
+        conn.executemany('''
+            INSERT OR REPLACE INTO gtin_cache (gtin, descricao, ncm, encontrado, fonte, atualizado_em, expira_em)
+            VALUES (?, ?, ?, 1, 'manual', ?, NULL)
+        ''', [(gtin, descricao, ncm, agora) for gtin, (descricao, ncm) in sementes.items()])
+        conn.commit()
+        conn.close()
+
+    def _lembrar(self, gtin, entrada):
+        with self._lock:
+            self._lru[gtin] = entrada
+            self._lru.move_to_end(gtin)
+            while len(self._lru) > self.memoria:
+                self._lru.popitem(last=False)
+
+    def _da_memoria(self, gtin, agora):
+        with self._lock:
+            entrada = self._lru.get(gtin)
+            if entrada is None:
+                return None
+            if entrada[2] is not None and entrada[2] <= agora:
+                del self._lru[gtin]
+                return None
+            self._lru.move_to_end(gtin)
+            return entrada
+
+    def get_many(self, gtins):
+        """Retorna {gtin: (descricao, ncm)} para os GTINs em cache e válidos.
+
+        GTINs em cache negativo aparecem como (None, None); os ausentes do
+        dicionário precisam ser consultados.
+        """
+        agora = time.time()
+        encontrados = {}
+        faltando = []
+        for gtin in dict.fromkeys(gtins):
+            entrada = self._da_memoria(gtin, agora)
+            if entrada is None:
+                faltando.append(gtin)
+            else:
+                encontrados[gtin] = entrada[:2]
+
+        if faltando:
+            conn = self.db.conexao()
+            for i in range(0, len(faltando), _LOTE_SQL):
+                lote = faltando[i:i + _LOTE_SQL]
+                rows = conn.execute(f'''
+                    SELECT gtin, descricao, ncm, expira_em FROM gtin_cache
+                    WHERE gtin IN ({','.join('?' * len(lote))})
+                    AND (expira_em IS NULL OR expira_em > ?)
+                ''', (*lote, agora)).fetchall()
+                for gtin, descricao, ncm, expira_em in rows:
+                    self._lembrar(gtin, (descricao, ncm, expira_em))
+                    encontrados[gtin] = (descricao, ncm)
+            conn.close()
+
+        return encontrados
+
+    def get(self, gtin):
+        """(descricao, ncm) se o GTIN está em cache ((None, None) se negativo); None se não está"""
+        return self.get_many([gtin]).get(gtin)
+
+    def put_many(self, resultados, fonte):
+        """Grava {gtin: (descricao, ncm)}; descrição vazia vira entrada negativa (TTL curto)"""
+        agora = time.time()
+        linhas = []
+        for gtin, (descricao, ncm) in resultados.items():
+            encontrado = bool(descricao)
+            expira_em = agora + (self.ttl if encontrado else self.ttl_negativo)
+            linhas.append((gtin, descricao, ncm, int(encontrado), fonte, agora, expira_em))
+            self._lembrar(gtin, (descricao, ncm, expira_em))
+
+        if linhas:
+            conn = self.db.conexao()
+            conn.executemany('''
+                INSERT OR REPLACE INTO gtin_cache (gtin, descricao, ncm, encontrado, fonte, atualizado_em, expira_em)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', linhas)
+            conn.commit()
+            conn.close()
+
+    def put(self, gtin, descricao, ncm, fonte):
+        self.put_many({gtin: (descricao, ncm)}, fonte)
+
+    def limpar_expirados(self):
+        """Remove entradas vencidas da tabela (as sementes não expiram)"""
+        conn = self.db.conexao()
+        removidos = conn.execute('DELETE FROM gtin_cache WHERE expira_em <= ?', (time.time(),)).rowcount
+        conn.commit()
+        conn.close()
+        return removidos
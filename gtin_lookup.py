@@ -0,0 +1,144 @@
+import asyncio
+import http.client
+import json
+import random
+import time
+import urllib.error
+import urllib.request
+
+BRASILAPI_GTIN_URL = 'https://brasilapi.com.br/api/gtins/v1'
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+
+# Respostas que valem nova tentativa (limite de taxa e falhas temporárias do servidor)
+STATUS_RETRY = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Limita a taxa de requisições: `taxa` por segundo, com rajadas de até `capacidade`"""
+
+    def __init__(self, taxa, capacidade=None):
+        self.taxa = taxa
+        self.capacidade = capacidade or max(1, int(taxa))
+        self._tokens = float(self.capacidade)
+        self._ultimo = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                agora = time.monotonic()
+                self._tokens = min(self.capacidade, self._tokens + (agora - self._ultimo) * self.taxa)
+                self._ultimo = agora
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.taxa)
+
+
+class GTINLookupClient:
+    """Consulta GTINs em uma API JSON (Brasil API por padrão) de forma concorrente.
+
+    As requisições rodam em asyncio com limite de concorrência, token bucket,
+    timeout por requisição e novas tentativas com backoff exponencial e jitter.
+    `base_url` pode apontar para um servidor HTTP local nos testes.
+    """
+
+    def __init__(self, base_url=BRASILAPI_GTIN_URL, concorrencia=8, taxa=5.0, rajada=None,
+                 timeout=10.0, tentativas=3, backoff=0.5):
+        self.base_url = base_url.rstrip('/')
+        self.concorrencia = concorrencia
+        self.taxa = taxa
+        self.rajada = rajada
+        self.timeout = timeout
+        self.tentativas = tentativas
+        self.backoff = backoff
+
+    def _http_get(self, url):
+        """GET bloqueante (executado em thread); retorna (status, corpo, headers)"""
+        req = urllib.request.Request(url, headers={'User-Agent': USER_AGENT, 'Accept': 'application/json'})
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                return resp.status, resp.read(), resp.headers
+        except urllib.error.HTTPError as e:
+            return e.code, e.read(), e.headers
+
+    def _espera(self, tentativa, headers=None):
+        retry_after = headers.get('Retry-After') if headers else None
+        if retry_after and retry_after.isdigit():
+            return float(retry_after)
+        return self.backoff * (2 ** tentativa) * random.uniform(0.5, 1.5)
+
+    @staticmethod
+    def parse_produto(corpo):
+        """Extrai (descricao, ncm) do JSON da API; JSON inválido levanta ValueError (resposta corrompida)"""
+        data = json.loads(corpo)
+        if not isinstance(data, dict):
+            return None, None
+
+        descricao = data.get('description') or ''
+        ncm = data.get('ncm') or ''
+        if isinstance(ncm, dict):
+            ncm = ncm.get('code') or ''
+
+        if descricao and len(descricao) > 5:
+            return descricao, ncm
+        return None, None
+
+    async def _lookup(self, gtin, semaforo, bucket):
+        url = f'{self.base_url}/{gtin}'
+        for tentativa in range(self.tentativas):
+            headers = None
+            async with semaforo:
+                await bucket.acquire()
+                try:
+                    status, corpo, headers = await asyncio.wait_for(
+                        asyncio.to_thread(self._http_get, url), self.timeout + 1)
+                    if status == 200:
+                        return self.parse_produto(corpo)
+                except (asyncio.TimeoutError, OSError, http.client.HTTPException, ValueError) as e:
+                    # Timeout, conexão caída, resposta truncada (IncompleteRead) ou JSON inválido:
+                    # falha só deste GTIN, tentada de novo como um timeout
+                    print(f"⚠️ GTIN {gtin}: falha na consulta ({e.__class__.__name__}), tentativa {tentativa + 1}/{self.tentativas}")
+                    status = None
+
+            if status is not None and status not in STATUS_RETRY:
+                # 404 e afins: GTIN desconhecido, não adianta repetir
+                return None, None
+            if tentativa + 1 < self.tentativas:
+                await asyncio.sleep(self._espera(tentativa, headers))
+
+        print(f"❌ GTIN {gtin}: sem resposta após {self.tentativas} tentativas")
+        return None
+
+    async def lookup_many(self, gtins, com_falhas=False):
+        """Consulta vários GTINs em paralelo; retorna {gtin: (descricao, ncm)}.
+
+        Com `com_falhas=True` retorna (resultados, falhas): GTINs que esgotaram
+        as tentativas ficam em `falhas` em vez de aparecerem como desconhecidos.
+        """
+        semaforo = asyncio.Semaphore(self.concorrencia)
+        bucket = TokenBucket(self.taxa, self.rajada)
+        gtins = list(dict.fromkeys(gtins))
+        respostas = await asyncio.gather(*(self._lookup(gtin, semaforo, bucket) for gtin in gtins))
+
+        resultados, falhas = {}, set()
+        for gtin, resposta in zip(gtins, respostas):
+            if resposta is None:
+                falhas.add(gtin)
+                resposta = (None, None)
+            resultados[gtin] = resposta
+
+        if com_falhas:
+            return {g: r for g, r in resultados.items() if g not in falhas}, falhas
+        return resultados
+
+    async def lookup(self, gtin):
+        return (await self.lookup_many([gtin]))[gtin]
+
+    def lookup_many_sync(self, gtins, com_falhas=False):
+        """Versão síncrona de lookup_many (para código fora de um event loop)"""
+        return asyncio.run(self.lookup_many(gtins, com_falhas))
+
+    def lookup_sync(self, gtin):
+        return asyncio.run(self.lookup(gtin))
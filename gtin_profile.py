@@ -0,0 +1,109 @@
+import time
+
+REAL = 'real'
+INTERNO = 'interno'
+
+# Ordenações permitidas na leitura do perfil (cada uma tem índice próprio)
+ORDENACOES = ('frequencia', 'receita')
+
+
+def gtin_digito_valido(gtin):
+    """Valida o dígito verificador GS1 (GTIN-8/12/13/14)"""
+    if not gtin or not gtin.isdigit() or len(gtin) not in (8, 12, 13, 14):
+        return False
+    digitos = [int(d) for d in gtin]
+    soma = sum(d * (3 if i % 2 == 0 else 1) for i, d in enumerate(reversed(digitos[:-1])))
+    return (10 - soma % 10) % 10 == digitos[-1]
+
+
+def classificar_gtin(gtin):
+    """'real' para GTIN válido de circulação geral; 'interno' para códigos da loja.
+
+    Prefixos de circulação restrita (pesáveis/uso interno: 02x, 04x e 2xx no
+    GTIN-13; 0 e 2 no GTIN-8) são tratados como códigos internos.
+    """
+    if not gtin_digito_valido(gtin):
+        return INTERNO
+    if len(gtin) == 8:
+        return INTERNO if gtin.startswith(('0', '2')) else REAL
+    gtin13 = gtin[-13:].zfill(13)
+    return INTERNO if gtin13.startswith(('2', '02', '04')) else REAL
+
+
+# Mesmo critério do antigo loop em Python: descarta vazios, 'None', 'SEM GTIN' e códigos curtos
+_FILTRO_GTIN = '''
+    i.codigo_gtin IS NOT NULL AND i.codigo_gtin NOT IN ('None', 'SEM GTIN') AND LENGTH(i.codigo_gtin) >= 8
+'''
+
+_AGREGADO = f'''
+    SELECT i.codigo_gtin, MAX(i.descricao), MAX(i.ncm), COUNT(*), COALESCE(SUM(i.valor_total), 0),
+           MIN(c.data_emissao), MAX(c.data_emissao),
+           gtin_tipo(i.codigo_gtin), gtin_digito_valido(i.codigo_gtin), ?
+    FROM itens i
+    LEFT JOIN cupons c ON c.chave_acesso = i.chave_acesso
+    WHERE {_FILTRO_GTIN} AND i.id > ?
+    GROUP BY i.codigo_gtin
+'''
+
+
+def _registrar_funcoes(conn):
+    conn.create_function('gtin_tipo', 1, classificar_gtin, deterministic=True)
+    conn.create_function('gtin_digito_valido', 1, lambda g: int(gtin_digito_valido(g)), deterministic=True)
+
+
+def atualizar_perfil(conn, ultimo_id):
+    """Soma ao perfil os itens com id > ultimo_id (chamado na mesma transação da ingestão)"""
+    _registrar_funcoes(conn)
+    conn.execute(f'''
+        INSERT INTO gtin_perfil
+            (gtin, descricao, ncm, frequencia, receita, primeira_venda, ultima_venda,
+             tipo, digito_valido, atualizado_em)
+        {_AGREGADO}
+        ON CONFLICT(gtin) DO UPDATE SET
+            descricao = COALESCE(excluded.descricao, gtin_perfil.descricao),
+            ncm = COALESCE(excluded.ncm, gtin_perfil.ncm),
+            frequencia = gtin_perfil.frequencia + excluded.frequencia,
+            receita = gtin_perfil.receita + excluded.receita,
+            primeira_venda = MIN(COALESCE(gtin_perfil.primeira_venda, excluded.primeira_venda),
+                                 COALESCE(excluded.primeira_venda, gtin_perfil.primeira_venda)),
+            ultima_venda = MAX(COALESCE(gtin_perfil.ultima_venda, excluded.ultima_venda),
+                               COALESCE(excluded.ultima_venda, gtin_perfil.ultima_venda)),
+            atualizado_em = excluded.atualizado_em
+    ''', (time.time(), ultimo_id))
+
+
+def reconstruir_perfil(conn):
+    """Recalcula o perfil inteiro a partir de itens (migração ou correção)"""
+    conn.execute('DELETE FROM gtin_perfil')
+    atualizar_perfil(conn, 0)
+
+
+class GTINProfile:
+    """Leitura do perfil agregado de GTINs (tabela gtin_perfil, mantida na ingestão)"""
+
+    def __init__(self, db):
+        self.db = db
+
+    def top(self, n=10, tipo=REAL, ordem='frequencia'):
+        """Top N GTINs do tipo pedido, pelo índice (tipo, ordem)"""
+        if ordem not in ORDENACOES:
+            raise ValueError(f"Ordenação inválida: '{ordem}'")
+        conn = self.db.conexao()
+        rows = conn.execute(f'''
+            SELECT gtin, descricao, ncm, frequencia, receita, primeira_venda, ultima_venda, digito_valido
+            FROM gtin_perfil
+            WHERE tipo = ?
+            ORDER BY {ordem} DESC
+            LIMIT ?
+        ''', (tipo, n)).fetchall()
+        conn.close()
+        colunas = ('gtin', 'descricao', 'ncm', 'frequencia', 'receita', 'primeira_venda', 'ultima_venda', 'digito_valido')
+        return [dict(zip(colunas, row)) for row in rows]
+
+    def contagem_por_tipo(self):
+        conn = self.db.conexao()
+        rows = conn.execute('SELECT tipo, COUNT(*) FROM gtin_perfil GROUP BY tipo').fetchall()
+        conn.close()
+        contagem = {REAL: 0, INTERNO: 0}
+        contagem.update(dict(rows))
+        return contagem
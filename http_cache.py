@@ -0,0 +1,84 @@
+import gzip
+import zlib
+from datetime import datetime, timezone
+from functools import wraps
+from flask import request, make_response
+from queries import VERSAO_QUERY
+
+# Respostas JSON menores que isso não compensam o custo de compressão
+COMPRESS_MIN_SIZE = 1024
+
+
+def get_data_version(conn):
+    """Lê a versão dos dados gravada pelo Database a cada escrita"""
+    try:
+        row = conn.execute(VERSAO_QUERY).fetchone()
+    except Exception:
+        # Banco antigo/ainda não inicializado: sem versão, sem cache
+        return None
+    return (row[0], row[1]) if row else None
+
+
+def cached_json(get_version):
+    """Decorator de rota: ETag/Last-Modified amarrados à versão dos dados.
+
+    Se o cliente já tem a versão atual (If-None-Match / If-Modified-Since),
+    responde 304 sem executar a consulta da rota.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            versao = get_version()
+            if versao is None:
+                return view(*args, **kwargs)
+
+            numero, atualizado_em = versao
+            etag = f'v{numero}'
+            last_modified = datetime.fromtimestamp(int(atualizado_em), timezone.utc)
+
+            if request.if_none_match:
+                nao_modificado = request.if_none_match.contains_weak(etag)
+            else:
+                nao_modificado = (request.if_modified_since is not None
+                                  and last_modified <= request.if_modified_since)
+
+            if nao_modificado:
+                response = make_response('', 304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            # Weak: o corpo pode ser comprimido, mas o conteúdo é o mesmo
+            response.set_etag(etag, weak=True)
+            response.last_modified = last_modified
+            response.cache_control.no_cache = True
+            return response
+        return wrapper
+    return decorator
+
+
+def compress_response(response):
+    """after_request: comprime (gzip/deflate) respostas JSON acima do limite"""
+    if response.mimetype != 'application/json':
+        return response
+
+    response.vary.add('Accept-Encoding')
+
+    if (response.status_code != 200 or response.direct_passthrough
+            or response.is_streamed or 'Content-Encoding' in response.headers):
+        return response
+
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_SIZE:
+        return response
+
+    encodings = request.accept_encodings
+    if encodings['gzip']:
+        response.set_data(gzip.compress(data, compresslevel=6))
+        response.headers['Content-Encoding'] = 'gzip'
+    elif encodings['deflate']:
+        response.set_data(zlib.compress(data, 6))
+        response.headers['Content-Encoding'] = 'deflate'
+
+    return response
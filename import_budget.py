@@ -0,0 +1,77 @@
+import argparse
+import os
+import subprocess
+import sys
+
+# Orçamento de tempo de import (ms) de cada ponto de entrada, medido com `python -X importtime`
+IMPORT_BUDGET_MS = {
+    'app': 400,
+    'main': 250,
+    'scraper': 200,
+    'pipeline': 50,
+    'xml_parser': 100,
+    'database': 100,
+}
+
+# Dependências pesadas que só podem ser carregadas no caminho de código que as usa
+PESADOS = ('pandas', 'numpy', 'scipy', 'selenium', 'openpyxl')
+
+
+def medir_import(modulo):
+    """Importa `modulo` num processo limpo; retorna (ms, pesados carregados)"""
+    codigo = (f"import sys, {modulo}; "
+              f"print(','.join(p for p in {PESADOS!r} if p in sys.modules))")
+    resultado = subprocess.run([sys.executable, '-X', 'importtime', '-c', codigo],
+                               capture_output=True, text=True,
+                               cwd=os.path.dirname(os.path.abspath(__file__)))
+    if resultado.returncode != 0:
+        raise RuntimeError(f"falha ao importar {modulo}: {resultado.stderr.strip().splitlines()[-1:]}")
+
+    cumulativo_us = None
+    for linha in resultado.stderr.splitlines():
+        # "import time:  self [us] | cumulative | imported package"
+        if not linha.startswith('import time:'):
+            continue
+        partes = linha[len('import time:'):].split('|')
+        if len(partes) == 3 and partes[2].strip() == modulo and partes[1].strip().isdigit():
+            cumulativo_us = int(partes[1])
+    pesados = [p for p in resultado.stdout.strip().split(',') if p]
+    return (cumulativo_us or 0) / 1000, pesados
+
+
+def verificar(modulos=None, repeticoes=3, fator=1.0):
+    """Mede cada ponto de entrada (melhor de N execuções); retorna a lista de violações"""
+    violacoes = []
+    for modulo in modulos or IMPORT_BUDGET_MS:
+        medicoes = [medir_import(modulo) for _ in range(repeticoes)]
+        ms = min(m for m, _ in medicoes)
+        pesados = medicoes[0][1]
+        limite = IMPORT_BUDGET_MS.get(modulo, 0) * fator
+
+        status = '✅'
+        if limite and ms > limite:
+            violacoes.append(f"{modulo}: {ms:.0f} ms > orçamento de {limite:.0f} ms")
+            status = '❌'
+        if pesados:
+            violacoes.append(f"{modulo}: carrega {', '.join(pesados)} no import")
+            status = '❌'
+        print(f"{status} {modulo:<12}{ms:>8.1f} ms (orçamento {limite:.0f} ms)"
+              + (f"  pesados: {', '.join(pesados)}" if pesados else ''))
+    return violacoes
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Confere o tempo de import dos pontos de entrada')
+    parser.add_argument('modulos', nargs='*', help='módulos a medir (padrão: todos do orçamento)')
+    parser.add_argument('--repeticoes', type=int, default=3)
+    parser.add_argument('--fator', type=float, default=float(os.environ.get('IMPORT_BUDGET_FATOR', 1.0)),
+                        help='multiplica os orçamentos (máquinas mais lentas)')
+    args = parser.parse_args()
+
+    violacoes = verificar(args.modulos, args.repeticoes, args.fator)
+    if violacoes:
+        print("\n❌ ORÇAMENTO DE IMPORT ESTOURADO:")
+        for violacao in violacoes:
+            print(f"   • {violacao}")
+        sys.exit(1)
+    print("\n✅ Todos os pontos de entrada dentro do orçamento")
@@ -0,0 +1,132 @@
+import json
+import queue
+import threading
+import time
+
+
+class _Cliente:
+    def __init__(self, maxsize):
+        self.fila = queue.Queue(maxsize=maxsize)
+        self.ativo = True
+
+
+class LiveUpdates:
+    """Distribui atualizações dos dashboards via Server-Sent Events.
+
+    Uma única thread observa a versão dos dados; quando ela muda (ingestão ou
+    enriquecimento), o snapshot é recalculado UMA vez e apenas o delta é
+    enviado a todos os clientes conectados.
+    """
+
+    def __init__(self, get_version, calcular_snapshot, intervalo=2.0, keepalive=15.0, max_pendentes=50):
+        self.get_version = get_version
+        self.calcular_snapshot = calcular_snapshot
+        self.intervalo = intervalo
+        self.keepalive = keepalive
+        self.max_pendentes = max_pendentes
+
+        self._lock = threading.Lock()
+        self._clientes = set()
+        self._thread = None
+        self._versao = None
+        self._snapshot = None
+
+    def stream(self, ultima_versao=None):
+        """Gerador de eventos SSE para um cliente.
+
+        Se o cliente não está na versão atual (primeira conexão ou reconexão
+        após perder eventos), começa recebendo o snapshot completo.
+        """
+        cliente = _Cliente(self.max_pendentes)
+        with self._lock:
+            self._garantir_snapshot()
+            self._clientes.add(cliente)
+            versao, snapshot = self._versao, self._snapshot
+        self._garantir_thread()
+
+        try:
+            yield 'retry: 5000\n\n'
+            if ultima_versao != str(versao):
+                yield self._evento('snapshot', versao, snapshot)
+
+            while cliente.ativo:
+                try:
+                    yield cliente.fila.get(timeout=self.keepalive)
+                except queue.Empty:
+                    yield ': keepalive\n\n'
+        finally:
+            with self._lock:
+                self._clientes.discard(cliente)
+
+    def _evento(self, tipo, versao, dados):
+        return f'id: {versao}\nevent: {tipo}\ndata: {json.dumps(dados, ensure_ascii=False)}\n\n'
+
+    def _garantir_snapshot(self):
+        versao = self.get_version()
+        if self._snapshot is None or versao != self._versao:
+            self._versao = versao
+            self._snapshot = self.calcular_snapshot()
+
+    def _garantir_thread(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name='live-updates', daemon=True)
+                self._thread.start()
+
+    def _loop(self):
+        while True:
+            time.sleep(self.intervalo)
+            try:
+                with self._lock:
+                    if not self._clientes:
+                        # Ninguém ouvindo: a próxima conexão recalcula o snapshot
+                        self._snapshot = None
+                        self._thread = None
+                        return
+
+                versao = self.get_version()
+                if versao == self._versao:
+                    continue
+
+                novo = self.calcular_snapshot()
+                delta = calcular_delta(self._snapshot, novo)
+
+                with self._lock:
+                    self._versao, self._snapshot = versao, novo
+                    if delta:
+                        self._publicar(self._evento('delta', versao, delta))
+            except Exception as e:
+                print(f"❌ ERRO em live updates: {e}")
+
+    def _publicar(self, mensagem):
+        for cliente in list(self._clientes):
+            try:
+                cliente.fila.put_nowait(mensagem)
+            except queue.Full:
+                # Cliente lento: encerra o stream; ao reconectar recebe o snapshot
+                cliente.ativo = False
+                self._clientes.discard(cliente)
+
+
+def calcular_delta(anterior, atual):
+    """Diferença entre dois snapshots, só com o que mudou"""
+    if anterior is None:
+        return atual
+
+    delta = {}
+
+    revenue_anterior = {r['data']: r['faturamento'] for r in anterior['daily_revenue']}
+    alterados = [r for r in atual['daily_revenue'] if revenue_anterior.get(r['data']) != r['faturamento']]
+    if alterados:
+        delta['daily_revenue'] = alterados
+
+    # Rankings são pequenos (top 5): se algo mudou, manda a lista inteira
+    for chave in ('top_products', 'top_products_quantity'):
+        if atual[chave] != anterior[chave]:
+            delta[chave] = atual[chave]
+
+    stats = {k: v for k, v in atual['stats'].items() if anterior['stats'].get(k) != v}
+    if stats:
+        delta['stats'] = stats
+
+    return delta
@@ -1,23 +1,43 @@
+import argparse
 from xml_parser import XMLParser
 from scraper import ProductScraper
 from database import Database
+from profiling import StageTimer
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='ETL dos cupons fiscais (CF-e SAT)')
+    parser.add_argument('--timings', action='store_true',
+                        help='mede tempo de parede/CPU, linhas e pico de memória por etapa')
+    parser.add_argument('--profile', action='store_true',
+                        help='além dos tempos, grava um dump do cProfile por etapa')
+    parser.add_argument('--profile-dir', default='data/processed/profiles',
+                        help='pasta dos dumps do cProfile (padrão: %(default)s)')
+    parser.add_argument('--report', default='data/processed/etl_report.json',
+                        help='relatório JSON da execução com --timings/--profile (padrão: %(default)s)')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    timer = StageTimer(ativo=args.timings, pasta_profile=args.profile_dir if args.profile else None)
 
-def main():
     print("🚀 INICIANDO PLATAFORMA DE ANÁLISE DE CUPONS FISCAIS")
     print("=" * 50)
-    
+
     # 1. Parse XML e carregar no banco
     print("\n📂 ETAPA 1: PROCESSANDO ARQUIVOS XML...")
     parser = XMLParser()
-    notas, itens = parser.parse_xml_folder('data/Arquivos-XML-SAT')
-    
+    with timer.etapa('parse_xml') as etapa:
+        notas, itens = parser.parse_xml_folder('data/Arquivos-XML-SAT')
+        etapa['linhas'] = len(notas) + len(itens)
+
     print(f"✅ {len(notas)} notas fiscais processadas")
     print(f"✅ {len(itens)} itens extraídos")
-    
+
     # 2. Salvar no banco
     print("\n💾 ETAPA 2: SALVANDO NO BANCO DE DADOS...")
-    parser.save_to_database(notas, itens)
-    
+    with timer.etapa('salvar_banco', linhas=len(notas) + len(itens)):
+        parser.save_to_database(notas, itens)
+
     # 3. Estatísticas iniciais
     db = Database()
     stats = db.get_stats()
@@ -26,41 +46,50 @@ def main():
     print(f"   • Itens: {stats['total_itens']}")
     print(f"   • GTINs únicos: {stats['total_gtins']}")
     print(f"   • Itens enriquecidos: {stats['itens_enriquecidos']}")
-    
+
     # 4. Enriquecer dados (apenas se houver GTINs para enriquecer)
     print("\n🔍 ETAPA 3: ENRIQUECENDO DADOS DOS PRODUTOS...")
-    if stats['total_gtins'] > 0:
-        scraper = ProductScraper()
-        try:
-            # Usar o método inteligente que criamos
-            scraper.enrich_products_smart(limit=5)
-        except Exception as e:
-            print(f"⚠️  Aviso no enriquecimento: {e}")
-        finally:
-            scraper.close()
-    else:
-        print("ℹ️  Nenhum GTIN encontrado para enriquecimento")
-    
+    with timer.etapa('enriquecimento') as etapa:
+        if stats['total_gtins'] > 0:
+            scraper = ProductScraper()
+            try:
+                # Usar o método inteligente que criamos
+                scraper.enrich_products_smart(limit=5)
+            except Exception as e:
+                print(f"⚠️  Aviso no enriquecimento: {e}")
+            finally:
+                scraper.close()
+        else:
+            print("ℹ️  Nenhum GTIN encontrado para enriquecimento")
+        if timer.ativo:
+            etapa['linhas'] = db.get_stats()['itens_enriquecidos'] - stats['itens_enriquecidos']
+
     # 5. Estatísticas finais
     print("\n📈 ETAPA 4: RELATÓRIO FINAL")
-    final_stats = db.get_stats()
+    with timer.etapa('relatorio'):
+        final_stats = db.get_stats()
     print("=== RESUMO DO PROCESSAMENTO ===")
     print(f"📄 Notas fiscais processadas: {final_stats['total_notas']}")
     print(f"📦 Itens totais: {final_stats['total_itens']}")
     print(f"🏷️  GTINs únicos: {final_stats['total_gtins']}")
     print(f"✨ Itens enriquecidos: {final_stats['itens_enriquecidos']}")
-    
+
     # 6. Exportar para Excel
     print("\n📊 ETAPA 5: EXPORTANDO PARA EXCEL...")
-    try:
-        parser.export_to_excel(notas, itens, 'data/processed/relatorio_cfe.xlsx')
-        print("✅ Arquivo Excel exportado: data/processed/relatorio_cfe.xlsx")
-    except Exception as e:
-        print(f"⚠️  Erro ao exportar Excel: {e}")
-    
+    with timer.etapa('exportar_excel', linhas=len(notas) + len(itens)):
+        try:
+            parser.export_to_excel(notas, itens, 'data/processed/relatorio_cfe.xlsx')
+            print("✅ Arquivo Excel exportado: data/processed/relatorio_cfe.xlsx")
+        except Exception as e:
+            print(f"⚠️  Erro ao exportar Excel: {e}")
+
+    if timer.ativo:
+        timer.imprimir()
+        print(f"📝 Relatório de execução: {timer.salvar(args.report)}")
+
     print("\n🎉 PROCESSAMENTO CONCLUÍDO COM SUCESSO!")
     print("=" * 50)
 
 if __name__ == "__main__":
     # Executar processamento completo
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,255 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+
+# Queries acima deste tempo (ms) são registradas no log de queries lentas
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', '200'))
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _formatar_labels(nomes, valores, extra=()):
+    pares = [f'{n}="{_escape(v)}"' for n, v in list(zip(nomes, valores)) + list(extra)]
+    return '{' + ','.join(pares) + '}' if pares else ''
+
+
+class _Metrica:
+    tipo = None
+
+    def __init__(self, nome, descricao, labels=()):
+        self.nome = nome
+        self.descricao = descricao
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._valores = {}
+
+    def _chave(self, labels):
+        return tuple(labels.get(nome, '') for nome in self.labels)
+
+
+class Counter(_Metrica):
+    tipo = 'counter'
+
+    def inc(self, valor=1, **labels):
+        chave = self._chave(labels)
+        with self._lock:
+            self._valores[chave] = self._valores.get(chave, 0) + valor
+
+    def linhas_prometheus(self):
+        with self._lock:
+            return [f'{self.nome}{_formatar_labels(self.labels, k)} {v}' for k, v in self._valores.items()]
+
+    def as_dict(self):
+        with self._lock:
+            return [dict(zip(self.labels, k), value=v) for k, v in self._valores.items()]
+
+
+class Gauge(Counter):
+    tipo = 'gauge'
+
+    def set(self, valor, **labels):
+        with self._lock:
+            self._valores[self._chave(labels)] = valor
+
+
+class Histogram(_Metrica):
+    tipo = 'histogram'
+
+    def __init__(self, nome, descricao, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(nome, descricao, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, valor, **labels):
+        chave = self._chave(labels)
+        with self._lock:
+            serie = self._valores.get(chave)
+            if serie is None:
+                serie = self._valores[chave] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, limite in enumerate(self.buckets):
+                if valor <= limite:
+                    serie['buckets'][i] += 1
+            serie['sum'] += valor
+            serie['count'] += 1
+
+    def linhas_prometheus(self):
+        linhas = []
+        with self._lock:
+            for chave, serie in self._valores.items():
+                for limite, total in zip(self.buckets, serie['buckets']):
+                    linhas.append(f'{self.nome}_bucket{_formatar_labels(self.labels, chave, [("le", limite)])} {total}')
+                linhas.append(f'{self.nome}_bucket{_formatar_labels(self.labels, chave, [("le", "+Inf")])} {serie["count"]}')
+                linhas.append(f'{self.nome}_sum{_formatar_labels(self.labels, chave)} {serie["sum"]}')
+                linhas.append(f'{self.nome}_count{_formatar_labels(self.labels, chave)} {serie["count"]}')
+        return linhas
+
+    def as_dict(self):
+        with self._lock:
+            return [dict(zip(self.labels, k),
+                         buckets=dict(zip(map(str, self.buckets), s['buckets'])),
+                         sum=s['sum'], count=s['count'],
+                         avg=s['sum'] / s['count'] if s['count'] else 0.0)
+                    for k, s in self._valores.items()]
+
+
+class MetricsRegistry:
+    """Registro de métricas em memória do processo, exportável em Prometheus ou JSON"""
+
+    def __init__(self):
+        self._metricas = {}
+
+    def _registrar(self, metrica):
+        self._metricas[metrica.nome] = metrica
+        return metrica
+
+    def counter(self, nome, descricao, labels=()):
+        return self._registrar(Counter(nome, descricao, labels))
+
+    def gauge(self, nome, descricao, labels=()):
+        return self._registrar(Gauge(nome, descricao, labels))
+
+    def histogram(self, nome, descricao, labels=(), buckets=LATENCY_BUCKETS):
+        return self._registrar(Histogram(nome, descricao, labels, buckets))
+
+    def render_prometheus(self):
+        linhas = []
+        for metrica in self._metricas.values():
+            linhas.append(f'# HELP {metrica.nome} {metrica.descricao}')
+            linhas.append(f'# TYPE {metrica.nome} {metrica.tipo}')
+            linhas.extend(metrica.linhas_prometheus())
+        return '\n'.join(linhas) + '\n'
+
+    def as_dict(self):
+        return {nome: metrica.as_dict() for nome, metrica in self._metricas.items()}
+
+
+REGISTRY = MetricsRegistry()
+
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    'http_request_duration_seconds', 'Latência das requisições HTTP por rota', ('route', 'method', 'status'))
+SQL_QUERY_SECONDS = REGISTRY.histogram(
+    'sql_query_duration_seconds', 'Tempo de execução (execute + fetch) por query', ('query',))
+SQL_ROWS_TOTAL = REGISTRY.counter(
+    'sql_rows_returned_total', 'Linhas retornadas por query', ('query',))
+SQL_SLOW_QUERIES_TOTAL = REGISTRY.counter(
+    'sql_slow_queries_total', f'Queries acima de {SLOW_QUERY_MS:g} ms', ('query',))
+INGEST_ROWS_TOTAL = REGISTRY.counter(
+    'ingest_rows_total', 'Linhas gravadas pela ingestão', ('tabela',))
+INGEST_SECONDS_TOTAL = REGISTRY.counter(
+    'ingest_seconds_total', 'Tempo gasto gravando a ingestão', ('tabela',))
+INGEST_ROWS_PER_SECOND = REGISTRY.gauge(
+    'ingest_rows_per_second', 'Vazão do último lote de ingestão', ('tabela',))
+SCRAPER_LOOKUPS_TOTAL = REGISTRY.counter(
+    'scraper_lookups_total', 'Consultas de GTIN do scraper por fonte e resultado', ('fonte', 'resultado'))
+
+
+def registrar_ingestao(tabela, linhas, segundos):
+    """Contabiliza um lote de ingestão (linhas e vazão)"""
+    INGEST_ROWS_TOTAL.inc(linhas, tabela=tabela)
+    INGEST_SECONDS_TOTAL.inc(segundos, tabela=tabela)
+    if segundos > 0:
+        INGEST_ROWS_PER_SECOND.set(linhas / segundos, tabela=tabela)
+
+
+def resumir_sql(sql):
+    """Normaliza o SQL para usar como label (espaços colapsados, tamanho limitado)"""
+    return re.sub(r'\s+', ' ', sql).strip()[:120]
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor que mede o tempo de cada query (execute + fetch) e as linhas retornadas"""
+
+    _sql = None
+
+    def _iniciar(self, sql):
+        self._finalizar()
+        self._sql = sql
+        self._tempo = 0.0
+        self._linhas = 0
+
+    def _finalizar(self):
+        if self._sql is None:
+            return
+        sql, self._sql = resumir_sql(self._sql), None
+        SQL_QUERY_SECONDS.observe(self._tempo, query=sql)
+        SQL_ROWS_TOTAL.inc(self._linhas, query=sql)
+        if self._tempo * 1000 >= SLOW_QUERY_MS:
+            SQL_SLOW_QUERIES_TOTAL.inc(query=sql)
+            print(f"🐢 Query lenta ({self._tempo * 1000:.1f} ms, {self._linhas} linhas): {sql}")
+
+    def _medir(self, func, *args):
+        inicio = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            if self._sql is not None:
+                self._tempo += time.perf_counter() - inicio
+
+    def execute(self, sql, parameters=()):
+        self._iniciar(sql)
+        return self._medir(super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        self._iniciar(sql)
+        return self._medir(super().executemany, sql, seq_of_parameters)
+
+    def fetchone(self):
+        row = self._medir(super().fetchone)
+        if row is None:
+            self._finalizar()
+        elif self._sql is not None:
+            self._linhas += 1
+        return row
+
+    def fetchmany(self, size=None):
+        rows = self._medir(super().fetchmany, self.arraysize if size is None else size)
+        if self._sql is not None:
+            self._linhas += len(rows)
+        if not rows:
+            self._finalizar()
+        return rows
+
+    def fetchall(self):
+        rows = self._medir(super().fetchall)
+        if self._sql is not None:
+            self._linhas += len(rows)
+        self._finalizar()
+        return rows
+
+    def __next__(self):
+        try:
+            row = self._medir(super().__next__)
+        except StopIteration:
+            self._finalizar()
+            raise
+        if self._sql is not None:
+            self._linhas += 1
+        return row
+
+    def close(self):
+        self._finalizar()
+        super().close()
+
+    def __del__(self):
+        try:
+            self._finalizar()
+        except Exception:
+            pass
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Conexão SQLite cujos cursores são instrumentados (use como factory do sqlite3.connect)"""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
@@ -0,0 +1,46 @@
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+# Valores são gravados como inteiros em ponto fixo: valor armazenado = valor real * escala.
+# Somas no SQLite e no NumPy ficam exatas (nada de centavos perdidos em SUM de REAL)
+CENTAVOS = 100        # vProd, vDesc, vPIS, vCOFINS, vMP, vItem12741
+MILESIMOS = 1000      # vUnCom (até 3 casas no CF-e SAT)
+QUANTIDADE = 10000    # qCom (até 4 casas)
+
+# Escala de cada coluna inteira de cupons/itens (mesmo nome, mesma escala nas duas tabelas)
+ESCALAS = {
+    'valor_total': CENTAVOS,
+    'valor_desconto': CENTAVOS,
+    'valor_pis': CENTAVOS,
+    'valor_cofins': CENTAVOS,
+    'valor_pagamento': CENTAVOS,
+    'valor_item_12741': CENTAVOS,
+    'valor_unitario': MILESIMOS,
+    'quantidade': QUANTIDADE,
+}
+
+
+def para_inteiro(valor, escala=CENTAVOS):
+    """Texto do XML (ou número) em inteiro escalado, sem passar por float: '12.345' -> 1235 centavos"""
+    if valor is None:
+        return 0
+    try:
+        return int((Decimal(str(valor).strip()) * escala).to_integral_value(ROUND_HALF_UP))
+    except InvalidOperation:
+        return 0
+
+
+def para_reais(valor, escala=CENTAVOS):
+    """Inteiro escalado de volta para número decimal (só na serialização)"""
+    return None if valor is None else valor / escala
+
+
+def formatar(valor, escala=CENTAVOS, casas=2):
+    """Texto com `casas` decimais arredondado meio para cima, sem erro de float (4231.5 centavos -> '42.32')"""
+    reais = Decimal(str(valor)) / escala
+    return str(reais.quantize(Decimal(1).scaleb(-casas), ROUND_HALF_UP))
+
+
+def converter_linha(colunas, linha):
+    """Converte as colunas escaladas de uma linha (cupons/itens) para reais e quantidades"""
+    return tuple(para_reais(valor, ESCALAS[coluna]) if coluna in ESCALAS else valor
+                 for coluna, valor in zip(colunas, linha))
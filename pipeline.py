@@ -0,0 +1,152 @@
+import queue
+import threading
+import time
+
+# Marca de fim de fluxo entre os estágios
+_FIM = object()
+
+
+class Pipeline:
+    """Orquestra ETL, enriquecimento e o servidor no mesmo processo.
+
+    Estágios ligados por filas (parse -> store -> enrich): o enriquecimento
+    começa assim que o primeiro lote é gravado, enquanto o parse continua, e
+    o dashboard sobe logo que há dados no banco. A fila entre parse e store é
+    limitada, então o parse não acumula lotes se o banco ficar para trás; se a
+    gravação falhar, o parse desiste em vez de ficar bloqueado na fila cheia.
+    Um único Database é criado em `run()` e compartilhado pelos estágios.
+    """
+
+    def __init__(self, pasta_xml='data/Arquivos-XML-SAT', tamanho_lote=200, limite_enriquecimento=50,
+                 servir=True, host='0.0.0.0', port=5000, ao_servir=None):
+        self.pasta_xml = pasta_xml
+        self.tamanho_lote = tamanho_lote
+        self.limite_enriquecimento = limite_enriquecimento
+        self.servir = servir
+        self.host = host
+        self.port = port
+        self.ao_servir = ao_servir
+
+        self.db = None
+        self._fila_store = queue.Queue(maxsize=4)
+        self._fila_enrich = queue.Queue()
+        self._primeiro_lote = threading.Event()
+        self._gravacao_falhou = threading.Event()
+        self._erros = []
+        self.stats = {'lotes': 0, 'notas': 0, 'itens': 0}
+
+    def _estagio(self, nome, func, saida=None):
+        """Executa um estágio; em caso de erro registra e libera o próximo estágio"""
+        def executar():
+            try:
+                func()
+            except Exception as e:
+                print(f"❌ Erro no estágio {nome}: {e}")
+                self._erros.append((nome, e))
+            finally:
+                if saida is not None:
+                    self._entregar(saida, _FIM)
+        return threading.Thread(target=executar, name=f'pipeline-{nome}', daemon=True)
+
+    def _entregar(self, fila, item):
+        """put com timeout que desiste se a gravação falhou (ninguém mais consome a fila do store)"""
+        while True:
+            try:
+                fila.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                if self._gravacao_falhou.is_set():
+                    return False
+
+    def _parse(self):
+        from xml_parser import XMLParser
+        # Só lê e converte os XMLs: usa o Database compartilhado, sem abrir outro
+        parser = XMLParser(self.db)
+        for notas, itens in parser.iter_xml_batches(self.pasta_xml, self.tamanho_lote):
+            if not self._entregar(self._fila_store, (notas, itens)):
+                print("⚠️ Parse interrompido: a gravação dos lotes falhou")
+                return
+
+    def _store(self):
+        from xml_parser import XMLParser
+        parser = XMLParser(self.db)
+        try:
+            while True:
+                lote = self._fila_store.get()
+                if lote is _FIM:
+                    break
+                notas, itens = lote
+                parser.save_to_database(notas, itens)
+                self.stats['lotes'] += 1
+                self.stats['notas'] += len(notas)
+                self.stats['itens'] += len(itens)
+                print(f"💾 Lote {self.stats['lotes']} gravado ({len(notas)} notas, {len(itens)} itens)")
+                self._primeiro_lote.set()
+                self._fila_enrich.put(self.stats['lotes'])
+        except Exception:
+            self._gravacao_falhou.set()
+            raise
+
+    def _enrich(self):
+        from scraper import ProductScraper
+        scraper = ProductScraper(db=self.db)
+        try:
+            fim = False
+            while not fim:
+                sinal = self._fila_enrich.get()
+                fim = sinal is _FIM
+                # Vários lotes gravados enquanto o anterior era enriquecido viram uma rodada só
+                while not fim:
+                    try:
+                        fim = self._fila_enrich.get_nowait() is _FIM
+                    except queue.Empty:
+                        break
+                if sinal is _FIM and self.stats['lotes'] == 0:
+                    break
+                scraper.enrich_products_smart(limit=self.limite_enriquecimento)
+        finally:
+            scraper.close()
+
+    def _serve(self):
+        self._primeiro_lote.wait()
+        from app import app
+        print(f"🌐 Dashboard disponível em http://localhost:{self.port}")
+        if self.ao_servir:
+            threading.Thread(target=self.ao_servir, daemon=True).start()
+        app.run(host=self.host, port=self.port, threaded=True, use_reloader=False)
+
+    def run(self):
+        """Executa o pipeline; com `servir=True` bloqueia enquanto o servidor estiver no ar"""
+        from database import Database
+        inicio = time.perf_counter()
+        # Inicialização (migrações e backfills) uma vez só, antes de qualquer estágio usar o banco
+        self.db = Database()
+        etl = [
+            self._estagio('parse', self._parse, saida=self._fila_store),
+            self._estagio('store', self._store, saida=self._fila_enrich),
+            self._estagio('enrich', self._enrich),
+        ]
+
+        servidor = None
+        if self.servir:
+            servidor = threading.Thread(target=self._serve, name='pipeline-serve', daemon=True)
+            servidor.start()
+
+        for estagio in etl:
+            estagio.start()
+        for estagio in etl:
+            estagio.join()
+        # Nenhum lote gravado: libera o servidor mesmo assim (banco já existente)
+        self._primeiro_lote.set()
+
+        print(f"✅ Pipeline de dados concluído em {time.perf_counter() - inicio:.1f}s: "
+              f"{self.stats['notas']} notas, {self.stats['itens']} itens em {self.stats['lotes']} lotes")
+
+        if servidor is not None:
+            try:
+                while servidor.is_alive():
+                    servidor.join(timeout=1)
+            except KeyboardInterrupt:
+                print("\n[PARADO] Aplicacao encerrada pelo usuario")
+
+        return not self._erros
@@ -0,0 +1,94 @@
+import cProfile
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+
+class StageTimer:
+    """Mede cada etapa do ETL: tempo de parede, CPU, linhas e pico de memória.
+
+    Desativado (padrão) não mede nada, então `main.py` usa o mesmo código com
+    ou sem `--timings`. Com `pasta_profile`, cada etapa também gera um dump do
+    cProfile (`etapa_N_nome.prof`, abrir com `python -m pstats` ou snakeviz).
+    """
+
+    def __init__(self, ativo=False, pasta_profile=None):
+        self.ativo = ativo or pasta_profile is not None
+        self.pasta_profile = pasta_profile
+        self.etapas = []
+        self._inicio = None
+
+    @contextmanager
+    def etapa(self, nome, linhas=0):
+        """`with timer.etapa('parse_xml') as registro: ...; registro['linhas'] = n`"""
+        registro = {'etapa': nome, 'linhas': linhas}
+        if not self.ativo:
+            yield registro
+            return
+
+        if self._inicio is None:
+            self._inicio = time.perf_counter()
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        memoria_inicial = tracemalloc.get_traced_memory()[0]
+
+        profiler = None
+        if self.pasta_profile:
+            profiler = cProfile.Profile()
+            profiler.enable()
+
+        parede, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield registro
+        except Exception as e:
+            registro['erro'] = f'{e.__class__.__name__}: {e}'
+            raise
+        finally:
+            registro['parede_s'] = round(time.perf_counter() - parede, 4)
+            registro['cpu_s'] = round(time.process_time() - cpu, 4)
+            if profiler is not None:
+                profiler.disable()
+                os.makedirs(self.pasta_profile, exist_ok=True)
+                arquivo = os.path.join(self.pasta_profile, f'etapa_{len(self.etapas) + 1}_{nome}.prof')
+                profiler.dump_stats(arquivo)
+                registro['profile'] = arquivo
+            pico = tracemalloc.get_traced_memory()[1]
+            registro['pico_memoria_mb'] = round(max(0, pico - memoria_inicial) / 1024 / 1024, 2)
+            if registro['parede_s'] > 0 and registro['linhas']:
+                registro['linhas_por_s'] = round(registro['linhas'] / registro['parede_s'], 1)
+            self.etapas.append(registro)
+
+    def relatorio(self):
+        """Relatório da execução em formato serializável (JSON)"""
+        total = time.perf_counter() - self._inicio if self._inicio is not None else 0.0
+        return {
+            'executado_em': datetime.now().isoformat(timespec='seconds'),
+            'python': sys.version.split()[0],
+            'plataforma': platform.platform(),
+            'argv': sys.argv[1:],
+            'total_s': round(total, 4),
+            'etapas': self.etapas,
+        }
+
+    def salvar(self, caminho):
+        pasta = os.path.dirname(caminho)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+        with open(caminho, 'w', encoding='utf-8') as f:
+            json.dump(self.relatorio(), f, ensure_ascii=False, indent=2)
+        return caminho
+
+    def imprimir(self):
+        if not self.etapas:
+            return
+        print("\n⏱️  TEMPOS POR ETAPA")
+        print(f"   {'etapa':<18}{'parede (s)':>12}{'CPU (s)':>10}{'linhas':>9}{'pico MB':>10}")
+        for registro in self.etapas:
+            print(f"   {registro['etapa']:<18}{registro['parede_s']:>12.3f}{registro['cpu_s']:>10.3f}"
+                  f"{registro['linhas']:>9}{registro['pico_memoria_mb']:>10.2f}")
@@ -0,0 +1,329 @@
+from collections import namedtuple
+
+from export import build_export_query
+
+# Registro das consultas de leitura da API. O SQL mora aqui e os módulos (app, sharding,
+# query_router, basket, sketches, sales_cube) importam daqui; `python query_plans.py` roda
+# EXPLAIN QUERY PLAN em todas as entradas de CONSULTAS e falha se alguma passar a varrer uma
+# tabela inteira ou a ordenar em B-tree temporária sem estar declarado em `excecoes`.
+
+# --- Dashboards (app.py) ---
+
+TOP_PRODUCTS_QUERY = '''
+    SELECT descricao as produto, SUM(valor_total) / 100.0 as total_vendido
+    FROM itens
+    WHERE descricao IS NOT NULL
+    GROUP BY descricao
+    ORDER BY total_vendido DESC
+    LIMIT 5
+'''
+
+DAILY_REVENUE_QUERY = '''
+    SELECT data_emissao as data, SUM(valor_total) / 100.0 as faturamento
+    FROM cupons
+    WHERE data_emissao IS NOT NULL
+    GROUP BY data_emissao
+    ORDER BY data_emissao
+'''
+
+TOP_PRODUCTS_QUANTITY_QUERY = '''
+    SELECT descricao as produto, SUM(quantidade) / 10000.0 as total_quantidade
+    FROM itens
+    WHERE descricao IS NOT NULL
+    GROUP BY descricao
+    ORDER BY total_quantidade DESC
+    LIMIT 5
+'''
+
+CFOP_SALES_QUERY = '''
+    SELECT cfop, SUM(valor_total) / 100.0 as total_vendido
+    FROM itens
+    WHERE cfop IS NOT NULL
+    GROUP BY cfop
+    ORDER BY total_vendido DESC
+    LIMIT 5
+'''
+
+AVG_PRODUCT_VALUE_QUERY = '''
+    SELECT descricao as produto, AVG(valor_unitario) / 1000.0 as valor_medio
+    FROM itens
+    WHERE descricao IS NOT NULL AND valor_unitario > 0
+    GROUP BY descricao
+    ORDER BY valor_medio DESC
+    LIMIT 5
+'''
+
+# Amostra dos primeiros itens gravados (ordem do id, sem depender do índice que o planejador escolher)
+DISCOUNT_ANALYSIS_QUERY = '''
+    SELECT quantidade * valor_unitario / 10000000.0 as valor_bruto,
+           (quantidade * valor_unitario / 100000.0 - valor_total) / 100.0 as desconto
+    FROM itens
+    WHERE quantidade > 0 AND valor_unitario > 0
+    ORDER BY id
+    LIMIT 100
+'''
+
+# Itens enriquecidos contados por data_enriquecimento (indexada): update_item_info preenche
+# descrição e data juntas e só é chamado com descrição
+STATS_QUERY = '''
+    SELECT (SELECT COUNT(*) FROM cupons) as total_notas,
+           (SELECT COUNT(*) FROM itens) as total_itens,
+           (SELECT COUNT(DISTINCT codigo_gtin) FROM itens WHERE codigo_gtin IS NOT NULL) as total_gtins,
+           (SELECT COUNT(*) FROM itens WHERE data_enriquecimento IS NOT NULL) as itens_enriquecidos
+'''
+
+VERSAO_QUERY = 'SELECT versao, atualizado_em FROM versao_dados WHERE id = 1'
+
+CUBO_QUERY = '''
+    SELECT data, emitente_cnpj, numero_caixa, dia_semana, hora, faturamento, cupons, itens
+    FROM cubo_vendas
+'''
+
+# --- Parciais por shard (sharding.py) ---
+
+# Filtro de um emitente dentro do shard (um shard guarda vários emitentes)
+FILTRO_CUPONS = ' AND emitente_cnpj = ?'
+FILTRO_ITENS = ' AND chave_acesso IN (SELECT chave_acesso FROM cupons WHERE emitente_cnpj = ?)'
+
+# Agregado parcial de cada dashboard, sem LIMIT (o top-N é calculado depois de combinar)
+PARCIAIS = {
+    'top_products': '''
+        SELECT descricao as produto, SUM(valor_total) as total_vendido
+        FROM itens
+        WHERE descricao IS NOT NULL{filtro}
+        GROUP BY descricao
+    ''',
+    'top_products_quantity': '''
+        SELECT descricao as produto, SUM(quantidade) as total_quantidade
+        FROM itens
+        WHERE descricao IS NOT NULL{filtro}
+        GROUP BY descricao
+    ''',
+    'daily_revenue': '''
+        SELECT data_emissao as data, SUM(valor_total) as faturamento
+        FROM cupons
+        WHERE data_emissao IS NOT NULL{filtro}
+        GROUP BY data_emissao
+    ''',
+    'cfop_sales': '''
+        SELECT cfop, SUM(valor_total) as total_vendido
+        FROM itens
+        WHERE cfop IS NOT NULL{filtro}
+        GROUP BY cfop
+    ''',
+    'avg_product_value': '''
+        SELECT descricao as produto, SUM(valor_unitario) as soma, COUNT(*) as n
+        FROM itens
+        WHERE descricao IS NOT NULL AND valor_unitario > 0{filtro}
+        GROUP BY descricao
+    ''',
+    # Mesma ordem do banco único (id); o id volta para a combinação entre shards e sai da resposta
+    'discount_analysis': '''
+        SELECT id, quantidade * valor_unitario / 10000000.0 as valor_bruto,
+               (quantidade * valor_unitario / 100000.0 - valor_total) / 100.0 as desconto
+        FROM itens
+        WHERE quantidade > 0 AND valor_unitario > 0{filtro}
+        ORDER BY id
+        LIMIT 100
+    ''',
+}
+
+PARCIAL_STATS = '''
+    SELECT (SELECT COUNT(*) FROM cupons WHERE 1 = 1{filtro}) as total_notas,
+           (SELECT COUNT(*) FROM itens WHERE 1 = 1{filtro}) as total_itens,
+           (SELECT COUNT(*) FROM itens WHERE data_enriquecimento IS NOT NULL{filtro}) as itens_enriquecidos
+'''
+
+PARCIAL_GTINS = '''
+    SELECT DISTINCT codigo_gtin FROM itens WHERE codigo_gtin IS NOT NULL{filtro}
+'''
+
+# --- Consulta em linguagem natural (query_router.py), por intenção ---
+
+INTENCOES = {
+    'valor_total_empresa': '''
+        SELECT SUM(valor_total) as valor_total
+        FROM cupons
+        WHERE UPPER(emitente_razao_social) LIKE UPPER(?)
+        AND data_emissao BETWEEN ? AND ?
+    ''',
+    'empresas_produto': '''
+        SELECT DISTINCT c.emitente_razao_social as empresa
+        FROM cupons c
+        JOIN itens i ON c.chave_acesso = i.chave_acesso
+        WHERE UPPER(i.descricao) LIKE UPPER(?)
+        AND c.data_emissao BETWEEN ? AND ?
+    ''',
+    'top_produtos_empresa': '''
+        SELECT i.descricao as produto, SUM(i.valor_total) as total_vendido
+        FROM itens i
+        JOIN cupons c ON c.chave_acesso = i.chave_acesso
+        WHERE UPPER(c.emitente_razao_social) LIKE UPPER(?)
+        AND c.data_emissao BETWEEN ? AND ?
+        AND i.descricao IS NOT NULL
+        GROUP BY i.descricao
+        ORDER BY total_vendido DESC
+        LIMIT ?
+    ''',
+    'compradores_produto': '''
+        SELECT DISTINCT COALESCE(c.destinatario_nome, c.destinatario_cpf) as comprador
+        FROM cupons c
+        JOIN itens i ON c.chave_acesso = i.chave_acesso
+        WHERE UPPER(i.descricao) LIKE UPPER(?)
+        AND c.data_emissao BETWEEN ? AND ?
+        AND c.destinatario_cpf IS NOT NULL
+    ''',
+    'ticket_medio': '''
+        SELECT AVG(valor_total) as ticket_medio, COUNT(*) as cupons
+        FROM cupons
+        WHERE UPPER(COALESCE(emitente_razao_social, '')) LIKE UPPER(?)
+        AND data_emissao BETWEEN ? AND ?
+    ''',
+    'formas_pagamento': '''
+        SELECT forma_pagamento, COUNT(*) as cupons, SUM(valor_pagamento) as valor
+        FROM cupons
+        WHERE UPPER(COALESCE(emitente_razao_social, '')) LIKE UPPER(?)
+        AND data_emissao BETWEEN ? AND ?
+        GROUP BY forma_pagamento
+        ORDER BY valor DESC
+    ''',
+}
+
+# --- Cestas (basket.py); {filtro} recebe ' AND emitente_cnpj = ?' quando há emitente ---
+
+CESTA_TOTAL = 'SELECT COALESCE(SUM(cupons), 0) FROM cesta_totais WHERE 1 = 1{filtro}'
+
+CESTA_PRODUTO = 'SELECT COALESCE(SUM(cupons), 0) FROM cesta_produtos WHERE produto = ?{filtro}'
+
+CESTA_PARES = '''
+    SELECT produto_b, SUM(cupons) AS juntos
+    FROM cesta_pares
+    WHERE produto_a = ?{filtro}
+    GROUP BY produto_b
+    HAVING SUM(cupons) >= ?
+'''
+
+CESTA_PRODUTOS = '''
+    SELECT produto, SUM(cupons) FROM cesta_produtos
+    WHERE produto IN ({marcadores}){filtro}
+    GROUP BY produto
+'''
+
+CESTA_PRINCIPAIS = '''
+    SELECT produto FROM cesta_produtos
+    WHERE 1 = 1{filtro}
+    GROUP BY produto
+    ORDER BY SUM(cupons) DESC
+    LIMIT ?
+'''
+
+# --- Sketches (sketches.py) ---
+
+SKETCH_QUERY = 'SELECT conteudo FROM sketches_diarios WHERE data = ? AND tipo = ?'
+
+SKETCH_INTERVALO_QUERY = '''
+    SELECT conteudo FROM sketches_diarios
+    WHERE tipo = ? AND data BETWEEN ? AND ?
+'''
+
+# Preenchidos juntos por update_item_info; data_enriquecimento tem índice
+ITENS_ENRIQUECIDOS_QUERY = 'SELECT COUNT(*) FROM itens WHERE data_enriquecimento IS NOT NULL'
+
+
+# --- Registro conferido pelo query_plans.py ---
+
+# `parametros`: exemplo com a mesma quantidade de placeholders do SQL.
+# `excecoes`: o que o plano pode ter além de buscas e varreduras de índice de cobertura:
+# 'SCAN <tabela>' (varredura da tabela) ou 'GROUP BY' / 'ORDER BY' / 'DISTINCT' (B-tree temporária)
+Consulta = namedtuple('Consulta', 'nome sql parametros excecoes', defaults=((), ()))
+
+_EMITENTE = '12345678000190'
+_PERIODO = ('2024-01-01', '2024-12-31')
+
+
+def _parciais():
+    """Cada parcial sem filtro (todos os emitentes do shard) e com o filtro de um emitente"""
+    consultas = []
+    for nome, sql in PARCIAIS.items():
+        filtro = FILTRO_CUPONS if nome == 'daily_revenue' else FILTRO_ITENS
+        # Como no banco único: percorre itens pela ordem do id e para nas 100 primeiras linhas
+        excecoes_globais = ('SCAN itens',) if nome == 'discount_analysis' else ()
+        consultas.append(Consulta(f'parcial_{nome}', sql.format(filtro=''), excecoes=excecoes_globais))
+        # O recorte de itens chega como IN de chaves do emitente: agrupar/ordenar exige ordenar só essas linhas
+        excecoes = tuple(clausula for clausula in ('GROUP BY', 'ORDER BY')
+                         if filtro == FILTRO_ITENS and clausula in sql)
+        consultas.append(Consulta(f'parcial_{nome}_emitente', sql.format(filtro=filtro), (_EMITENTE,), excecoes))
+    consultas += [
+        Consulta('parcial_stats', PARCIAL_STATS.format(filtro='')),
+        Consulta('parcial_stats_emitente', PARCIAL_STATS.format(filtro=FILTRO_ITENS), (_EMITENTE,) * 3),
+        Consulta('parcial_gtins', PARCIAL_GTINS.format(filtro='')),
+        Consulta('parcial_gtins_emitente', PARCIAL_GTINS.format(filtro=FILTRO_ITENS), (_EMITENTE,), ('DISTINCT',)),
+    ]
+    return consultas
+
+
+def _cestas():
+    consultas = []
+    for sufixo, filtro, emitente in (('', '', ()), ('_emitente', ' AND emitente_cnpj = ?', (_EMITENTE,))):
+        consultas += [
+            # Sem emitente soma a linha de todos os emitentes (uma por emitente)
+            Consulta(f'cesta_total{sufixo}', CESTA_TOTAL.format(filtro=filtro), emitente,
+                     () if emitente else ('SCAN cesta_totais',)),
+            Consulta(f'cesta_produto{sufixo}', CESTA_PRODUTO.format(filtro=filtro), ('ARROZ',) + emitente),
+            Consulta(f'cesta_pares{sufixo}', CESTA_PARES.format(filtro=filtro), ('ARROZ',) + emitente + (2,)),
+            Consulta(f'cesta_produtos{sufixo}', CESTA_PRODUTOS.format(marcadores='?,?', filtro=filtro),
+                     ('ARROZ', 'FEIJAO') + emitente),
+            # Ordena o agregado (uma linha por produto) para achar os principais; sem emitente
+            # percorre a PRIMARY KEY, já na ordem do GROUP BY produto
+            Consulta(f'cesta_principais{sufixo}', CESTA_PRINCIPAIS.format(filtro=filtro), emitente + (5,),
+                     ('ORDER BY',) if emitente else ('SCAN cesta_produtos', 'ORDER BY')),
+        ]
+    return consultas
+
+
+def _exportacoes():
+    consultas = []
+    for tabela in ('cupons', 'itens'):
+        # Exportação completa lê a tabela inteira por definição
+        sql, params = build_export_query(tabela)
+        consultas.append(Consulta(f'export_{tabela}', sql, tuple(params),
+                                  ('SCAN c',) if tabela == 'cupons' else ('SCAN i',)))
+        sql, params = build_export_query(tabela, *_PERIODO)
+        consultas.append(Consulta(f'export_{tabela}_periodo', sql, tuple(params)))
+        sql, params = build_export_query(tabela, *_PERIODO, emitente=_EMITENTE)
+        consultas.append(Consulta(f'export_{tabela}_emitente', sql, tuple(params)))
+    return consultas
+
+
+CONSULTAS = [
+    # Top-N ordena o agregado (uma linha por produto/CFOP), não as linhas de itens
+    Consulta('top_products', TOP_PRODUCTS_QUERY, excecoes=('ORDER BY',)),
+    Consulta('top_products_quantity', TOP_PRODUCTS_QUANTITY_QUERY, excecoes=('ORDER BY',)),
+    Consulta('cfop_sales', CFOP_SALES_QUERY, excecoes=('ORDER BY',)),
+    Consulta('avg_product_value', AVG_PRODUCT_VALUE_QUERY, excecoes=('ORDER BY',)),
+    Consulta('daily_revenue', DAILY_REVENUE_QUERY),
+    # Percorre a tabela na ordem do id e para na 100ª linha
+    Consulta('discount_analysis', DISCOUNT_ANALYSIS_QUERY, excecoes=('SCAN itens',)),
+    Consulta('stats', STATS_QUERY),
+    Consulta('versao', VERSAO_QUERY),
+    # O cubo é carregado inteiro uma vez por versão dos dados
+    Consulta('cubo', CUBO_QUERY, excecoes=('SCAN cubo_vendas',)),
+    *_parciais(),
+    Consulta('intencao_valor_total_empresa', INTENCOES['valor_total_empresa'], ('%MERCADO%',) + _PERIODO),
+    # LIKE com % no início não usa índice: o período (índice por data) limita os cupons lidos, e
+    # DISTINCT / GROUP BY / ORDER BY operam só sobre as linhas do período
+    Consulta('intencao_empresas_produto', INTENCOES['empresas_produto'], ('%ARROZ%',) + _PERIODO,
+             ('DISTINCT',)),
+    Consulta('intencao_top_produtos_empresa', INTENCOES['top_produtos_empresa'],
+             ('%MERCADO%',) + _PERIODO + (5,), ('GROUP BY', 'ORDER BY')),
+    Consulta('intencao_compradores_produto', INTENCOES['compradores_produto'], ('%ARROZ%',) + _PERIODO,
+             ('DISTINCT',)),
+    Consulta('intencao_ticket_medio', INTENCOES['ticket_medio'], ('%MERCADO%',) + _PERIODO),
+    Consulta('intencao_formas_pagamento', INTENCOES['formas_pagamento'], ('%MERCADO%',) + _PERIODO,
+             ('GROUP BY', 'ORDER BY')),
+    *_cestas(),
+    Consulta('sketch', SKETCH_QUERY, ('*', 'contagens')),
+    Consulta('sketch_intervalo', SKETCH_INTERVALO_QUERY, ('contagens',) + _PERIODO),
+    Consulta('itens_enriquecidos', ITENS_ENRIQUECIDOS_QUERY),
+    *_exportacoes(),
+]
@@ -0,0 +1,92 @@
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+
+from queries import CONSULTAS
+
+# Cupons do banco sintético usado quando nenhum --banco é informado
+CUPONS_SEMENTE = 2000
+
+_TEMPORARIAS = ('GROUP BY', 'ORDER BY', 'DISTINCT')
+
+
+def problemas_do_plano(detalhes):
+    """Passos do plano que leem a tabela inteira ou ordenam em B-tree temporária.
+
+    Retorna rótulos no formato de `Consulta.excecoes`: 'SCAN <tabela>' para varredura
+    da tabela (ou de índice sem cobertura) e 'GROUP BY' / 'ORDER BY' / 'DISTINCT' para
+    'USE TEMP B-TREE FOR ...'. Buscas (SEARCH) e varreduras de índice de cobertura passam.
+    """
+    problemas = []
+    for detalhe in detalhes:
+        if detalhe.startswith('SCAN ') and detalhe != 'SCAN CONSTANT ROW' and 'COVERING INDEX' not in detalhe:
+            problemas.append(f"SCAN {detalhe.split()[1]}")
+        elif detalhe.startswith('USE TEMP B-TREE FOR '):
+            tipo = next((t for t in _TEMPORARIAS if t in detalhe), detalhe[len('USE TEMP B-TREE FOR '):])
+            problemas.append(tipo)
+    return problemas
+
+
+def plano(conn, consulta):
+    """Linhas de detalhe do EXPLAIN QUERY PLAN da consulta"""
+    return [row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + consulta.sql, consulta.parametros)]
+
+
+def verificar(conn, consultas=None, mostrar=False):
+    """Confere o plano de cada consulta do registro; retorna (violações, exceções sem uso)"""
+    violacoes, sobrando = [], []
+    for consulta in consultas or CONSULTAS:
+        try:
+            detalhes = plano(conn, consulta)
+        except sqlite3.Error as e:
+            violacoes.append(f"{consulta.nome}: {e}")
+            print(f"❌ {consulta.nome}: {e}")
+            continue
+        problemas = problemas_do_plano(detalhes)
+        novos = [p for p in problemas if p not in consulta.excecoes]
+        sobrando += [f"{consulta.nome}: {e}" for e in consulta.excecoes if e not in problemas]
+        violacoes += [f"{consulta.nome}: {p}" for p in novos]
+
+        print(f"{'❌' if novos else '✅'} {consulta.nome}"
+              + (f"  ({', '.join(novos)})" if novos else ''))
+        if mostrar or novos:
+            for detalhe in detalhes:
+                print(f"      {detalhe}")
+    return violacoes, sobrando
+
+
+def banco_semente(pasta, cupons=CUPONS_SEMENTE):
+    """Banco sintético pela ingestão normal (mesmas tabelas e índices do init_database)"""
+    from synthetic_data import gerar_banco
+    return gerar_banco(os.path.join(pasta, 'planos.db'), cupons, seed=42, recriar=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Confere o plano de execução das consultas de queries.py')
+    parser.add_argument('nomes', nargs='*', help='consultas a conferir (padrão: todas do registro)')
+    parser.add_argument('--banco', help='banco existente a usar (padrão: banco sintético temporário)')
+    parser.add_argument('--cupons', type=int, default=CUPONS_SEMENTE, help='cupons do banco sintético')
+    parser.add_argument('--mostrar', action='store_true', help='imprime o plano completo de cada consulta')
+    args = parser.parse_args()
+
+    consultas = [c for c in CONSULTAS if not args.nomes or c.nome in args.nomes]
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = args.banco or banco_semente(pasta, args.cupons)
+        conn = sqlite3.connect(f'file:{caminho}?mode=ro', uri=True)
+        try:
+            violacoes, sobrando = verificar(conn, consultas, args.mostrar)
+        finally:
+            conn.close()
+
+    if sobrando:
+        print("\n⚠️ Exceções declaradas que o plano não usa mais (podem sair de queries.py):")
+        for excecao in sobrando:
+            print(f"   • {excecao}")
+    if violacoes:
+        print("\n❌ PLANO DE CONSULTA REGREDIU:")
+        for violacao in violacoes:
+            print(f"   • {violacao}")
+        sys.exit(1)
+    print(f"\n✅ {len(consultas)} consultas sem varredura de tabela nem B-tree temporária fora das exceções")
@@ -0,0 +1,300 @@
+import queue
+import re
+import threading
+import unicodedata
+from collections import OrderedDict, namedtuple
+import metrics
+from http_cache import get_data_version
+from database import conectar
+from money import formatar
+from queries import INTENCOES
+
+# Códigos de meio de pagamento do CF-e (tag cMP)
+FORMAS_PAGAMENTO = {
+    '01': 'Dinheiro',
+    '02': 'Cheque',
+    '03': 'Cartão de Crédito',
+    '04': 'Cartão de Débito',
+    '05': 'Crédito Loja',
+    '10': 'Vale Alimentação',
+    '11': 'Vale Refeição',
+    '12': 'Vale Presente',
+    '13': 'Vale Combustível',
+    '99': 'Outros',
+}
+
+# Sem período na pergunta: intervalo aberto (mantém a consulta com o mesmo SQL preparado)
+PERIODO_TOTAL = ('0000-00-00', '9999-12-31')
+
+_EMPRESA = r'(?:pela|da|na|do|no) (?:empresa|loja|emitente) (?P<empresa>.+)'
+
+Intent = namedtuple('Intent', 'nome padroes sql parametros formatar')
+
+QUERY_CACHE_TOTAL = metrics.REGISTRY.counter(
+    'query_router_cache_total', 'Respostas do /api/query servidas do cache ou do banco', ('intent', 'resultado'))
+
+
+def _normalizar(texto):
+    """Minúsculas, sem acentos, espaços colapsados e sem pontuação final.
+
+    Retorna (normalizado, origem): origem[i] é a posição em `texto` do caractere i do
+    normalizado. A normalização serve só para reconhecer a intenção; nomes de empresa e
+    produto são recortados do texto original, com acentos, para comparar com o banco.
+    """
+    caracteres, origem = [], []
+    for i, c in enumerate(texto):
+        if c.isspace():
+            if caracteres and caracteres[-1] != ' ':
+                caracteres.append(' ')
+                origem.append(i)
+            continue
+        for d in unicodedata.normalize('NFKD', c).encode('ascii', 'ignore').decode('ascii').lower():
+            caracteres.append(d)
+            origem.append(i)
+
+    inicio, fim = 0, len(caracteres)
+    while inicio < fim and caracteres[inicio] in ' ?.!':
+        inicio += 1
+    while fim > inicio and caracteres[fim - 1] in ' ?.!':
+        fim -= 1
+    return ''.join(caracteres[inicio:fim]), origem[inicio:fim]
+
+
+def _trecho_original(pergunta, origem, inicio, fim):
+    """Trecho da pergunta original correspondente a normalizado[inicio:fim]"""
+    if inicio < 0 or inicio >= fim:
+        return None
+    return pergunta[origem[inicio]:origem[fim - 1] + 1]
+
+
+def _data_iso(texto):
+    """Converte DD/MM/AAAA, AAAA-MM-DD, MM/AAAA, AAAA-MM ou AAAA em (inicio, fim)"""
+    m = re.fullmatch(r'(\d{2})/(\d{2})/(\d{4})', texto)
+    if m:
+        data = f'{m[3]}-{m[2]}-{m[1]}'
+        return data, data
+    if re.fullmatch(r'\d{4}-\d{2}-\d{2}', texto):
+        return texto, texto
+    m = re.fullmatch(r'(\d{2})/(\d{4})', texto)
+    if m:
+        return f'{m[2]}-{m[1]}-01', f'{m[2]}-{m[1]}-31'
+    if re.fullmatch(r'\d{4}-\d{2}', texto):
+        return f'{texto}-01', f'{texto}-31'
+    if re.fullmatch(r'\d{4}', texto):
+        return f'{texto}-01-01', f'{texto}-12-31'
+    return None
+
+
+_DATA = r'(\d{2}/\d{2}/\d{4}|\d{4}-\d{2}-\d{2}|\d{2}/\d{4}|\d{4}-\d{2}|\d{4})'
+_PERIODO_ENTRE = re.compile(rf'\s*,?\s*(?:entre|de) {_DATA} (?:e|a|ate) {_DATA}\s*$')
+_PERIODO_EM = re.compile(rf'\s*,?\s*(?:em|no dia|no mes|no ano|durante) {_DATA}\s*$')
+
+
+def extrair_periodo(texto):
+    """Separa o período do final da pergunta; retorna (texto_sem_periodo, (inicio, fim))"""
+    m = _PERIODO_ENTRE.search(texto)
+    if m:
+        inicio, fim = _data_iso(m[1]), _data_iso(m[2])
+        if inicio and fim:
+            return texto[:m.start()], (inicio[0], fim[1])
+    m = _PERIODO_EM.search(texto)
+    if m:
+        periodo = _data_iso(m[1])
+        if periodo:
+            return texto[:m.start()], periodo
+    return texto, PERIODO_TOTAL
+
+
+def _like(texto):
+    # UPPER() do SQLite só converte ASCII: o parâmetro já vai em maiúsculas com acentos ('SÃO')
+    return f'%{texto.strip().upper()}%' if texto else '%'
+
+
+def _moeda(centavos):
+    return f'R$ {formatar(centavos)}'
+
+
+def _fmt_valor_total(rows, params):
+    total = rows[0][0] if rows else None
+    return {'resultado': f'Valor total: {_moeda(total)}' if total else 'Nenhum resultado encontrado'}
+
+
+def _fmt_empresas(rows, params):
+    empresas = [row[0] for row in rows]
+    return {'empresas': empresas if empresas else ['Nenhuma empresa encontrada']}
+
+
+def _fmt_top_produtos(rows, params):
+    if not rows:
+        return {'resultado': 'Nenhum resultado encontrado'}
+    return {
+        'resultado': f'Top {len(rows)} produtos mais vendidos (valor)',
+        'linhas': [f'{i + 1}. {row[0]} — {_moeda(row[1])}' for i, row in enumerate(rows)]
+    }
+
+
+def _fmt_compradores(rows, params):
+    if not rows:
+        return {'resultado': 'Nenhum comprador identificado (cupons sem CPF no destinatário)'}
+    return {
+        'resultado': f'{len(rows)} comprador(es) identificado(s)',
+        'linhas': [row[0] for row in rows]
+    }
+
+
+def _fmt_ticket_medio(rows, params):
+    media, cupons = rows[0] if rows else (None, 0)
+    if not cupons:
+        return {'resultado': 'Nenhum resultado encontrado'}
+    return {'resultado': f'Ticket médio: {_moeda(media)} ({cupons} cupons)'}
+
+
+def _fmt_pagamentos(rows, params):
+    if not rows:
+        return {'resultado': 'Nenhum resultado encontrado'}
+    total = sum(row[2] or 0 for row in rows) or 1
+    return {
+        'resultado': 'Mix de formas de pagamento',
+        'linhas': [f'{FORMAS_PAGAMENTO.get(row[0], row[0] or "N/A")}: {row[1]} cupons — '
+                   f'{_moeda(row[2] or 0)} ({100 * (row[2] or 0) / total:.1f}%)' for row in rows]
+    }
+
+
+INTENTS = [
+    Intent(
+        'valor_total_empresa',
+        [rf'valor total (?:vendido |faturado )?{_EMPRESA}', rf'faturamento {_EMPRESA}'],
+        INTENCOES['valor_total_empresa'],
+        lambda m, periodo: (_like(m['empresa']),) + periodo,
+        _fmt_valor_total
+    ),
+    Intent(
+        'empresas_produto',
+        [r'quais empresas (?:compraram|venderam|vendem) o produto (?P<produto>.+)'],
+        INTENCOES['empresas_produto'],
+        lambda m, periodo: (_like(m['produto']),) + periodo,
+        _fmt_empresas
+    ),
+    Intent(
+        'top_produtos_empresa',
+        [rf'(?:top (?P<n>\d+) )?(?:(?P<n2>\d+) )?produtos mais vendidos(?: {_EMPRESA})?'],
+        INTENCOES['top_produtos_empresa'],
+        lambda m, periodo: (_like(m['empresa']),) + periodo + (min(int(m['n'] or m['n2'] or 5), 50),),
+        _fmt_top_produtos
+    ),
+    Intent(
+        'compradores_produto',
+        [r'(?:quem|quais clientes|quais consumidores) compr(?:ou|aram) o produto (?P<produto>.+)'],
+        INTENCOES['compradores_produto'],
+        lambda m, periodo: (_like(m['produto']),) + periodo,
+        _fmt_compradores
+    ),
+    Intent(
+        'ticket_medio',
+        [rf'ticket medio(?: {_EMPRESA})?'],
+        INTENCOES['ticket_medio'],
+        lambda m, periodo: (_like(m['empresa']),) + periodo,
+        _fmt_ticket_medio
+    ),
+    Intent(
+        'formas_pagamento',
+        [rf'(?:formas?|meios?|mix) de pagamento(?: {_EMPRESA})?'],
+        INTENCOES['formas_pagamento'],
+        lambda m, periodo: (_like(m['empresa']),) + periodo,
+        _fmt_pagamentos
+    ),
+]
+
+# Padrões compilados uma única vez, na ordem de prioridade
+_PADROES = [(intent, re.compile(padrao)) for intent in INTENTS for padrao in intent.padroes]
+
+# Sobra após a intenção que parece um filtro ("da PADARIA X", "em outubro"): não pode ser ignorada,
+# senão a resposta sairia silenciosamente sobre todas as empresas ou todo o período
+_FILTRO_NAO_RECONHECIDO = re.compile(r'\b(?:pela|pelo|da|do|na|no|de|em|entre)\b')
+
+
+def classificar(pergunta):
+    """Identifica a intenção da pergunta; retorna (intent, parametros) ou (None, None).
+
+    Levanta ValueError quando a intenção é reconhecida mas sobra um filtro que não
+    foi entendido (ex.: empresa sem "da empresa"/"da loja").
+    """
+    texto, origem = _normalizar(pergunta)
+    texto, periodo = extrair_periodo(texto)
+    for intent, padrao in _PADROES:
+        m = padrao.search(texto)
+        if m:
+            resto = texto[m.end():]
+            if _FILTRO_NAO_RECONHECIDO.search(resto):
+                trecho = _trecho_original(pergunta, origem, m.end(), len(texto)).strip()
+                raise ValueError(f'Não reconheci "{trecho}" na pergunta. Para filtrar por empresa use '
+                                 f'"da empresa <nome>" (ou loja/emitente); para o período, '
+                                 f'"em 10/2020" ou "entre 01/10/2020 e 15/10/2020"')
+            grupos = {nome: _trecho_original(pergunta, origem, *m.span(nome)) for nome in m.groupdict()}
+            return intent, intent.parametros(grupos, periodo)
+    return None, None
+
+
+class QueryRouter:
+    """Responde /api/query roteando a pergunta para um SQL parametrizado por intenção.
+
+    As conexões (somente leitura) ficam num pool pequeno compartilhado entre as threads
+    do Flask, que cria uma thread por requisição: assim o SQL de cada intenção continua
+    preparado no cache de statements da conexão entre requisições. As respostas são
+    memorizadas por (intenção, parâmetros, versão dos dados).
+    """
+
+    def __init__(self, db_path, cache_size=256, tamanho_pool=4):
+        self.db_path = db_path
+        self.cache_size = cache_size
+        self._livres = queue.LifoQueue(maxsize=tamanho_pool)
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _emprestar(self):
+        try:
+            return self._livres.get_nowait()
+        except queue.Empty:
+            # Pool vazio (todas em uso): abre outra; na devolução ela fica no pool se houver vaga
+            return conectar(self.db_path, somente_leitura=True, check_same_thread=False,
+                            cached_statements=len(INTENTS) * 2)
+
+    def _devolver(self, conn):
+        try:
+            self._livres.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def responder(self, pergunta):
+        try:
+            intent, params = classificar(pergunta)
+        except ValueError as e:
+            return {'erro': str(e)}
+        if intent is None:
+            return {'erro': 'Pergunta não reconhecida'}
+
+        conn = self._emprestar()
+        # Versão e consulta no mesmo snapshot: a resposta memorizada corresponde à versão da chave
+        conn.execute('BEGIN')
+        try:
+            versao = get_data_version(conn)
+            chave = (intent.nome, params, versao[0] if versao else None)
+
+            with self._lock:
+                if chave in self._cache:
+                    self._cache.move_to_end(chave)
+                    QUERY_CACHE_TOTAL.inc(intent=intent.nome, resultado='hit')
+                    return self._cache[chave]
+            QUERY_CACHE_TOTAL.inc(intent=intent.nome, resultado='miss')
+
+            rows = conn.execute(intent.sql, params).fetchall()
+        finally:
+            conn.rollback()
+            self._devolver(conn)
+        resposta = intent.formatar(rows, params)
+
+        with self._lock:
+            self._cache[chave] = resposta
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return resposta
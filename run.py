@@ -1,9 +1,13 @@
 #!/usr/bin/env python3
+import hashlib
 import os
 import sys
 import subprocess
-import time
 import webbrowser
+from importlib import metadata
+
+# Marca de ambiente já verificado (hash do requirements.txt + versão do Python)
+DEPS_STAMP = '.deps_ok'
 
 def criar_requirements():
     """Criar arquivo requirements.txt com as libs usadas"""
@@ -21,24 +25,14 @@ def criar_requirements():
     requirements_content = []
     
     for lib, desc in libs_essenciais.items():
+        # Lê a versão instalada direto dos metadados (sem um `pip show` por lib)
         try:
-            # Tenta ver a versão instalada
-            result = subprocess.run([sys.executable, '-m', 'pip', 'show', lib], 
-                                  capture_output=True, text=True)
-            if result.returncode == 0:
-                # Extrai a versão da saída
-                for line in result.stdout.split('\n'):
-                    if line.startswith('Version:'):
-                        version = line.split(':')[1].strip()
-                        requirements_content.append(f"{lib}=={version}")
-                        print(f"[OK] {lib}=={version} - {desc}")
-                        break
-            else:
-                requirements_content.append(f"{lib}>=2.0.0")
-                print(f"[AVISO] {lib} nao encontrado, usando versao generica")
-                
-        except Exception as e:
-            print(f"[ERRO] Ao verificar {lib}: {e}")
+            version = metadata.version(lib)
+            requirements_content.append(f"{lib}=={version}")
+            print(f"[OK] {lib}=={version} - {desc}")
+        except metadata.PackageNotFoundError:
+            requirements_content.append(f"{lib}>=2.0.0")
+            print(f"[AVISO] {lib} nao encontrado, usando versao generica")
     
     # Escreve no arquivo
     with open('requirements.txt', 'w', encoding='utf-8') as f:
@@ -48,12 +42,30 @@ def criar_requirements():
     
     print(f"[OK] requirements.txt criado com {len(requirements_content)} libs")
 
+def assinatura_ambiente():
+    """Hash do requirements.txt + versão do Python; muda quando é preciso reinstalar"""
+    with open('requirements.txt', 'rb') as f:
+        conteudo = f.read()
+    return hashlib.sha256(conteudo + sys.version.encode()).hexdigest()
+
+def dependencias_em_dia():
+    """Partida a quente: o ambiente já foi verificado com este requirements.txt"""
+    if not os.path.exists('requirements.txt') or not os.path.exists(DEPS_STAMP):
+        return False
+    with open(DEPS_STAMP, encoding='utf-8') as f:
+        return f.read().strip() == assinatura_ambiente()
+
 def verificar_dependencias():
     """Verificar e instalar dependências necessárias"""
+    if dependencias_em_dia():
+        print("[OK] Dependencias ja verificadas (partida a quente)")
+        return True
+    
     print("=== VERIFICANDO DEPENDENCIAS ===")
     
-    # Primeiro cria o requirements.txt
-    criar_requirements()
+    # Só gera o requirements.txt se ele ainda não existir
+    if not os.path.exists('requirements.txt'):
+        criar_requirements()
     
     # Verifica se requirements.txt existe
     if not os.path.exists('requirements.txt'):
@@ -65,130 +77,18 @@ def verificar_dependencias():
         print("Instalando dependencias do requirements.txt...")
         subprocess.check_call([sys.executable, '-m', 'pip', 'install', '-r', 'requirements.txt'])
         print("[OK] Dependencias instaladas com sucesso!")
+        with open(DEPS_STAMP, 'w', encoding='utf-8') as f:
+            f.write(assinatura_ambiente())
         return True
     except subprocess.CalledProcessError:
         print("[ERRO] Falha ao instalar dependencias")
         return False
 
-def executar_etl():
-    """Executar o script de ETL (main.py)"""
-    print("\n" + "="*50)
-    print("EXECUTANDO ETL (main.py)")
-    print("="*50)
-    
-    if not os.path.exists('main.py'):
-        print("[ERRO] main.py nao encontrado! Pulando etapa ETL...")
-        return False
-    
-    try:
-        env = os.environ.copy()
-        env['PYTHONIOENCODING'] = 'utf-8'
-        
-        resultado = subprocess.run([sys.executable, 'main.py'], 
-                                capture_output=True, 
-                                text=True,
-                                encoding='utf-8',
-                                env=env)
-        
-        if resultado.returncode == 0:
-            print("[OK] ETL executado com sucesso!")
-            if resultado.stdout:
-                print("Saida:", resultado.stdout)
-            return True
-        else:
-            print("[ERRO] Erro no ETL:")
-            if resultado.stderr:
-                print(resultado.stderr)
-            return False
-            
-    except Exception as e:
-        print(f"[ERRO] Erro ao executar ETL: {e}")
-        return False
-
-def executar_scraping():
-    """Executar o script de scraping (scrapper.py)"""
-    print("\n" + "="*50)
-    print("EXECUTANDO WEB SCRAPING (scrapper.py)")
-    print("="*50)
-    
-    nomes_scrapper = ['scrapper.py', 'scraper.py']
-    scrapper_encontrado = None
-    
-    for nome in nomes_scrapper:
-        if os.path.exists(nome):
-            scrapper_encontrado = nome
-            break
-    
-    if not scrapper_encontrado:
-        print("[AVISO] scrapper.py nao encontrado! Pulando etapa scraping...")
-        return False
-    
-    try:
-        env = os.environ.copy()
-        env['PYTHONIOENCODING'] = 'utf-8'
-        
-        resultado = subprocess.run([sys.executable, scrapper_encontrado], 
-                                capture_output=True, 
-                                text=True,
-                                encoding='utf-8',
-                                env=env)
-        
-        if resultado.returncode == 0:
-            print("[OK] Web scraping executado com sucesso!")
-            if resultado.stdout:
-                print("Saida:", resultado.stdout)
-            return True
-        else:
-            print("[ERRO] Erro no scraping:")
-            if resultado.stderr:
-                print(resultado.stderr)
-            return False
-            
-    except Exception as e:
-        print(f"[ERRO] Erro ao executar scraping: {e}")
-        return False
-
-def executar_aplicacao():
-    """Executar a aplicação Flask (app.py)"""
-    print("\n" + "="*50)
-    print("INICIANDO APLICACAO FLASK (app.py)")
-    print("="*50)
-    
-    if not os.path.exists('app.py'):
-        print("[ERRO] app.py nao encontrado!")
-        return False
-    
-    if not os.path.exists('cupons_fiscais.db'):
-        print("[AVISO] Banco de dados nao encontrado! A aplicacao pode nao funcionar corretamente.")
-    
-    print("[OK] Ambiente verificado!")
-    print("URL: http://localhost:5000")
-    print("Dashboard disponivel em 3 segundos...")
-    print("Para parar: Ctrl+C")
-    print("-" * 50)
-    
-    def abrir_navegador():
-        time.sleep(3)
-        try:
-            webbrowser.open('http://localhost:5000')
-        except:
-            print("[AVISO] Nao foi possivel abrir o navegador automaticamente")
-    
-    import threading
-    threading.Thread(target=abrir_navegador, daemon=True).start()
-    
+def abrir_navegador():
     try:
-        env = os.environ.copy()
-        env['PYTHONIOENCODING'] = 'utf-8'
-        
-        subprocess.run([sys.executable, 'app.py'], env=env)
-    except KeyboardInterrupt:
-        print("\n[PARADO] Aplicacao encerrada pelo usuario")
-    except Exception as e:
-        print(f"[ERRO] Erro na aplicacao: {e}")
-        return False
-    
-    return True
+        webbrowser.open('http://localhost:5000')
+    except Exception:
+        print("[AVISO] Nao foi possivel abrir o navegador automaticamente")
 
 def main():
     """Função principal que orquestra toda a execução"""
@@ -198,17 +98,16 @@ def main():
     if sys.platform == "win32":
         os.system('chcp 65001 > nul')
     
-    # 1. Verificar e instalar dependências
+    # 1. Verificar e instalar dependências (pulado em partida a quente)
     verificar_dependencias()
     
-    # 2. Executar ETL
-    etl_sucesso = executar_etl()
-    
-    # 3. Executar Scraping
-    scraping_sucesso = executar_scraping()
-    
-    # 4. Executar Aplicação
-    executar_aplicacao()
+    # 2. ETL, enriquecimento e aplicação no mesmo processo: o dashboard
+    #    sobe assim que o primeiro lote chega ao banco
+    from pipeline import Pipeline
+    print("URL: http://localhost:5000")
+    print("Para parar: Ctrl+C")
+    print("-" * 50)
+    Pipeline(ao_servir=abrir_navegador).run()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
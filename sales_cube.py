@@ -0,0 +1,151 @@
+import calendar
+import threading
+from datetime import datetime
+
+from money import CENTAVOS
+from queries import CUBO_QUERY
+
+DIAS_SEMANA = ['Seg', 'Ter', 'Qua', 'Qui', 'Sex', 'Sáb', 'Dom']
+MEDIDAS = ('faturamento', 'cupons', 'itens')
+
+# Dimensões do cubo calculadas no SQLite: segunda = 0 (como date.weekday()) e hora 0-23
+_DIA_SEMANA = "(CAST(strftime('%w', c.data_emissao) AS INTEGER) + 6) % 7"
+_HORA = '(c.timestamp_emissao % 86400) / 3600'
+
+_UPSERT = '''
+    ON CONFLICT(data, emitente_cnpj, numero_caixa, hora) DO UPDATE SET
+        faturamento = cubo_vendas.faturamento + excluded.faturamento,
+        cupons = cubo_vendas.cupons + excluded.cupons,
+        itens = cubo_vendas.itens + excluded.itens
+'''
+
+
+def timestamp_emissao(data_emissao, hora_emissao):
+    """Data (AAAA-MM-DD) + hora (HHMMSS) do CF-e em segundos desde a época.
+
+    É o horário de parede da loja, sem fuso: `timestamp % 86400` dá a hora local.
+    """
+    if not data_emissao:
+        return None
+    try:
+        dia = datetime.strptime(data_emissao, '%Y-%m-%d')
+        hora = (hora_emissao or '').replace(':', '').ljust(6, '0')
+        return calendar.timegm(dia.timetuple()) + int(hora[0:2]) * 3600 + int(hora[2:4]) * 60 + int(hora[4:6])
+    except ValueError:
+        return None
+
+
+def atualizar_cubo_cupons(conn, chaves, bloco=500):
+    """Soma faturamento e nº de cupons dos cupons novos (`chaves`) ao cubo"""
+    chaves = list(chaves)
+    for i in range(0, len(chaves), bloco):
+        parte = chaves[i:i + bloco]
+        marcadores = ','.join('?' * len(parte))
+        conn.execute(f'''
+            INSERT INTO cubo_vendas (data, emitente_cnpj, numero_caixa, dia_semana, hora, faturamento, cupons, itens)
+            SELECT c.data_emissao, COALESCE(c.emitente_cnpj, ''), COALESCE(c.numero_caixa, ''),
+                   {_DIA_SEMANA}, {_HORA}, SUM(c.valor_total), COUNT(*), 0
+            FROM cupons c
+            WHERE c.chave_acesso IN ({marcadores}) AND c.timestamp_emissao IS NOT NULL
+            GROUP BY 1, 2, 3, 5
+            {_UPSERT}
+        ''', parte)
+
+
+def atualizar_cubo_itens(conn, ultimo_id):
+    """Soma ao cubo a quantidade de itens com id > ultimo_id (mesma transação da ingestão)"""
+    conn.execute(f'''
+        INSERT INTO cubo_vendas (data, emitente_cnpj, numero_caixa, dia_semana, hora, faturamento, cupons, itens)
+        SELECT c.data_emissao, COALESCE(c.emitente_cnpj, ''), COALESCE(c.numero_caixa, ''),
+               {_DIA_SEMANA}, {_HORA}, 0, 0, COUNT(*)
+        FROM itens i
+        JOIN cupons c ON c.chave_acesso = i.chave_acesso
+        WHERE i.id > ? AND c.timestamp_emissao IS NOT NULL
+        GROUP BY 1, 2, 3, 5
+        {_UPSERT}
+    ''', (ultimo_id,))
+
+
+def reconstruir_cubo(conn):
+    """Recalcula o cubo inteiro a partir de cupons e itens (migração ou correção)"""
+    conn.execute('DELETE FROM cubo_vendas')
+    conn.execute(f'''
+        INSERT INTO cubo_vendas (data, emitente_cnpj, numero_caixa, dia_semana, hora, faturamento, cupons, itens)
+        SELECT c.data_emissao, COALESCE(c.emitente_cnpj, ''), COALESCE(c.numero_caixa, ''),
+               {_DIA_SEMANA}, {_HORA}, SUM(c.valor_total), COUNT(*), 0
+        FROM cupons c
+        WHERE c.timestamp_emissao IS NOT NULL
+        GROUP BY 1, 2, 3, 5
+    ''')
+    atualizar_cubo_itens(conn, 0)
+
+
+class SalesCube:
+    """Cubo de vendas (data x emitente x caixa x dia da semana x hora) em arrays NumPy.
+
+    Carregado uma vez por versão dos dados; filtros por loja, caixa e período
+    são máscaras vetorizadas e o mapa 7x24 sai de um único bincount.
+    """
+
+    def __init__(self, linhas):
+        import numpy as np
+        colunas = list(zip(*linhas)) if linhas else [()] * 8
+        datas, emitentes, caixas, dias, horas, faturamento, cupons, itens = colunas
+        self.datas = np.array(datas, dtype='datetime64[D]')
+        self.emitentes, self._emitente = np.unique(np.array(emitentes, dtype=str), return_inverse=True)
+        self.caixas, self._caixa = np.unique(np.array(caixas, dtype=str), return_inverse=True)
+        self._celula = np.array(dias, dtype=np.int64) * 24 + np.array(horas, dtype=np.int64)
+        # Medidas inteiras (faturamento em centavos)
+        self.medidas = {
+            'faturamento': np.array(faturamento, dtype=np.int64),
+            'cupons': np.array(cupons, dtype=np.int64),
+            'itens': np.array(itens, dtype=np.int64),
+        }
+
+    @classmethod
+    def carregar(cls, conn):
+        return cls(conn.execute(CUBO_QUERY).fetchall())
+
+    def _mascara(self, data_inicio=None, data_fim=None, emitente=None, caixa=None):
+        import numpy as np
+        mascara = np.ones(len(self.datas), dtype=bool)
+        if data_inicio:
+            mascara &= self.datas >= np.datetime64(data_inicio)
+        if data_fim:
+            mascara &= self.datas <= np.datetime64(data_fim)
+        for valor, valores, indices in ((emitente, self.emitentes, self._emitente),
+                                        (caixa, self.caixas, self._caixa)):
+            if valor is not None:
+                posicao = np.searchsorted(valores, valor)
+                if posicao >= len(valores) or valores[posicao] != valor:
+                    return np.zeros(len(self.datas), dtype=bool)
+                mascara &= indices == posicao
+        return mascara
+
+    def heatmap(self, medida='cupons', data_inicio=None, data_fim=None, emitente=None, caixa=None):
+        """Matriz 7 (segunda..domingo) x 24 (horas) da medida no recorte pedido (faturamento em reais)"""
+        import numpy as np
+        if medida not in MEDIDAS:
+            raise ValueError(f"Medida inválida: '{medida}'. Use: {', '.join(MEDIDAS)}")
+        mascara = self._mascara(data_inicio, data_fim, emitente, caixa)
+        # bincount soma em float64, exato para inteiros abaixo de 2**53
+        valores = np.bincount(self._celula[mascara], weights=self.medidas[medida][mascara], minlength=7 * 24)
+        valores = np.rint(valores).astype(np.int64).reshape(7, 24)
+        return valores / CENTAVOS if medida == 'faturamento' else valores
+
+
+class SalesCubeCache:
+    """Mantém o SalesCube da versão atual dos dados (recarrega quando a versão muda)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versao = None
+        self._cubo = None
+
+    def obter(self, versao, carregar):
+        """`carregar()` monta o SalesCube; só é chamado quando a versão muda"""
+        with self._lock:
+            if self._cubo is None or versao is None or versao != self._versao:
+                self._cubo = carregar()
+                self._versao = versao
+            return self._cubo
@@ -1,71 +1,41 @@
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.chrome.options import Options
 import time
-import random
 from database import Database
+from webdriver_pool import WebDriverPool
+from gtin_lookup import GTINLookupClient
+from gtin_cache import GTINCache, GTINS_CONHECIDOS
+from gtin_profile import GTINProfile, REAL, INTERNO
+from enrichment_queue import EnrichmentQueue, worker_id_padrao, PENDENTE, EM_ANDAMENTO, CONCLUIDO, FALHOU
+import metrics
 
 class ProductScraper:
-    def __init__(self):
-        self.db = Database()
-        self.setup_driver()
-    
-    def setup_driver(self):
-        chrome_options = Options()
-        chrome_options.add_argument("--headless")  # Voltar ao headless
-        chrome_options.add_argument("--no-sandbox")
-        chrome_options.add_argument("--disable-dev-shm-usage")
-        chrome_options.add_argument("--disable-gpu")
-        chrome_options.add_argument("--window-size=1920,1080")
-        chrome_options.add_argument("--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
-        
-        self.driver = webdriver.Chrome(options=chrome_options)
-        self.driver.implicitly_wait(10)
+    def __init__(self, lookup_client=None, drivers=None, db=None):
+        self.db = db or Database()
+        # APIs JSON (Brasil API) são consultadas via HTTP assíncrono; o Selenium fica para fontes HTML
+        self.lookup_client = lookup_client or GTINLookupClient()
+        # Resultados (inclusive GTINs desconhecidos) ficam em cache entre execuções
+        self.cache = GTINCache(self.db)
+        self.fila = EnrichmentQueue(self.db)
+        self.perfil = GTINProfile(self.db)
+        # Navegadores só são abertos na primeira página HTML; o pool pode ser compartilhado entre workers
+        self._drivers_proprios = drivers is None
+        self.drivers = drivers or WebDriverPool()
 
-    def analisar_gtins_do_banco(self):
-        """Analisa os GTINs reais dos seus XMLs"""
+    def analisar_gtins_do_banco(self, top=10):
+        """Analisa os GTINs reais dos seus XMLs (lê o perfil agregado mantido na ingestão)"""
         print("=== ANALISANDO GTINS DOS SEUS XMLs ===")
         
-        itens = self.db.get_all_itens()
-        gtins_unicos = {}
-        
-        for item in itens:
-            gtin = item[4]  # codigo_gtin
-            descricao = item[5]  # descricao
-            ncm = item[6]  # ncm
-            
-            if gtin and gtin != 'None' and gtin != 'SEM GTIN' and len(gtin) >= 8:
-                if gtin not in gtins_unicos:
-                    gtins_unicos[gtin] = {
-                        'descricao': descricao,
-                        'ncm': ncm,
-                        'quantidade': 1
-                    }
-                else:
-                    gtins_unicos[gtin]['quantidade'] += 1
-        
-        print(f"Total de GTINs únicos encontrados: {len(gtins_unicos)}")
+        contagem = self.perfil.contagem_por_tipo()
+        print(f"Total de GTINs únicos encontrados: {contagem[REAL] + contagem[INTERNO]}")
+        print(f"✅ GTINs reais (dígito GS1 válido): {contagem[REAL]}")
+        print(f"⚠️  Códigos internos: {contagem[INTERNO]}")
         
-        # Separar GTINs reais vs códigos internos
-        gtins_reais = {}
-        gtins_internos = {}
+        gtins_reais = {p['gtin']: {'descricao': p['descricao'], 'ncm': p['ncm'], 'quantidade': p['frequencia']}
+                       for p in self.perfil.top(top, REAL)}
+        gtins_internos = {p['gtin']: {'descricao': p['descricao'], 'ncm': p['ncm'], 'quantidade': p['frequencia']}
+                          for p in self.perfil.top(top, INTERNO)}
         
-        for gtin, info in gtins_unicos.items():
-            if gtin.startswith(('789', '790')):  # GTINs brasileiros reais
-                gtins_reais[gtin] = info
-            else:
-                gtins_internos[gtin] = info
-        
-        print(f"✅ GTINs reais (789/790): {len(gtins_reais)}")
-        print(f"⚠️  Códigos internos: {len(gtins_internos)}")
-        
-        # Mostrar top GTINs reais
-        gtins_reais_ordenados = sorted(gtins_reais.items(), key=lambda x: x[1]['quantidade'], reverse=True)
-        
-        print(f"\n=== TOP 10 GTINS REAIS MAIS VENDIDOS ===")
-        for i, (gtin, info) in enumerate(gtins_reais_ordenados[:10]):
+        print(f"\n=== TOP {top} GTINS REAIS MAIS VENDIDOS ===")
+        for i, (gtin, info) in enumerate(gtins_reais.items()):
             print(f"{i+1}. GTIN: {gtin}")
             print(f"   Descrição: {info['descricao']}")
             print(f"   NCM: {info['ncm']}")
@@ -76,78 +46,74 @@ class ProductScraper:
     
     def get_product_info_manual(self, gtin):
         """Busca manual baseada no GTIN conhecido - ATUALIZADA"""
-        # Base expandida com produtos dos seus XMLs
-        gtin_database = {
-            # SEUS PRODUTOS REAIS (do analysis)
-            "7622300861148": ("REFRIGERANTE TANG 25G", "21069010"),
-            "7622300861308": ("REFRIGERANTE TANG 25G", "21069010"),
-            "7622300861261": ("REFRIGERANTE TANG 25G", "21069010"),
-            "7622300861223": ("REFRIGERANTE TANG 25G", "21069010"),
-            "7896273100393": ("ENERGÉTICO RED TIGER 2L", "22029900"),
-            "7898080640017": ("LEITE LONGA VIDA ITALAC 1L", "04012010"),
-            "7896279600538": ("ÓLEO DE SOJA COAMO 900ML", "15079011"),
-            "7898954959078": ("COENTRO HIDROPÔNICO", "07108000"),
-            "7896045505357": ("CERVEJA HEINEKEN 250ML", "22030000"),
-            "7894900011517": ("REFRIGERANTE COCA-COLA 2L", "22021000"),
-            "7894900011012": ("REFRIGERANTE COCA-COLA LATA 350ML", "22021000"),
-            "7891000305508": ("LEITE CONDENSADO MOÇA 395G", "04029900"),
-            "7893000362549": ("SABÃO EM PÓ OMO 1KG", "34012090"),
-            "7891156003068": ("LEITE FERMENTADO YAKULT 80G", "04039000"),
-            "7891203010308": ("PÃO DE FORMA PANCO COCO 350G", "19059090"),
-            "7894000182018": ("BEBIDA DE SOJA ADES MAÇÃ 1L", "22029900"),
-            "7896353301184": ("REQUEIJÃO CATUPIRY 200G", "04061090")
-        }
-        
-        if gtin in gtin_database:
-            descricao, ncm = gtin_database[gtin]
+        if gtin in GTINS_CONHECIDOS:
+            descricao, ncm = GTINS_CONHECIDOS[gtin]
             print(f"📦 GTIN encontrado na base local: {descricao}")
             return descricao, ncm
         
         return None, None
     
+    def is_gtin_brasileiro(self, gtin):
+        """Brasil API só conhece GTINs reais brasileiros (prefixos 789/790)"""
+        return bool(gtin) and gtin != 'None' and gtin.startswith(('789', '790'))
+    
     def get_product_info_brasilapi(self, gtin):
-        """Tenta buscar no Brasil API - VERSÃO MELHORADA"""
-        if not gtin or gtin == 'None':
-            return None, None
-        
-        # Pular códigos internos (não são GTINs reais)
-        if not gtin.startswith(('789', '790')):
+        """Busca no Brasil API (JSON direto via HTTP, sem abrir navegador)"""
+        if not self.is_gtin_brasileiro(gtin):
             return None, None
         
+        print(f"🌐 Buscando GTIN no Brasil API: {gtin}")
+        return self.lookup_client.lookup_sync(gtin)
+    
+    def get_page_source(self, url, espera=2):
+        """Carrega uma página HTML com o Selenium (fallback para fontes sem API JSON)"""
         try:
-            url = f"https://brasilapi.com.br/api/gtins/v1/{gtin}"
-            print(f"🌐 Buscando GTIN no Brasil API: {gtin}")
-            self.driver.get(url)
-            
-            time.sleep(2)
-            
-            # Verificar se a página carregou corretamente (não é página de erro)
-            page_source = self.driver.page_source
-            
-            if "error" in page_source.lower() or "not found" in page_source.lower():
-                return None, None
-            
-            if "description" in page_source:
-                import json
-                import re
-                
-                json_match = re.search(r'\{.*\}', page_source)
-                if json_match:
-                    try:
-                        data = json.loads(json_match.group())
-                        descricao = data.get('description', '')
-                        ncm = data.get('ncm', '')
-                        
-                        if descricao and len(descricao) > 5:
-                            return descricao, ncm
-                    except:
-                        pass
-            
-            return None, None
-            
+            with self.drivers.acquire() as driver:
+                driver.get(url)
+                time.sleep(espera)
+                return driver.page_source
         except Exception as e:
-            print(f"❌ Erro no Brasil API para {gtin}: {e}")
-            return None, None
+            print(f"❌ Erro ao carregar {url}: {e}")
+            return None
+    
+    def resolver_gtins(self, gtins):
+        """Resolve GTINs por cache -> base local -> Brasil API (em paralelo, com limite de taxa).
+        
+        Retorna (resultados, falhas): `resultados` tem (descricao, ncm) de todo GTIN com
+        resposta definitiva ((None, None) se desconhecido); `falhas` são os GTINs que
+        esgotaram as tentativas de rede e devem ser tentados de novo mais tarde.
+        """
+        # Cache primeiro (inclui a base local e GTINs já sabidamente desconhecidos)
+        resultados = self.cache.get_many(gtins)
+        metrics.SCRAPER_LOOKUPS_TOTAL.inc(len(resultados), fonte='cache', resultado='hit')
+        if resultados:
+            print(f"💾 {len(resultados)} GTINs respondidos pelo cache")
+        
+        pendentes = []
+        for gtin in gtins:
+            if gtin in resultados:
+                continue
+            descricao, ncm = self.get_product_info_manual(gtin)
+            metrics.SCRAPER_LOOKUPS_TOTAL.inc(fonte='manual', resultado='hit' if descricao else 'miss')
+            if descricao:
+                resultados[gtin] = (descricao, ncm)
+            elif self.is_gtin_brasileiro(gtin):
+                pendentes.append(gtin)
+            else:
+                resultados[gtin] = (None, None)
+        
+        falhas = set()
+        if pendentes:
+            print(f"🌐 Consultando {len(pendentes)} GTINs no Brasil API "
+                  f"(até {self.lookup_client.concorrencia} em paralelo)...")
+            consultados, falhas = self.lookup_client.lookup_many_sync(pendentes, com_falhas=True)
+            for gtin, (descricao, ncm) in consultados.items():
+                metrics.SCRAPER_LOOKUPS_TOTAL.inc(fonte='brasilapi', resultado='hit' if descricao else 'miss')
+            # Só respostas definitivas vão para o cache (falha de rede não vira cache negativo)
+            self.cache.put_many(consultados, fonte='brasilapi')
+            resultados.update(consultados)
+        
+        return resultados, falhas
     
     def get_product_info(self, gtin):
         """Tenta múltiplas fontes para obter informações do produto"""
@@ -156,53 +122,67 @@ class ProductScraper:
         
         print(f"\n🔍 Buscando informações para GTIN: {gtin}")
         
-        # Tentar base local primeiro (mais rápido)
-        descricao, ncm = self.get_product_info_manual(gtin)
-        if descricao:
-            return descricao, ncm
-        
-        # Para GTINs reais, tentar API
-        descricao, ncm = self.get_product_info_brasilapi(gtin)
+        resultados, falhas = self.resolver_gtins([gtin])
+        descricao, ncm = resultados.get(gtin, (None, None))
         if descricao:
             return descricao, ncm
         
         print(f"❌ Nenhuma informação encontrada para GTIN: {gtin}")
         return None, None
     
-    def enrich_products_smart(self, limit=10):
-        """Enriquece apenas produtos com GTINs reais"""
-        gtins_reais, gtins_internos = self.analisar_gtins_do_banco()
-        
-        print(f"\n🎯 ENRIQUECENDO PRODUTOS (GTINs REAIS)")
-        print(f"Total de GTINs reais disponíveis: {len(gtins_reais)}")
+    def enrich_products_smart(self, limit=10, lote=20, worker=None, criterio='frequencia'):
+        """Enriquece os GTINs reais mais relevantes a partir da fila persistente.
         
-        # Pegar os GTINs reais mais frequentes
-        gtins_para_enriquecer = sorted(gtins_reais.items(), key=lambda x: x[1]['quantidade'], reverse=True)[:limit]
+        A fila guarda o progresso: GTINs concluídos não são repetidos, falhas só
+        voltam após o `retry_apos` e vários workers podem drenar a fila ao mesmo tempo.
+        """
+        worker = worker or worker_id_padrao()
+        resumo = self.fila.sincronizar(criterio)
         
-        print(f"Processando {len(gtins_para_enriquecer)} GTINs reais...")
-        
-        for i, (gtin, info) in enumerate(gtins_para_enriquecer):
-            print(f"\n--- Produto {i+1}/{len(gtins_para_enriquecer)}: {gtin} ---")
-            print(f"Descrição atual: {info['descricao']}")
+        print(f"\n🎯 ENRIQUECENDO PRODUTOS (GTINs REAIS)")
+        print(f"Fila: {resumo[PENDENTE]} pendentes, {resumo[CONCLUIDO]} concluídos, "
+              f"{resumo[FALHOU]} com falha, {resumo[EM_ANDAMENTO]} em andamento")
+        
+        processados = 0
+        while processados < limit:
+            reservados = self.fila.reservar(worker, min(lote, limit - processados))
+            if not reservados:
+                break
             
-            descricao, ncm = self.get_product_info(gtin)
+            gtins = [gtin for gtin, _ in reservados]
+            resultados, falhas = self.resolver_gtins(gtins)
             
-            if descricao:
-                print(f"✅ NOVA Descrição: {descricao}")
-                print(f"✅ NCM: {ncm}")
+            for gtin, descricao_atual in reservados:
+                processados += 1
+                print(f"\n--- Produto {processados}/{limit}: {gtin} ---")
+                print(f"Descrição atual: {descricao_atual}")
                 
-                # Atualizar no banco
-                self.db.update_item_info(gtin, descricao, ncm)
-            else:
-                print("ℹ️  Mantendo descrição original")
+                if gtin in falhas:
+                    print("⚠️  Falha temporária na consulta: GTIN volta para a fila mais tarde")
+                    continue
+                
+                descricao, ncm = resultados.get(gtin, (None, None))
+                if descricao:
+                    print(f"✅ NOVA Descrição: {descricao}")
+                    print(f"✅ NCM: {ncm}")
+                    
+                    # Atualizar no banco
+                    self.db.update_item_info(gtin, descricao, ncm)
+                else:
+                    print("ℹ️  Mantendo descrição original")
             
-            time.sleep(random.uniform(1, 3))
+            # Checkpoint do lote na fila
+            self.fila.concluir(worker, {gtin: bool(resultados.get(gtin, (None,))[0])
+                                        for gtin in gtins if gtin not in falhas})
+            if falhas:
+                self.fila.falhar(worker, falhas, 'Sem resposta da API após as tentativas')
         
-        print(f"\n🎉 Enriquecimento inteligente concluído!")
+        print(f"\n🎉 Enriquecimento inteligente concluído! ({processados} GTINs processados)")
     
     def close(self):
-        self.driver.quit()
-        print("🔚 Driver fechado.")
+        if self._drivers_proprios and self.drivers.iniciado:
+            self.drivers.close()
+            print("🔚 Driver fechado.")
 
 # Função de teste ATUALIZADA
 def test_scraper():
@@ -0,0 +1,318 @@
+import argparse
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from database import Database, conectar
+from money import CENTAVOS, MILESIMOS, QUANTIDADE, para_reais
+from queries import FILTRO_CUPONS, FILTRO_ITENS, PARCIAIS, PARCIAL_GTINS, PARCIAL_STATS, VERSAO_QUERY
+
+PASTA_SHARDS = 'data/shards'
+N_SHARDS = 4
+
+# Consultas dos dashboards em duas partes: o agregado parcial que cada shard calcula
+# (queries.PARCIAIS, sem LIMIT, senão o top-N global pode perder produtos) e como os parciais se combinam.
+# Os parciais são somas inteiras (centavos), convertidas pelas `escalas` só depois de combinadas
+CONSULTAS = {
+    'top_products': {
+        'sql': PARCIAIS['top_products'],
+        'tabela': 'itens', 'chaves': ('produto',), 'somas': ('total_vendido',),
+        'escalas': {'total_vendido': CENTAVOS}, 'ordem': 'total_vendido', 'limite': 5,
+    },
+    'top_products_quantity': {
+        'sql': PARCIAIS['top_products_quantity'],
+        'tabela': 'itens', 'chaves': ('produto',), 'somas': ('total_quantidade',),
+        'escalas': {'total_quantidade': QUANTIDADE}, 'ordem': 'total_quantidade', 'limite': 5,
+    },
+    'daily_revenue': {
+        'sql': PARCIAIS['daily_revenue'],
+        'tabela': 'cupons', 'chaves': ('data',), 'somas': ('faturamento',),
+        'escalas': {'faturamento': CENTAVOS}, 'ordem': 'data', 'decrescente': False,
+    },
+    'cfop_sales': {
+        'sql': PARCIAIS['cfop_sales'],
+        'tabela': 'itens', 'chaves': ('cfop',), 'somas': ('total_vendido',),
+        'escalas': {'total_vendido': CENTAVOS}, 'ordem': 'total_vendido', 'limite': 5,
+    },
+    'avg_product_value': {
+        # Média global = soma das somas / soma das contagens (média de médias estaria errada)
+        'sql': PARCIAIS['avg_product_value'],
+        'tabela': 'itens', 'chaves': ('produto',), 'somas': ('soma', 'n'),
+        'derivadas': {'valor_medio': lambda linha: linha.pop('soma') / linha.pop('n') / MILESIMOS},
+        'ordem': 'valor_medio', 'limite': 5,
+    },
+    'discount_analysis': {
+        'sql': PARCIAIS['discount_analysis'],
+        'tabela': 'itens', 'ordem': 'id', 'decrescente': False, 'limite': 100, 'descartar': ('id',),
+    },
+}
+
+
+def emitente_da_chave(chave):
+    """CNPJ do emitente embutido na chave de acesso (posições 7 a 20); '' se a chave não é padrão.
+
+    Cupons e itens são roteados pela chave, então um item sempre cai no shard do seu cupom.
+    """
+    chave = chave or ''
+    return chave[6:20] if len(chave) == 44 and chave.isdigit() else ''
+
+
+def combinar(parciais, chaves=(), somas=(), derivadas=None, ordem=None, decrescente=True, limite=None,
+             escalas=None, descartar=()):
+    """Junta os resultados parciais dos shards: soma `somas` por `chaves`, calcula `derivadas`,
+    ordena por `ordem`, corta em `limite` (sem chaves, só concatena), divide pelas `escalas`
+    e remove as colunas em `descartar` (usadas só para ordenar)"""
+    if chaves:
+        grupos = {}
+        for linhas in parciais:
+            for linha in linhas:
+                chave = tuple(linha[c] for c in chaves)
+                atual = grupos.get(chave)
+                if atual is None:
+                    grupos[chave] = dict(linha)
+                else:
+                    for coluna in somas:
+                        atual[coluna] = (atual[coluna] or 0) + (linha[coluna] or 0)
+        resultado = list(grupos.values())
+    else:
+        resultado = [dict(linha) for linhas in parciais for linha in linhas]
+
+    for coluna, calcular in (derivadas or {}).items():
+        for linha in resultado:
+            linha[coluna] = calcular(linha)
+    if ordem:
+        resultado.sort(key=lambda linha: linha[ordem], reverse=decrescente)
+    if limite:
+        resultado = resultado[:limite]
+    for coluna, escala in (escalas or {}).items():
+        for linha in resultado:
+            linha[coluna] = para_reais(linha[coluna], escala)
+    for linha in resultado:
+        for coluna in descartar:
+            linha.pop(coluna, None)
+    return resultado
+
+
+class ShardedDatabase:
+    """Armazenamento particionado por emitente: um arquivo SQLite (um `Database`) por shard.
+
+    O catálogo (`catalogo.db`) guarda o shard de cada emitente: na primeira vez
+    ele é escolhido pelo crc32 do CNPJ, e `atribuir` permite mover um cliente grande
+    para um shard próprio. A ingestão grava cada shard em paralelo. Consultas sem
+    emitente rodam em todos os shards num pool de threads e os parciais são
+    combinados. Com emitente, a consulta toca só o shard dele.
+    """
+
+    def __init__(self, pasta=PASTA_SHARDS, n_shards=N_SHARDS, max_workers=None):
+        os.makedirs(pasta, exist_ok=True)
+        self.pasta = pasta
+        self._catalogo_path = os.path.join(pasta, 'catalogo.db')
+        self._lock = threading.Lock()
+        self.n_shards = self._iniciar_catalogo(n_shards)
+        self.caminhos = [os.path.join(pasta, f'shard_{i:02d}.db') for i in range(self.n_shards)]
+        self.shards = [Database(caminho) for caminho in self.caminhos]
+        conn = self._catalogo()
+        try:
+            self._mapa = dict(conn.execute('SELECT emitente_cnpj, shard FROM emitente_shard'))
+        finally:
+            conn.close()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers or self.n_shards,
+                                        thread_name_prefix='shard')
+
+    def _catalogo(self):
+        return conectar(self._catalogo_path)
+
+    def _iniciar_catalogo(self, n_shards):
+        """Cria o catálogo; o nº de shards fica gravado e não muda depois da criação"""
+        conn = self._catalogo()
+        try:
+            conn.execute('CREATE TABLE IF NOT EXISTS config (chave TEXT PRIMARY KEY, valor TEXT)')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS emitente_shard (
+                    emitente_cnpj TEXT PRIMARY KEY,
+                    shard INTEGER NOT NULL,
+                    atribuido_em REAL
+                )
+            ''')
+            conn.execute("INSERT OR IGNORE INTO config (chave, valor) VALUES ('n_shards', ?)", (str(n_shards),))
+            conn.commit()
+            gravado = int(conn.execute("SELECT valor FROM config WHERE chave = 'n_shards'").fetchone()[0])
+        finally:
+            conn.close()
+        if gravado != n_shards:
+            print(f"⚠️ Catálogo criado com {gravado} shards; ignorando n_shards={n_shards}")
+        return gravado
+
+    def shard_de(self, emitente, criar=True):
+        """Índice do shard do emitente; com `criar=False` retorna None para emitente desconhecido"""
+        emitente = emitente or ''
+        shard = self._mapa.get(emitente)
+        if shard is not None:
+            return shard
+        with self._lock:
+            conn = self._catalogo()
+            try:
+                row = conn.execute('SELECT shard FROM emitente_shard WHERE emitente_cnpj = ?', (emitente,)).fetchone()
+                if row is None:
+                    if not criar:
+                        return None
+                    shard = zlib.crc32(emitente.encode('utf-8')) % self.n_shards
+                    conn.execute('INSERT INTO emitente_shard (emitente_cnpj, shard, atribuido_em) VALUES (?, ?, ?)',
+                                 (emitente, shard, time.time()))
+                    conn.commit()
+                else:
+                    shard = row[0]
+            finally:
+                conn.close()
+            self._mapa[emitente] = shard
+            return shard
+
+    def atribuir(self, emitente, shard):
+        """Fixa o shard de um emitente antes da primeira carga (dados já gravados não são movidos)"""
+        if not 0 <= shard < self.n_shards:
+            raise ValueError(f"Shard inválido: {shard} (0 a {self.n_shards - 1})")
+        with self._lock:
+            conn = self._catalogo()
+            try:
+                conn.execute('''
+                    INSERT INTO emitente_shard (emitente_cnpj, shard, atribuido_em) VALUES (?, ?, ?)
+                    ON CONFLICT(emitente_cnpj) DO UPDATE SET shard = excluded.shard, atribuido_em = excluded.atribuido_em
+                ''', (emitente, shard, time.time()))
+                conn.commit()
+            finally:
+                conn.close()
+            self._mapa[emitente] = shard
+
+    def _alvos(self, emitente=None):
+        """Shards que uma consulta precisa tocar"""
+        if emitente is None:
+            return list(range(self.n_shards))
+        shard = self.shard_de(emitente, criar=False)
+        return [] if shard is None else [shard]
+
+    def _em_paralelo(self, func, alvos):
+        return list(self._pool.map(func, alvos))
+
+    # --- Ingestão (mesma interface do Database) ---
+
+    def init_database(self):
+        self._em_paralelo(lambda i: self.shards[i].init_database(), range(self.n_shards))
+
+    def _por_shard(self, registros):
+        grupos = defaultdict(list)
+        for registro in registros:
+            grupos[self.shard_de(emitente_da_chave(registro['chave_acesso']))].append(registro)
+        return grupos
+
+    def insert_notas(self, notas_data):
+        grupos = self._por_shard(notas_data)
+        self._em_paralelo(lambda i: self.shards[i].insert_notas(grupos[i]), list(grupos))
+
+    def insert_itens(self, itens_data):
+        grupos = self._por_shard(itens_data)
+        self._em_paralelo(lambda i: self.shards[i].insert_itens(grupos[i]), list(grupos))
+
+    def clear_database(self):
+        self._em_paralelo(lambda i: self.shards[i].clear_database(), range(self.n_shards))
+
+    # --- Leitura ---
+
+    def linhas(self, sql, params=(), emitente=None, tabela=None):
+        """Executa `sql` nos shards (só no do emitente, se informado) e retorna as linhas de cada um.
+
+        Cada `{filtro}` no SQL vira o filtro do emitente conforme a `tabela` ('cupons' ou 'itens').
+        """
+        if emitente is not None and tabela:
+            filtro = FILTRO_ITENS if tabela == 'itens' else FILTRO_CUPONS
+            params = tuple(params) + (emitente,) * sql.count('{filtro}')
+            sql = sql.replace('{filtro}', filtro)
+        else:
+            sql = sql.replace('{filtro}', '')
+
+        def consultar(i):
+            conn = conectar(self.caminhos[i], somente_leitura=True)
+            conn.row_factory = sqlite3.Row
+            try:
+                return [dict(row) for row in conn.execute(sql, params)]
+            finally:
+                conn.close()
+        return self._em_paralelo(consultar, self._alvos(emitente))
+
+    def conexao(self, emitente):
+        """Conexão só de leitura ao shard do emitente (emitente desconhecido: shard vazio do crc32)"""
+        shard = self.shard_de(emitente, criar=False)
+        if shard is None:
+            shard = zlib.crc32(emitente.encode('utf-8')) % self.n_shards
+        conn = conectar(self.caminhos[shard], somente_leitura=True)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def consultar(self, nome, emitente=None):
+        """Resultado de uma das CONSULTAS dos dashboards, combinado entre os shards"""
+        consulta = CONSULTAS[nome]
+        parciais = self.linhas(consulta['sql'], emitente=emitente, tabela=consulta['tabela'])
+        return combinar(parciais, consulta.get('chaves', ()), consulta.get('somas', ()),
+                        consulta.get('derivadas'), consulta.get('ordem'),
+                        consulta.get('decrescente', True), consulta.get('limite'), consulta.get('escalas'),
+                        consulta.get('descartar', ()))
+
+    def get_stats(self, emitente=None):
+        """Mesmas chaves do Database.get_stats; GTINs distintos vêm da união dos shards"""
+        totais = self.linhas(PARCIAL_STATS, emitente=emitente, tabela='itens')
+        gtins = self.linhas(PARCIAL_GTINS, emitente=emitente, tabela='itens')
+        stats = {'total_notas': 0, 'total_itens': 0, 'itens_enriquecidos': 0}
+        for (linha,) in totais:
+            for coluna in stats:
+                stats[coluna] += linha[coluna]
+        stats['total_gtins'] = len({linha['codigo_gtin'] for parcial in gtins for linha in parcial})
+        return stats
+
+    def get_data_version(self):
+        """Soma das versões dos shards (cresce a cada escrita em qualquer um) e a última alteração"""
+        versoes = self.linhas(VERSAO_QUERY)
+        linhas = [linha for parcial in versoes for linha in parcial]
+        return {'versao': sum(l['versao'] for l in linhas),
+                'atualizado_em': max((l['atualizado_em'] for l in linhas), default=0)}
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Armazenamento particionado por emitente')
+    parser.add_argument('--pasta', default=os.environ.get('CUPONS_SHARDS_DIR', PASTA_SHARDS),
+                        help='pasta dos shards e do catálogo (padrão: %(default)s)')
+    parser.add_argument('--shards', type=int, default=N_SHARDS,
+                        help='nº de shards ao criar o catálogo (padrão: %(default)s)')
+    comandos = parser.add_subparsers(dest='comando', required=True)
+    ingerir = comandos.add_parser('ingerir', help='carrega XMLs roteando cada cupom para o shard do emitente')
+    ingerir.add_argument('pasta_xml', nargs='?', default='data/Arquivos-XML-SAT')
+    ingerir.add_argument('--lote', type=int, default=200)
+    atribuir = comandos.add_parser('atribuir', help='fixa o shard de um emitente')
+    atribuir.add_argument('emitente')
+    atribuir.add_argument('shard', type=int)
+    comandos.add_parser('status', help='emitentes e totais por shard')
+    args = parser.parse_args()
+
+    db = ShardedDatabase(args.pasta, args.shards)
+    try:
+        if args.comando == 'ingerir':
+            from xml_parser import XMLParser
+            xml_parser = XMLParser(db)
+            for notas, itens in xml_parser.iter_xml_batches(args.pasta_xml, args.lote):
+                xml_parser.save_to_database(notas, itens)
+        elif args.comando == 'atribuir':
+            db.atribuir(args.emitente, args.shard)
+            print(f"✅ Emitente {args.emitente} -> shard {args.shard}")
+        print(f"📊 {db.n_shards} shards em {db.pasta}:")
+        for i in range(db.n_shards):
+            stats = db.shards[i].get_stats()
+            emitentes = sum(1 for shard in db._mapa.values() if shard == i)
+            print(f"   • shard {i}: {stats['total_notas']} cupons, {stats['total_itens']} itens, "
+                  f"{emitentes} emitentes")
+    finally:
+        db.close()
@@ -0,0 +1,276 @@
+import hashlib
+import json
+import math
+import time
+import zlib
+from collections import Counter, defaultdict
+
+from queries import ITENS_ENRIQUECIDOS_QUERY, SKETCH_INTERVALO_QUERY, SKETCH_QUERY
+
+# Linha com o acumulado de todo o histórico ('*' fica fora de qualquer BETWEEN de datas)
+TOTAL = '*'
+# Itens/cupons sem data de emissão entram no total, mas em nenhum dia
+SEM_DATA = '0000-00-00'
+
+HLL_GTINS = 'gtins'
+HLL_CLIENTES = 'clientes'
+HLL_EMITENTES = 'emitentes'
+TOP_VALOR = 'top_valor'            # em centavos
+TOP_QUANTIDADE = 'top_quantidade'  # qCom x 10000 (inteiros: somas exatas entre dias)
+CONTAGENS = 'contagens'
+
+HLL_TIPOS = (HLL_GTINS, HLL_CLIENTES, HLL_EMITENTES)
+TOP_TIPOS = (TOP_VALOR, TOP_QUANTIDADE)
+
+_POTENCIAS = [2.0 ** -i for i in range(66)]
+
+
+class HyperLogLog:
+    """Contagem aproximada de distintos (erro padrão ~1.04/sqrt(2^p), ~0.8% com p=14).
+
+    Dois HLLs com o mesmo `p` se combinam pelo máximo de cada registrador, então
+    os sketches diários podem ser somados para qualquer intervalo de datas.
+    """
+
+    def __init__(self, p=14, registradores=None):
+        self.p = p
+        self.m = 1 << p
+        self.registradores = bytearray(registradores) if registradores is not None else bytearray(self.m)
+
+    def add(self, valor):
+        h = int.from_bytes(hashlib.blake2b(str(valor).encode('utf-8'), digest_size=8).digest(), 'big')
+        indice = h >> (64 - self.p)
+        resto = h & ((1 << (64 - self.p)) - 1)
+        rho = (64 - self.p) - resto.bit_length() + 1
+        if rho > self.registradores[indice]:
+            self.registradores[indice] = rho
+
+    def update(self, valores):
+        for valor in valores:
+            self.add(valor)
+
+    def merge(self, outro):
+        if outro.p != self.p:
+            raise ValueError('HyperLogLog com precisões diferentes')
+        self.registradores = HyperLogLog.unir([self, outro], self.p).registradores
+        return self
+
+    @classmethod
+    def unir(cls, hlls, p=14):
+        """Combina vários HLLs de uma vez: máximo por registrador, vetorizado com numpy"""
+        registradores = [h.registradores for h in hlls]
+        if any(h.p != p for h in hlls):
+            raise ValueError('HyperLogLog com precisões diferentes')
+        if not registradores:
+            return cls(p)
+        if len(registradores) == 1:
+            return cls(p, registradores[0])
+        import numpy as np  # só aqui: numpy fica fora da importação do app (import_budget.py)
+        return cls(p, np.maximum.reduce([np.frombuffer(r, dtype=np.uint8) for r in registradores]).tobytes())
+
+    def count(self):
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        # Agrupado por valor (no máximo 64 distintos) em vez de somar 2^p registradores um a um
+        soma = sum(self.registradores.count(r) * _POTENCIAS[r] for r in set(self.registradores))
+        estimativa = alpha * self.m * self.m / soma
+        zeros = self.registradores.count(0)
+        if estimativa <= 2.5 * self.m and zeros:
+            # Correção para poucos elementos (linear counting)
+            estimativa = self.m * math.log(self.m / zeros)
+        return int(round(estimativa))
+
+    def to_bytes(self):
+        return bytes([self.p]) + zlib.compress(bytes(self.registradores))
+
+    @classmethod
+    def from_bytes(cls, dados):
+        return cls(dados[0], zlib.decompress(dados[1:]))
+
+
+class SpaceSaving:
+    """Top-K aproximado com pesos (algoritmo Space-Saving, k contadores).
+
+    A contagem de cada item é uma superestimativa de no máximo `erro`; itens
+    com peso real acima do menor contador sempre estão no resumo. Resumos se
+    combinam somando as contagens (itens ausentes recebem o mínimo do outro lado).
+    """
+
+    def __init__(self, k=256, contadores=None):
+        self.k = k
+        self.contadores = contadores or {}  # item -> [contagem, erro]
+
+    def _minimo(self):
+        if len(self.contadores) < self.k:
+            return 0
+        return min(contagem for contagem, _ in self.contadores.values())
+
+    def _combinar(self, outros, minimo_outros):
+        minimo = self._minimo()
+        combinados = {}
+        for item in set(self.contadores) | set(outros):
+            contagem, erro = self.contadores.get(item, (minimo, minimo))
+            outra, outro_erro = outros.get(item, (minimo_outros, minimo_outros))
+            combinados[item] = [contagem + outra, erro + outro_erro]
+        if len(combinados) > self.k:
+            combinados = dict(sorted(combinados.items(), key=lambda kv: kv[1][0], reverse=True)[:self.k])
+        self.contadores = combinados
+        return self
+
+    def update(self, contagens):
+        """Soma contagens exatas ({item: peso}, ex.: o agregado de um lote)"""
+        return self._combinar({item: (peso, 0) for item, peso in contagens.items()}, 0)
+
+    def merge(self, outro):
+        return self._combinar(outro.contadores, outro._minimo())
+
+    def top(self, n=5):
+        """[(item, contagem estimada, erro máximo)] em ordem decrescente"""
+        ordenados = sorted(self.contadores.items(), key=lambda kv: kv[1][0], reverse=True)[:n]
+        return [(item, contagem, erro) for item, (contagem, erro) in ordenados]
+
+    def to_bytes(self):
+        return zlib.compress(json.dumps({'k': self.k, 'c': self.contadores}).encode('utf-8'))
+
+    @classmethod
+    def from_bytes(cls, dados):
+        estado = json.loads(zlib.decompress(dados))
+        return cls(estado['k'], estado['c'])
+
+
+def _vazio(tipo):
+    if tipo in HLL_TIPOS:
+        return HyperLogLog()
+    if tipo in TOP_TIPOS:
+        return SpaceSaving()
+    return Counter()
+
+
+def _serializar(tipo, sketch):
+    if tipo == CONTAGENS:
+        return zlib.compress(json.dumps(sketch).encode('utf-8'))
+    return sketch.to_bytes()
+
+
+def _desserializar(tipo, dados):
+    if tipo in HLL_TIPOS:
+        return HyperLogLog.from_bytes(dados)
+    if tipo in TOP_TIPOS:
+        return SpaceSaving.from_bytes(dados)
+    return Counter(json.loads(zlib.decompress(dados)))
+
+
+def _somar(tipo, sketch, outro):
+    if tipo == CONTAGENS:
+        sketch.update(outro)
+        return sketch
+    return sketch.merge(outro)
+
+
+def _aplicar(conn, lote):
+    """Grava as contribuições de um lote ({data: {tipo: valores}}) nos dias e no total"""
+    lote = dict(lote)
+    total = {}
+    for contribuicoes in lote.values():
+        for tipo, valores in contribuicoes.items():
+            total.setdefault(tipo, set() if tipo in HLL_TIPOS else Counter()).update(valores)
+    lote[TOTAL] = total
+
+    agora = time.time()
+    for data, contribuicoes in lote.items():
+        for tipo, valores in contribuicoes.items():
+            if not valores:
+                continue
+            row = conn.execute(SKETCH_QUERY, (data, tipo)).fetchone()
+            sketch = _desserializar(tipo, row[0]) if row else _vazio(tipo)
+            sketch.update(valores)
+            conn.execute('INSERT OR REPLACE INTO sketches_diarios (data, tipo, conteudo, atualizado_em) VALUES (?, ?, ?, ?)',
+                         (data, tipo, _serializar(tipo, sketch), agora))
+
+
+def atualizar_sketches_cupons(conn, cupons):
+    """Soma cupons aos sketches diários: [(data_emissao, cpf, cnpj, novo)].
+
+    `novo=False` (cupom substituído) só alimenta os HLLs, que são idempotentes,
+    para não contar o mesmo cupom duas vezes.
+    """
+    lote = defaultdict(lambda: {HLL_CLIENTES: set(), HLL_EMITENTES: set(), CONTAGENS: Counter()})
+    for data, cpf, cnpj, novo in cupons:
+        dia = lote[data or SEM_DATA]
+        if cpf:
+            dia[HLL_CLIENTES].add(cpf)
+        if cnpj:
+            dia[HLL_EMITENTES].add(cnpj)
+        if novo:
+            dia[CONTAGENS]['cupons'] += 1
+    _aplicar(conn, lote)
+
+
+def atualizar_sketches_itens(conn, ultimo_id):
+    """Soma aos sketches os itens com id > ultimo_id (mesma transação da ingestão)"""
+    lote = defaultdict(lambda: {HLL_GTINS: set(), TOP_VALOR: Counter(), TOP_QUANTIDADE: Counter(),
+                                CONTAGENS: Counter()})
+    cursor = conn.execute('''
+        SELECT c.data_emissao, i.codigo_gtin, i.descricao, i.valor_total, i.quantidade
+        FROM itens i
+        LEFT JOIN cupons c ON c.chave_acesso = i.chave_acesso
+        WHERE i.id > ?
+    ''', (ultimo_id,))
+    for data, gtin, descricao, valor_total, quantidade in cursor:
+        dia = lote[data or SEM_DATA]
+        dia[CONTAGENS]['itens'] += 1
+        if gtin is not None:
+            dia[HLL_GTINS].add(gtin)
+        if descricao is not None:
+            dia[TOP_VALOR][descricao] += valor_total or 0
+            dia[TOP_QUANTIDADE][descricao] += quantidade or 0
+    _aplicar(conn, lote)
+
+
+def reconstruir_sketches(conn):
+    """Recalcula todos os sketches a partir de cupons e itens (migração ou correção)"""
+    conn.execute('DELETE FROM sketches_diarios')
+    cursor = conn.execute('SELECT data_emissao, destinatario_cpf, emitente_cnpj FROM cupons')
+    while True:
+        rows = cursor.fetchmany(50000)
+        if not rows:
+            break
+        atualizar_sketches_cupons(conn, [(data, cpf, cnpj, True) for data, cpf, cnpj in rows])
+    atualizar_sketches_itens(conn, 0)
+
+
+def carregar(conn, tipo, data_inicio=None, data_fim=None):
+    """Sketch combinado de um intervalo de datas (sem intervalo: linha de total, sem merge)"""
+    if data_inicio is None and data_fim is None:
+        rows = conn.execute(SKETCH_QUERY, (TOTAL, tipo)).fetchall()
+    else:
+        rows = conn.execute(SKETCH_INTERVALO_QUERY,
+                            (tipo, data_inicio or '0000-01-01', data_fim or '9999-12-31')).fetchall()
+    if tipo in HLL_TIPOS:
+        return HyperLogLog.unir([HyperLogLog.from_bytes(conteudo) for (conteudo,) in rows])
+    sketch = _vazio(tipo)
+    for (conteudo,) in rows:
+        sketch = _somar(tipo, sketch, _desserializar(tipo, conteudo))
+    return sketch
+
+
+def top_aproximado(conn, tipo, n=5, data_inicio=None, data_fim=None):
+    """Top N produtos por valor (TOP_VALOR) ou quantidade (TOP_QUANTIDADE): [(produto, total, erro)]
+
+    Totais e erros vêm na escala do banco (centavos / quantidade x 10000).
+    """
+    return carregar(conn, tipo, data_inicio, data_fim).top(n)
+
+
+def estatisticas_aproximadas(conn, data_inicio=None, data_fim=None):
+    """Mesmas chaves do STATS_QUERY, lidas dos sketches, mais clientes e emitentes distintos"""
+    contagens = carregar(conn, CONTAGENS, data_inicio, data_fim)
+    itens_enriquecidos = conn.execute(ITENS_ENRIQUECIDOS_QUERY).fetchone()[0]
+    return {
+        'total_notas': contagens.get('cupons', 0),
+        'total_itens': contagens.get('itens', 0),
+        'total_gtins': carregar(conn, HLL_GTINS, data_inicio, data_fim).count(),
+        'total_clientes': carregar(conn, HLL_CLIENTES, data_inicio, data_fim).count(),
+        'total_emitentes': carregar(conn, HLL_EMITENTES, data_inicio, data_fim).count(),
+        'itens_enriquecidos': itens_enriquecidos,
+        'aproximado': True,
+    }
@@ -1,17 +1,36 @@
+// Gráficos criados, para serem atualizados no lugar pelas mensagens do /api/stream
+const charts = {};
+// Versão dos dados exibidos (vem do ETag das respostas da API)
+let versaoDados = null;
+
+function registrarVersao(response) {
+    const etag = response.headers.get('ETag');
+    if (versaoDados === null && etag) {
+        versaoDados = etag.replace(/\D/g, '');
+    }
+}
+
 // Carregar dados dos dashboards
 async function carregarDashboards() {
     try {
         console.log('🚀 Iniciando carregamento dos dashboards...');
 
+        // 0. Estatísticas gerais
+        const statsResponse = await fetch('/api/stats');
+        if (!statsResponse.ok) throw new Error('Erro ao carregar stats');
+        registrarVersao(statsResponse);
+        atualizarStats(await statsResponse.json());
+
         // 1. Top Products (Valor)
         console.log('📊 Carregando top products...');
         const topProductsResponse = await fetch('/api/top_products');
         if (!topProductsResponse.ok) throw new Error('Erro ao carregar top products');
+        registrarVersao(topProductsResponse);
         const topProducts = await topProductsResponse.json();
         console.log('Top products carregados:', topProducts);
 
         if (topProducts && topProducts.length > 0) {
-            new Chart(document.getElementById('topProductsChart'), {
+            charts.topProducts = new Chart(document.getElementById('topProductsChart'), {
                 type: 'bar',
                 data: {
                     labels: topProducts.map(p => p.produto ? p.produto.substring(0, 20) + (p.produto.length > 20 ? '...' : '') : 'N/A'),
@@ -36,11 +55,12 @@ async function carregarDashboards() {
         console.log('📈 Carregando daily revenue...');
         const revenueResponse = await fetch('/api/daily_revenue');
         if (!revenueResponse.ok) throw new Error('Erro ao carregar daily revenue');
+        registrarVersao(revenueResponse);
         const revenue = await revenueResponse.json();
         console.log('Daily revenue carregado:', revenue);
 
         if (revenue && revenue.length > 0) {
-            new Chart(document.getElementById('revenueChart'), {
+            charts.revenue = new Chart(document.getElementById('revenueChart'), {
                 type: 'line',
                 data: {
                     labels: revenue.map(r => r.data || 'N/A'),
@@ -103,11 +123,12 @@ async function carregarDashboards() {
         console.log('📦 Carregando top products quantity...');
         const topQuantityResponse = await fetch('/api/top_products_quantity');
         if (!topQuantityResponse.ok) throw new Error('Erro ao carregar top products quantity');
+        registrarVersao(topQuantityResponse);
         const topQuantity = await topQuantityResponse.json();
         console.log('Top products quantity carregado:', topQuantity);
 
         if (topQuantity && topQuantity.length > 0) {
-            new Chart(document.getElementById('quantityChart'), {
+            charts.quantity = new Chart(document.getElementById('quantityChart'), {
                 type: 'bar',
                 data: {
                     labels: topQuantity.map(p => p.produto ? p.produto.substring(0, 20) + (p.produto.length > 20 ? '...' : '') : 'N/A'),
@@ -188,8 +209,13 @@ async function carregarDashboards() {
             document.getElementById('avgValueChart').innerHTML = '<p>Nenhum dado disponível</p>';
         }
 
+        // 7. Heatmap dia da semana x hora
+        await carregarHeatmap();
+
         console.log('✅ Todos os dashboards carregados com sucesso!');
 
+        iniciarAtualizacoesAoVivo();
+
     } catch (error) {
         console.error('❌ Erro ao carregar dashboards:', error);
         
@@ -208,6 +234,122 @@ async function carregarDashboards() {
     }
 }
 
+// Heatmap dia da semana x hora (cor proporcional ao maior valor do recorte)
+async function carregarHeatmap() {
+    const tabela = document.getElementById('heatmap');
+    const medida = document.getElementById('heatmapMedida').value;
+    const seletorEmitente = document.getElementById('heatmapEmitente');
+    const params = new URLSearchParams({ medida });
+    if (seletorEmitente.value) params.set('emitente', seletorEmitente.value);
+
+    const response = await fetch('/api/heatmap?' + params);
+    if (!response.ok) {
+        tabela.innerHTML = '<tr><td style="color: red;">Erro ao carregar dados</td></tr>';
+        return;
+    }
+    const heatmap = await response.json();
+
+    if (seletorEmitente.options.length === 1) {
+        heatmap.emitentes.forEach(cnpj => seletorEmitente.add(new Option(cnpj, cnpj)));
+    }
+    if (!heatmap.total) {
+        tabela.innerHTML = '<tr><td>Nenhum dado disponível</td></tr>';
+        return;
+    }
+
+    const maximo = Math.max(...heatmap.valores.flat());
+    let html = '<tr><th></th>' + heatmap.horas.map(h => `<th>${h}h</th>`).join('') + '</tr>';
+    heatmap.dias.forEach((dia, i) => {
+        html += `<tr><th>${dia}</th>` + heatmap.valores[i].map((valor, hora) => {
+            const intensidade = maximo ? valor / maximo : 0;
+            const texto = medida === 'faturamento' ? valor.toFixed(0) : valor;
+            return `<td style="background: rgba(54, 162, 235, ${intensidade.toFixed(2)}); color: ${intensidade > 0.6 ? 'white' : '#333'}" `
+                + `title="${dia} ${hora}h: ${texto}">${valor ? texto : ''}</td>`;
+        }).join('') + '</tr>';
+    });
+    tabela.innerHTML = html;
+}
+
+// Atualizações ao vivo (Server-Sent Events)
+function iniciarAtualizacoesAoVivo() {
+    if (!window.EventSource) return;
+
+    const url = '/api/stream' + (versaoDados !== null ? '?versao=' + versaoDados : '');
+    const source = new EventSource(url);
+
+    // Snapshot: estado completo (primeira conexão desatualizada ou reconexão)
+    source.addEventListener('snapshot', e => aplicarAtualizacao(JSON.parse(e.data), true));
+    // Delta: só o que mudou desde a última versão
+    source.addEventListener('delta', e => aplicarAtualizacao(JSON.parse(e.data), false));
+}
+
+function aplicarAtualizacao(dados, completo) {
+    const precisaGrafico = (dados.daily_revenue && dados.daily_revenue.length && !charts.revenue)
+        || (dados.top_products && dados.top_products.length && !charts.topProducts)
+        || (dados.top_products_quantity && dados.top_products_quantity.length && !charts.quantity);
+    if (precisaGrafico) {
+        // Gráfico ainda não existia (banco vazio no carregamento): recarrega a página
+        location.reload();
+        return;
+    }
+
+    if (dados.daily_revenue) atualizarFaturamento(dados.daily_revenue, completo);
+    if (dados.top_products) atualizarRanking(charts.topProducts, dados.top_products, 'total_vendido');
+    if (dados.top_products_quantity) atualizarRanking(charts.quantity, dados.top_products_quantity, 'total_quantidade');
+    if (dados.stats) atualizarStats(dados.stats);
+}
+
+function atualizarRanking(chart, produtos, campo) {
+    if (!chart) return;
+    chart.data.labels = produtos.map(p => p.produto ? p.produto.substring(0, 20) + (p.produto.length > 20 ? '...' : '') : 'N/A');
+    chart.data.datasets[0].data = produtos.map(p => p[campo] || 0);
+    chart.update();
+}
+
+function atualizarFaturamento(linhas, completo) {
+    const chart = charts.revenue;
+    if (!chart) return;
+
+    const labels = chart.data.labels;
+    const valores = chart.data.datasets[0].data;
+    if (completo) {
+        labels.length = 0;
+        valores.length = 0;
+    }
+
+    linhas.forEach(r => {
+        const data = r.data || 'N/A';
+        const i = labels.indexOf(data);
+        if (i >= 0) {
+            valores[i] = r.faturamento || 0;
+        } else {
+            // Datas chegam em ordem ISO: insere na posição certa
+            let pos = labels.findIndex(l => l > data);
+            if (pos < 0) pos = labels.length;
+            labels.splice(pos, 0, data);
+            valores.splice(pos, 0, r.faturamento || 0);
+        }
+    });
+    chart.update();
+}
+
+const statsAtuais = {};
+
+function atualizarStats(stats) {
+    Object.assign(statsAtuais, stats);
+    const el = document.getElementById('stats');
+    if (!el) return;
+    el.textContent = `📄 ${statsAtuais.total_notas ?? 0} cupons • 📦 ${statsAtuais.total_itens ?? 0} itens • ` +
+        `🏷️ ${statsAtuais.total_gtins ?? 0} GTINs • ✨ ${statsAtuais.itens_enriquecidos ?? 0} enriquecidos`;
+}
+
+// Texto vindo do banco/usuário (nomes de produto e empresa) nunca entra como HTML
+function escaparHtml(texto) {
+    const div = document.createElement('div');
+    div.textContent = texto ?? '';
+    return div.innerHTML;
+}
+
 // Função para consulta em linguagem natural
 async function fazerPergunta() {
     const pergunta = document.getElementById('perguntaInput').value;
@@ -230,11 +372,13 @@ async function fazerPergunta() {
         const data = await response.json();
         
         if (data.erro) {
-            respostaDiv.innerHTML = `<p style="color: red;">❌ ${data.erro}</p>`;
+            respostaDiv.innerHTML = `<p style="color: red;">❌ ${escaparHtml(data.erro)}</p>`;
         } else if (data.empresas) {
-            respostaDiv.innerHTML = `<p><strong>🏢 Empresas encontradas:</strong><br>${data.empresas.join('<br>')}</p>`;
+            respostaDiv.innerHTML = `<p><strong>🏢 Empresas encontradas:</strong><br>${data.empresas.map(escaparHtml).join('<br>')}</p>`;
+        } else if (data.linhas) {
+            respostaDiv.innerHTML = `<p><strong>💰 ${escaparHtml(data.resultado)}:</strong><br>${data.linhas.map(escaparHtml).join('<br>')}</p>`;
         } else {
-            respostaDiv.innerHTML = `<p><strong>💰 Resposta:</strong> ${data.resultado}</p>`;
+            respostaDiv.innerHTML = `<p><strong>💰 Resposta:</strong> ${escaparHtml(data.resultado)}</p>`;
         }
     } catch (error) {
         respostaDiv.innerHTML = '<p style="color: red;">❌ Erro na consulta. Tente novamente.</p>';
@@ -0,0 +1,191 @@
+import argparse
+import os
+import random
+from datetime import date, timedelta
+from database import Database
+from money import CENTAVOS, MILESIMOS, QUANTIDADE
+
+# Escalas usadas no benchmark (cupons; ~8 itens por cupom em média)
+ESCALAS = {
+    'pequena': 2_000,
+    'media': 100_000,
+    'grande': 1_250_000,  # ~10M itens
+}
+
+PASTA_BANCOS = 'data/bench'
+
+CATEGORIAS = [
+    ('REFRIGERANTE', '22021000', ['350ML', '600ML', '2L']),
+    ('CERVEJA', '22030000', ['350ML', '473ML', '600ML']),
+    ('ARROZ', '10063021', ['1KG', '5KG']),
+    ('FEIJAO', '07133319', ['1KG']),
+    ('CAFE', '09012100', ['250G', '500G']),
+    ('LEITE', '04012010', ['1L']),
+    ('BISCOITO', '19053100', ['100G', '200G']),
+    ('DETERGENTE', '34022000', ['500ML']),
+    ('SABONETE', '34011190', ['85G', '90G']),
+    ('MACARRAO', '19021900', ['500G', '1KG']),
+    ('OLEO', '15079011', ['900ML']),
+    ('ACUCAR', '17019900', ['1KG', '5KG']),
+]
+MARCAS = ['ALFA', 'BRAVO', 'CASA', 'DELTA', 'ESTRELA', 'FAZENDA', 'GIRASSOL', 'HORIZONTE', 'IPE', 'JATOBA']
+REDES = ['SUPERMERCADO', 'MERCADO', 'ATACADO', 'MERCEARIA', 'EMPORIO', 'HIPERMERCADO']
+BAIRROS = ['CENTRO', 'JARDIM', 'VILA NOVA', 'BOA VISTA', 'SAO JOSE', 'PARQUE', 'ALVORADA', 'SANTA RITA']
+NOMES = ['ANA', 'BRUNO', 'CARLA', 'DIEGO', 'ELISA', 'FABIO', 'GABRIELA', 'HUGO', 'IRIS', 'JOAO']
+FORMAS_PAGAMENTO = ['01', '03', '04', '05', '10', '11', '99']
+PESOS_PAGAMENTO = [30, 25, 30, 3, 6, 4, 2]
+
+
+def _com_digito(base):
+    """Completa o GTIN com o dígito verificador GS1"""
+    soma = sum(int(d) * (3 if i % 2 == 0 else 1) for i, d in enumerate(reversed(base)))
+    return base + str((10 - soma % 10) % 10)
+
+
+def _catalogo(rng, n_produtos):
+    produtos = []
+    for i in range(n_produtos):
+        categoria, ncm, tamanhos = rng.choice(CATEGORIAS)
+        descricao = f'{categoria} {rng.choice(MARCAS)} {rng.choice(tamanhos)}'
+        if rng.random() < 0.9:
+            gtin = _com_digito(f'789{i:09d}')
+        else:
+            # Código interno da loja (pesáveis/sem GTIN)
+            gtin = rng.choice(['SEM GTIN', _com_digito(f'2{i:011d}')])
+        produtos.append({
+            'codigo_produto': f'P{i:06d}',
+            'codigo_gtin': gtin,
+            'descricao': descricao,
+            'ncm': ncm,
+            'preco': round(rng.uniform(1.5, 60.0) * CENTAVOS),  # em centavos
+        })
+    return produtos
+
+
+def _emitentes(rng, n_emitentes):
+    emitentes = []
+    for i in range(n_emitentes):
+        cnpj = f'{rng.randrange(10**7, 10**8)}0001{rng.randrange(10, 100)}'
+        nome = f'{rng.choice(REDES)} {rng.choice(BAIRROS)} {i + 1} LTDA'
+        emitentes.append((cnpj, nome))
+    return emitentes
+
+
+def _chave_acesso(data, cnpj, serie, numero):
+    """Chave de 44 dígitos no layout do CF-e: cUF, AAMM, CNPJ, modelo 59, série, nCFe, cNF, DV"""
+    return f'35{data:%y%m}{cnpj}59{serie:09d}{numero % 10**6:06d}{numero // 10**6:06d}0'
+
+
+def gerar_lotes(n_cupons, itens_por_cupom=8, n_produtos=5000, n_emitentes=20, dias=365,
+                seed=42, lote=5000, inicio=date(2024, 1, 1)):
+    """Gera lotes (notas, itens) no mesmo formato do XMLParser, de forma determinística pelo seed"""
+    rng = random.Random(seed)
+    produtos = _catalogo(rng, n_produtos)
+    emitentes = _emitentes(rng, n_emitentes)
+    # Popularidade com cauda longa (lei de Zipf), como numa loja real
+    pesos = [1 / (r + 1) for r in range(n_produtos)]
+    acumulado = []
+    total = 0.0
+    for peso in pesos:
+        total += peso
+        acumulado.append(total)
+
+    notas, itens = [], []
+    for numero in range(n_cupons):
+        data = inicio + timedelta(days=rng.randrange(dias))
+        cnpj, razao_social = emitentes[rng.randrange(n_emitentes)]
+        chave = _chave_acesso(data, cnpj, 900000000 + n_emitentes, numero)
+
+        escolhidos = rng.choices(produtos, cum_weights=acumulado, k=max(1, int(rng.expovariate(1 / itens_por_cupom))))
+        valor_total = 0
+        for n_item, produto in enumerate(escolhidos, start=1):
+            quantidade = rng.choice([1, 1, 1, 2, 3])
+            valor_item = produto['preco'] * quantidade
+            valor_total += valor_item
+            itens.append({
+                'chave_acesso': chave,
+                'numero_item': str(n_item),
+                'codigo_produto': produto['codigo_produto'],
+                'codigo_gtin': produto['codigo_gtin'],
+                'descricao': produto['descricao'],
+                'ncm': produto['ncm'],
+                'cest': None,
+                'cfop': rng.choice(['5102', '5102', '5405']),
+                'unidade': 'UN',
+                'quantidade': quantidade * QUANTIDADE,
+                'valor_unitario': produto['preco'] * MILESIMOS // CENTAVOS,
+                'valor_total': valor_item,
+                'valor_item_12741': round(valor_item * 0.3),
+                'cst_icms': '00',
+                'origem_icms': '0',
+                'cst_pis': '01',
+                'cst_cofins': '01',
+            })
+
+        desconto = round(valor_total * 0.05) if rng.random() < 0.1 else 0
+        identificado = rng.random() < 0.2
+        notas.append({
+            'chave_acesso': chave,
+            'numero_caixa': f'{rng.randrange(1, 9):03d}',
+            'data_emissao': data.isoformat(),
+            'hora_emissao': f'{rng.randrange(7, 23):02d}{rng.randrange(60):02d}{rng.randrange(60):02d}',
+            'valor_total': valor_total,
+            'valor_desconto': desconto,
+            'valor_pis': round(valor_total * 0.0165),
+            'valor_cofins': round(valor_total * 0.076),
+            'emitente_cnpj': cnpj,
+            'emitente_razao_social': razao_social,
+            'forma_pagamento': rng.choices(FORMAS_PAGAMENTO, PESOS_PAGAMENTO)[0],
+            'valor_pagamento': valor_total - desconto,
+            'destinatario_cpf': f'{rng.randrange(10**10, 10**11)}' if identificado else None,
+            'destinatario_nome': f'{rng.choice(NOMES)} {rng.choice(MARCAS)}' if identificado else None,
+        })
+
+        if len(notas) >= lote:
+            yield notas, itens
+            notas, itens = [], []
+
+    if notas:
+        yield notas, itens
+
+
+def caminho_banco(escala, seed=42, pasta=PASTA_BANCOS):
+    return os.path.join(pasta, f'cupons_{escala}_seed{seed}.db')
+
+
+def gerar_banco(caminho, n_cupons, seed=42, recriar=False, **opcoes):
+    """Cria um banco sintético em `caminho` pela mesma ingestão do ETL (tabelas derivadas incluídas).
+
+    Um banco já existente é reaproveitado, a não ser com `recriar=True`.
+    """
+    if os.path.exists(caminho) and not recriar:
+        print(f"♻️ Reaproveitando banco sintético {caminho}")
+        return caminho
+    pasta = os.path.dirname(caminho)
+    if pasta:
+        os.makedirs(pasta, exist_ok=True)
+    # Em WAL, -wal/-shm antigos seriam reaplicados no banco novo: saem junto com o arquivo principal
+    for arquivo in (caminho, caminho + '-wal', caminho + '-shm'):
+        if os.path.exists(arquivo):
+            os.remove(arquivo)
+
+    print(f"🧪 Gerando banco sintético {caminho} ({n_cupons} cupons, seed {seed})...")
+    db = Database(caminho)
+    for notas, itens in gerar_lotes(n_cupons, seed=seed, **opcoes):
+        db.insert_notas(notas)
+        db.insert_itens(itens)
+    return caminho
+
+
+def gerar_escala(escala, seed=42, recriar=False, pasta=PASTA_BANCOS):
+    return gerar_banco(caminho_banco(escala, seed, pasta), ESCALAS[escala], seed=seed, recriar=recriar)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Gera bancos sintéticos de cupons/itens para benchmark')
+    parser.add_argument('escalas', nargs='*', default=['pequena'], choices=sorted(ESCALAS))
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--recriar', action='store_true')
+    args = parser.parse_args()
+    for escala in args.escalas:
+        print(gerar_escala(escala, args.seed, args.recriar))
@@ -0,0 +1,113 @@
+import queue
+import threading
+from contextlib import contextmanager
+
+
+def criar_chrome_headless():
+    """Chrome headless com as mesmas opções usadas pelo scraper"""
+    # Selenium só é importado quando um navegador é realmente necessário
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+
+    chrome_options = Options()
+    chrome_options.add_argument("--headless")
+    chrome_options.add_argument("--no-sandbox")
+    chrome_options.add_argument("--disable-dev-shm-usage")
+    chrome_options.add_argument("--disable-gpu")
+    chrome_options.add_argument("--window-size=1920,1080")
+    chrome_options.add_argument("--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
+
+    driver = webdriver.Chrome(options=chrome_options)
+    driver.implicitly_wait(10)
+    return driver
+
+
+class _DriverSlot:
+    def __init__(self, driver):
+        self.driver = driver
+        self.paginas = 0
+
+
+class WebDriverPool:
+    """Pool pequeno de WebDrivers reutilizáveis, criados sob demanda.
+
+    Nenhum navegador é aberto até o primeiro `acquire()`. Cada driver passa
+    por um health check ao ser emprestado e é reciclado após `max_paginas`
+    páginas (Chrome vaza memória em sessões longas).
+    """
+
+    def __init__(self, tamanho=2, max_paginas=50, fabrica=criar_chrome_headless):
+        self.tamanho = tamanho
+        self.max_paginas = max_paginas
+        self.fabrica = fabrica
+        self._livres = queue.LifoQueue()
+        self._criados = 0
+        self._lock = threading.Lock()
+        self._fechado = False
+
+    def _saudavel(self, slot):
+        try:
+            slot.driver.execute_script('return 1')
+            return True
+        except Exception:
+            return False
+
+    def _descartar(self, slot):
+        with self._lock:
+            self._criados -= 1
+        try:
+            slot.driver.quit()
+        except Exception:
+            pass
+
+    def _obter_slot(self, timeout):
+        while True:
+            try:
+                slot = self._livres.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    pode_criar = self._criados < self.tamanho
+                    if pode_criar:
+                        self._criados += 1
+                if pode_criar:
+                    try:
+                        print("🌐 Iniciando navegador headless...")
+                        return _DriverSlot(self.fabrica())
+                    except Exception:
+                        with self._lock:
+                            self._criados -= 1
+                        raise
+                # Pool cheio: espera um driver ser devolvido
+                slot = self._livres.get(timeout=timeout)
+
+            if self._saudavel(slot):
+                return slot
+            print("♻️ Driver sem resposta descartado")
+            self._descartar(slot)
+
+    @contextmanager
+    def acquire(self, timeout=60):
+        """Empresta um driver: `with pool.acquire() as driver: ...`"""
+        if self._fechado:
+            raise RuntimeError('WebDriverPool já foi fechado')
+        slot = self._obter_slot(timeout)
+        try:
+            yield slot.driver
+        finally:
+            slot.paginas += 1
+            if self._fechado or slot.paginas >= self.max_paginas:
+                self._descartar(slot)
+            else:
+                self._livres.put(slot)
+
+    @property
+    def iniciado(self):
+        return self._criados > 0
+
+    def close(self):
+        self._fechado = True
+        while True:
+            try:
+                self._descartar(self._livres.get_nowait())
+            except queue.Empty:
+                break
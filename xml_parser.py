@@ -1,25 +1,41 @@
 import xml.etree.ElementTree as ET
-import pandas as pd
 import os
 from database import Database
+from money import ESCALAS, MILESIMOS, QUANTIDADE, para_inteiro
 
 class XMLParser:
-    def __init__(self):
-        self.db = Database()
+    def __init__(self, db=None):
+        # Database ou ShardedDatabase (mesma interface de gravação)
+        self.db = db or Database()
     
     def parse_xml_folder(self, folder_path):
         notas_data = []
         itens_data = []
         
-        for filename in os.listdir(folder_path):
+        for notas, itens in self.iter_xml_batches(folder_path):
+            notas_data.extend(notas)
+            itens_data.extend(itens)
+        
+        return notas_data, itens_data
+    
+    def iter_xml_batches(self, folder_path, batch_size=200):
+        """Gera lotes (notas, itens) de até `batch_size` arquivos, para processar em streaming"""
+        notas_data = []
+        itens_data = []
+        
+        for filename in sorted(os.listdir(folder_path)):
             if filename.endswith('.xml'):
                 file_path = os.path.join(folder_path, filename)
                 nota, itens = self.parse_xml_file(file_path)
                 if nota:
                     notas_data.append(nota)
                     itens_data.extend(itens)
+                if len(notas_data) >= batch_size:
+                    yield notas_data, itens_data
+                    notas_data, itens_data = [], []
         
-        return notas_data, itens_data
+        if notas_data:
+            yield notas_data, itens_data
     
     def convert_date(self, date_str):
         """Converte data de YYYYMMDD para YYYY-MM-DD"""
@@ -53,14 +69,14 @@ class XMLParser:
                 # DATA CORRIGIDA AQUI ↓
                 'data_emissao': self.convert_date(ide.find('dEmi').text) if ide.find('dEmi') is not None else None,
                 'hora_emissao': ide.find('hEmi').text if ide.find('hEmi') is not None else None,
-                'valor_total': float(total.find('vProd').text) if total.find('vProd') is not None else 0.0,
-                'valor_desconto': float(total.find('vDesc').text) if total.find('vDesc') is not None else 0.0,
-                'valor_pis': float(total.find('vPIS').text) if total.find('vPIS') is not None else 0.0,
-                'valor_cofins': float(total.find('vCOFINS').text) if total.find('vCOFINS') is not None else 0.0,
+                'valor_total': para_inteiro(total.find('vProd').text) if total.find('vProd') is not None else 0,
+                'valor_desconto': para_inteiro(total.find('vDesc').text) if total.find('vDesc') is not None else 0,
+                'valor_pis': para_inteiro(total.find('vPIS').text) if total.find('vPIS') is not None else 0,
+                'valor_cofins': para_inteiro(total.find('vCOFINS').text) if total.find('vCOFINS') is not None else 0,
                 'emitente_cnpj': emit.find('CNPJ').text if emit.find('CNPJ') is not None else None,
                 'emitente_razao_social': emit.find('xNome').text if emit.find('xNome') is not None else None,
                 'forma_pagamento': pgto.find('MP/cMP').text if pgto.find('MP/cMP') is not None else None,
-                'valor_pagamento': float(pgto.find('MP/vMP').text) if pgto.find('MP/vMP') is not None else 0.0
+                'valor_pagamento': para_inteiro(pgto.find('MP/vMP').text) if pgto.find('MP/vMP') is not None else 0
             }
             
             # Extrair dados do destinatário (se existir)
@@ -78,7 +94,7 @@ class XMLParser:
                 prod = det.find('prod')
                 imposto = det.find('imposto')
                 
-                # Informações do produto
+                # Informações do produto (valores em centavos, vUnCom em milésimos, qCom x 10000)
                 item = {
                     'chave_acesso': nota['chave_acesso'],
                     'numero_item': det.get('nItem'),
@@ -89,10 +105,10 @@ class XMLParser:
                     'cest': prod.find('CEST').text if prod.find('CEST') is not None else None,
                     'cfop': prod.find('CFOP').text if prod.find('CFOP') is not None else None,
                     'unidade': prod.find('uCom').text if prod.find('uCom') is not None else None,
-                    'quantidade': float(prod.find('qCom').text) if prod.find('qCom') is not None else 0.0,
-                    'valor_unitario': float(prod.find('vUnCom').text) if prod.find('vUnCom') is not None else 0.0,
-                    'valor_total': float(prod.find('vProd').text) if prod.find('vProd') is not None else 0.0,
-                    'valor_item_12741': float(imposto.find('vItem12741').text) if imposto.find('vItem12741') is not None else 0.0
+                    'quantidade': para_inteiro(prod.find('qCom').text, QUANTIDADE) if prod.find('qCom') is not None else 0,
+                    'valor_unitario': para_inteiro(prod.find('vUnCom').text, MILESIMOS) if prod.find('vUnCom') is not None else 0,
+                    'valor_total': para_inteiro(prod.find('vProd').text) if prod.find('vProd') is not None else 0,
+                    'valor_item_12741': para_inteiro(imposto.find('vItem12741').text) if imposto.find('vItem12741') is not None else 0
                 }
                 
                 # Informações de impostos
@@ -127,8 +143,14 @@ class XMLParser:
     
     def export_to_excel(self, notas_data, itens_data, output_path):
         """Exporta dados para Excel"""
+        import pandas as pd  # carregado só na exportação
         df_notas = pd.DataFrame(notas_data)
         df_itens = pd.DataFrame(itens_data)
+        # Planilha em reais e quantidades decimais (o banco guarda inteiros escalados)
+        for df in (df_notas, df_itens):
+            for coluna, escala in ESCALAS.items():
+                if coluna in df:
+                    df[coluna] = df[coluna] / escala
         
         with pd.ExcelWriter(output_path) as writer:
             df_notas.to_excel(writer, sheet_name='Notas', index=False)